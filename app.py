@@ -4,17 +4,22 @@ AWS Bedrock Translation Web Application
 A Flask-based web application for translating text using AWS Bedrock service.
 """
 
+import time
+_import_start = time.perf_counter()
+
 import os
 import json
-import boto3
-import pandas as pd
-import sqlite3
-import time
+import contextvars
 from datetime import datetime, timedelta
 import logging
-from typing import List, Dict, Any, Optional, Tuple
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, flash, session
+import threading
+import atexit
+import hashlib
+from typing import List, Dict, Any, Optional, Tuple, Union
+from collections import deque
+from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for, flash, session, g, Response, stream_with_context, copy_current_request_context
 from werkzeug.utils import secure_filename
+from werkzeug.wsgi import get_input_stream
 import tempfile
 from io import BytesIO
 
@@ -27,97 +32,586 @@ from model_config import (
     PROFILE_ONLY_MODELS,
     MODEL_GROUPS,
     is_inference_profile,
-    requires_inference_profile,
-    get_model_display_name,
-    get_corresponding_profile
+    CATALOG
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("translation_app.log"),
-        logging.StreamHandler()
-    ]
+# Import model discovery
+from model_discovery import ModelDiscovery, catalog_from_listing
+from model_health import ModelHealth
+from shared_state import create_state_backend, JobTracker
+from result_store import MemoryResultStore, SharedResultStore
+from translation_engine import TranslationEngine, TranslationCache, RateLimiter, PromptSpec
+from scheduler import RequestScheduler, SchedulerBusy, set_traffic
+from model_router import ModelRouter, AUTO_MODEL_ID
+from glossary import GlossaryStore, parse_glossary
+from prefilter import classify as classify_segment, SEGMENTS_SKIPPED
+from artifact_store import ArtifactStore
+from upload_ingest import (UploadManager, UploadOffsetError, STREAMABLE_EXTENSIONS, COMPRESSED_EXTENSIONS,
+                           file_extensions, iter_lines, read_chunks)
+
+# Import metrics
+from metrics import (
+    REGISTRY,
+    CONTENT_TYPE_LATEST,
+    HTTP_REQUESTS,
+    HTTP_LATENCY,
+    BEDROCK_REQUESTS,
+    BEDROCK_LATENCY,
+    BEDROCK_ATTEMPT_LATENCY,
+    BEDROCK_PATH,
+    BEDROCK_ATTEMPT_ERRORS,
+    BEDROCK_THROTTLES,
+    BEDROCK_TOKENS,
+    CACHE_REQUESTS,
+    RATINGS_WRITTEN,
+    RATINGS_WRITE_QUEUE_DEPTH,
+    BATCH_QUEUE_DEPTH,
+    STARTUP_SECONDS
+)
+
+# Import tracing
+from tracing import start_trace, end_trace, current_trace, span, sample_stacks
+from logging_setup import configure_logging
+
+# Import ratings storage
+from ratings_db import RatingsStore, RatingWriteBehindQueue
+from ratings_archive import RatingsArchive, archive_available, ARCHIVE_COLUMNS
+
+# boto3 (连接时) 和 pandas (解析XLSX时) 按需导入，以缩短worker启动时间
+
+# Configure logging: 记录经队列交给后台线程写入（文件和控制台），重复的消息按调用位置限流
+# LOG_FORMAT=json 输出每行一个JSON对象；LOG_SAMPLE_BURST=0 关闭限流
+log_listener = configure_logging(
+    path=os.environ.get('LOG_FILE', 'translation_app.log'),
+    level=os.environ.get('LOG_LEVEL', 'INFO'),
+    fmt=os.environ.get('LOG_FORMAT', 'text'),
+    sample_burst=int(os.environ.get('LOG_SAMPLE_BURST', '20')),
+    sample_interval=float(os.environ.get('LOG_SAMPLE_INTERVAL', '10'))
 )
 
 logger = logging.getLogger("BedrockTranslationApp")
 
 app = Flask(__name__)
-app.secret_key = os.urandom(24)  # For flash messages and session
+# For flash messages and session; 多worker部署时需设置相同的SECRET_KEY
+app.secret_key = os.environ.get('SECRET_KEY') or os.urandom(24)
 
 # Create uploads folder if it doesn't exist
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload size
+# 单个请求的最大大小（表单上传或一个分块）；更大的文件通过/api/uploads分块上传
+app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_CONTENT_LENGTH_MB', '64')) * 1024 * 1024
+# 允许通过表单提交长文档（Flask默认只允许500KB的表单字段），与请求大小上限一致
+app.config['MAX_FORM_MEMORY_SIZE'] = app.config['MAX_CONTENT_LENGTH']
+# 分块上传：总大小上限、建议的分块大小、上传记录保留时间、无数据超时
+app.config['UPLOAD_MAX_BYTES'] = int(os.environ.get('UPLOAD_MAX_MB', '2048')) * 1024 * 1024
+app.config['UPLOAD_CHUNK_SIZE'] = 8 * 1024 * 1024
+app.config['UPLOAD_TTL_HOURS'] = 24
+app.config['UPLOAD_IDLE_TIMEOUT'] = 3600
+# 上传文件翻译时同时在翻译中的行数
+app.config['UPLOAD_WINDOW'] = 64
+# 术语表目录（每个语言对一个CSV文件，如 English-Chinese.csv）和每个片段最多注入的术语数
+app.config['GLOSSARY_DIR'] = os.environ.get(
+    'GLOSSARY_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'glossaries'))
+app.config['GLOSSARY_MAX_TERMS'] = 50
+app.config['GLOSSARY_MAX_BYTES'] = 16 * 1024 * 1024
+# 批量翻译前在本地识别无需翻译的片段（数字、编号、URL、邮箱、已是目标语言的文本）并原样保留
+app.config['PREFILTER'] = os.environ.get('PREFILTER', '1').lower() in ('1', 'true', 'yes')
+# 批量任务的结果文件：保存目录、总大小上限、保留时间
+app.config['ARTIFACT_DIR'] = os.environ.get(
+    'ARTIFACT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'artifacts'))
+app.config['ARTIFACT_MAX_BYTES'] = int(os.environ.get('ARTIFACT_MAX_MB', '1024')) * 1024 * 1024
+app.config['ARTIFACT_TTL_HOURS'] = float(os.environ.get('ARTIFACT_TTL_HOURS', '72'))
+# 一个批量任务最多同时翻译成多少种语言
+app.config['MAX_TARGET_LANGUAGES'] = 20
+
+# 采样分析器只有显式开启时才可用
+app.config['ENABLE_PROFILER'] = os.environ.get('ENABLE_PROFILER', '').lower() in ('1', 'true', 'yes')
+app.config['PROFILER_MAX_SECONDS'] = 60
+
+# Ratings database
+app.config['RATINGS_DB'] = os.environ.get('RATINGS_DB_PATH', 'translation_ratings.db')
+app.config['RATING_STATS_MAX_DAYS'] = 366
+# 评分文本压缩方式: zlib, zstd (需要zstandard包) 或 none
+app.config['RATINGS_TEXT_CODEC'] = os.environ.get('RATINGS_TEXT_CODEC', 'zlib')
+# 单条评分先进入内存队列，由后台线程批量写入
+app.config['RATINGS_WRITE_BEHIND'] = os.environ.get('RATINGS_WRITE_BEHIND', '1').lower() in ('1', 'true', 'yes')
+app.config['RATINGS_BATCH_SIZE'] = 500
+app.config['RATINGS_FLUSH_INTERVAL'] = 0.5
+app.config['RATINGS_BULK_MAX'] = 10000
+# 超过保留天数的评分归档为按月Parquet文件（0表示不自动归档）
+app.config['RATINGS_ARCHIVE_DIR'] = os.environ.get(
+    'RATINGS_ARCHIVE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ratings_archive'))
+app.config['RATINGS_RETENTION_DAYS'] = int(os.environ.get('RATINGS_RETENTION_DAYS', '0'))
+app.config['RATINGS_RETENTION_INTERVAL_HOURS'] = 24
+
+# 通过Bedrock控制面API发现可用模型，结果缓存在本地文件中
+app.config['MODEL_DISCOVERY'] = os.environ.get('MODEL_DISCOVERY', '1').lower() in ('1', 'true', 'yes')
+# 额外预取的区域（逗号分隔），连接的区域总是包含在内
+app.config['MODEL_DISCOVERY_REGIONS'] = [r.strip() for r in os.environ.get('MODEL_DISCOVERY_REGIONS', '').split(',') if r.strip()]
+app.config['MODEL_CACHE_PATH'] = os.environ.get(
+    'MODEL_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'model_cache.json'))
+app.config['MODEL_CACHE_TTL_HOURS'] = float(os.environ.get('MODEL_CACHE_TTL_HOURS', '12'))
+# 连接后并发探测所有模型的可用性和延迟
+app.config['MODEL_PROBE'] = os.environ.get('MODEL_PROBE', '1').lower() in ('1', 'true', 'yes')
+app.config['MODEL_PROBE_WORKERS'] = 8
+
+# 多worker共享状态（连接设置、模型列表、任务进度）: sqlite:///path, redis://host:6379/0 或 memory://
+app.config['STATE_BACKEND_URL'] = os.environ.get(
+    'STATE_BACKEND_URL', 'sqlite:///' + os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shared_state.db'))
+app.config['STATE_SYNC_INTERVAL'] = 1.0
+# 多worker部署（gunicorn -w N、多台主机）：页面上输入的凭证无法共享，只允许使用默认凭证链连接
+app.config['MULTI_WORKER'] = os.environ.get(
+    'MULTI_WORKER', '1' if app.config['STATE_BACKEND_URL'].startswith('redis://') else '0').lower() in ('1', 'true', 'yes')
+app.config['JOB_TTL_HOURS'] = 24
+
+# 翻译结果保存在服务端，session中只保存result_id: shared (共享状态后端) 或 memory (进程内LRU)
+app.config['RESULT_STORE'] = os.environ.get('RESULT_STORE', 'shared')
+app.config['RESULT_TTL_SECONDS'] = 3600
+app.config['RESULT_CACHE_MAX_ITEMS'] = 1000
+app.config['RESULT_CACHE_MAX_BYTES'] = 64 * 1024 * 1024
+
+# 并发翻译引擎：同时进行的Bedrock调用数、每秒调用上限（0表示不限制）、翻译缓存
+app.config['ENGINE_MAX_WORKERS'] = int(os.environ.get('ENGINE_MAX_WORKERS', '8'))
+app.config['BEDROCK_RATE_LIMIT'] = float(os.environ.get('BEDROCK_RATE_LIMIT', '0'))
+# 调度：交互式翻译优先于批量任务；排队的交互式调用上限，以及接受新批量任务时允许的最大积压调用数
+app.config['SCHEDULER_INTERACTIVE_QUEUE'] = int(os.environ.get('SCHEDULER_INTERACTIVE_QUEUE', '64'))
+app.config['SCHEDULER_MAX_BATCH_BACKLOG'] = int(os.environ.get('SCHEDULER_MAX_BATCH_BACKLOG', '20000'))
+app.config['TRANSLATION_CACHE_SIZE'] = int(os.environ.get('TRANSLATION_CACHE_SIZE', '10000'))
+app.config['TRANSLATION_CACHE_TTL_HOURS'] = 24
+app.config['BATCH_API_MAX_SEGMENTS'] = 10000
+# NDJSON流式翻译：同时在翻译中的记录数（内存占用上限）和单条记录的最大字节数
+app.config['STREAM_WINDOW'] = 32
+app.config['STREAM_MAX_WINDOW'] = 256
+app.config['STREAM_MAX_RECORD_BYTES'] = 1024 * 1024
+
+# 自动选择模型（model_id为auto）：评分达到质量下限的模型中选择最快的
+app.config['ROUTER_QUALITY_FLOOR'] = float(os.environ.get('ROUTER_QUALITY_FLOOR', '4.0'))
+app.config['ROUTER_MIN_RATINGS'] = int(os.environ.get('ROUTER_MIN_RATINGS', '5'))
+app.config['ROUTER_QUALITY_DAYS'] = int(os.environ.get('ROUTER_QUALITY_DAYS', '30'))
+app.config['ROUTER_REFRESH_SECONDS'] = 60
+app.config['ROUTER_EXPLORE'] = float(os.environ.get('ROUTER_EXPLORE', '0.05'))
+# 模型对比：一次最多同时调用的模型数
+app.config['COMPARE_MAX_MODELS'] = int(os.environ.get('COMPARE_MAX_MODELS', '8'))
+
+# 交互式（优先调度）的端点
+INTERACTIVE_ENDPOINTS = {'translate', 'api_translate', 'api_compare'}
 
 # Allowed file extensions
 ALLOWED_EXTENSIONS = {'txt', 'csv', 'xlsx'}
 
-# Global variables
+# Global variables (本worker的副本，与共享状态同步)
 bedrock_client = None
 available_models = []
+# 编译好的模型目录（索引查找，分组结果按可用模型集合缓存）
+model_catalog = CATALOG
+
+# 启动时即加载磁盘上的模型列表缓存
+model_discovery = ModelDiscovery(app.config['MODEL_CACHE_PATH'],
+                                 ttl_seconds=app.config['MODEL_CACHE_TTL_HOURS'] * 3600)
+
+# 共享状态：连接设置、模型列表和探测结果、批量任务进度
+shared_state = create_state_backend(app.config['STATE_BACKEND_URL'])
+jobs = JobTracker(shared_state, ttl_seconds=app.config['JOB_TTL_HOURS'] * 3600)
+SHARED_KEYS = ('connection', 'model_listing', 'model_health')
+# 本worker已应用的共享状态版本
+synced_versions = {}
+last_state_sync = 0.0
+state_sync_lock = threading.Lock()
+
+def publish_state(key: str, value: Any):
+    """Write shared state and remember that this worker already has this version"""
+    synced_versions[key] = shared_state.set(key, value)
+
+# 翻译结果存储
+if app.config['RESULT_STORE'] == 'memory':
+    result_store = MemoryResultStore(max_items=app.config['RESULT_CACHE_MAX_ITEMS'],
+                                     max_bytes=app.config['RESULT_CACHE_MAX_BYTES'],
+                                     ttl_seconds=app.config['RESULT_TTL_SECONDS'])
+else:
+    result_store = SharedResultStore(shared_state, ttl_seconds=app.config['RESULT_TTL_SECONDS'])
+
+# 所有翻译调用共用的调度器：调用槽位和速率限制按优先级分配，同一优先级内各任务公平分享
+scheduler = RequestScheduler(
+    max_concurrency=app.config['ENGINE_MAX_WORKERS'],
+    rate_limiter=RateLimiter(app.config['BEDROCK_RATE_LIMIT']),
+    max_queue={'interactive': app.config['SCHEDULER_INTERACTIVE_QUEUE']},
+    backlog=lambda: translation_engine.pending,
+    max_backlog=app.config['SCHEDULER_MAX_BATCH_BACKLOG']
+)
+
+# 并发翻译引擎（批量API等使用），调用在调度器的工作线程中执行
+translation_engine = TranslationEngine(
+    lambda model_id, system_prompt, text: call_bedrock_api(model_id, system_prompt, text),
+    cache=TranslationCache(app.config['TRANSLATION_CACHE_SIZE'], app.config['TRANSLATION_CACHE_TTL_HOURS'] * 3600),
+    executor=scheduler
+)
+
+# 分块上传（元数据在共享状态中，数据在uploads目录）
+upload_manager = UploadManager(UPLOAD_FOLDER, shared_state,
+                               ttl_seconds=app.config['UPLOAD_TTL_HOURS'] * 3600,
+                               max_bytes=app.config['UPLOAD_MAX_BYTES'])
+
+# 术语表（Aho-Corasick匹配，文件修改后自动重建）
+glossaries = GlossaryStore(app.config['GLOSSARY_DIR'], max_terms=app.config['GLOSSARY_MAX_TERMS'])
+
+# 批量任务结果（按时间和总大小淘汰，预压缩）
+artifact_store = ArtifactStore(app.config['ARTIFACT_DIR'], max_bytes=app.config['ARTIFACT_MAX_BYTES'],
+                               ttl_seconds=app.config['ARTIFACT_TTL_HOURS'] * 3600)
+
+# 模型探测结果：可用性、首次响应时间和可用的调用路径
+model_health = ModelHealth(max_workers=app.config['MODEL_PROBE_WORKERS'],
+                           on_complete=lambda results: publish_state('model_health', results))
+PROBE_SYSTEM_PROMPT = 'Translate the following text from English to Chinese. Reply with the translation only.'
+PROBE_TEXT = 'Hello'
+
+# 批量翻译队列深度：本worker中尚未完成的行数
+BATCH_QUEUE_DEPTH.set_function(jobs.remaining)
+
+# Ratings storage (connections are reused per thread)
+ratings_store = RatingsStore(app.config['RATINGS_DB'], text_codec=app.config['RATINGS_TEXT_CODEC'])
+
+# rating_stats响应缓存: (granularity, days, 窗口起始小时) -> (data_version, JSON body)
+rating_stats_cache = {}
+rating_stats_cache_lock = threading.Lock()
+
+def invalidate_rating_stats_cache(written=None):
+    """Drop cached stats after ratings were written (other processes notice via data_version)"""
+    with rating_stats_cache_lock:
+        rating_stats_cache.clear()
+    if written:
+        RATINGS_WRITTEN.inc(written, mode='write_behind')
 
-# Global variable to track translation progress
-translation_progress = {
-    'total': 0,
-    'completed': 0,
-    'percent': 0
-}
+ratings_writer = RatingWriteBehindQueue(
+    ratings_store,
+    batch_size=app.config['RATINGS_BATCH_SIZE'],
+    flush_interval=app.config['RATINGS_FLUSH_INTERVAL'],
+    on_flush=invalidate_rating_stats_cache
+)
+RATINGS_WRITE_QUEUE_DEPTH.set_function(ratings_writer.pending)
+atexit.register(ratings_writer.stop)
+
+ratings_archive = RatingsArchive(ratings_store, app.config['RATINGS_ARCHIVE_DIR'])
+
+# 自动模型选择：本worker的调用延迟 + 评分汇总表中的质量
+model_router = ModelRouter(
+    lambda source_lang, target_lang: ratings_store.model_quality(
+        datetime.now() - timedelta(days=app.config['ROUTER_QUALITY_DAYS']), source_lang, target_lang),
+    quality_floor=app.config['ROUTER_QUALITY_FLOOR'],
+    min_ratings=app.config['ROUTER_MIN_RATINGS'],
+    refresh_seconds=app.config['ROUTER_REFRESH_SECONDS'],
+    explore=app.config['ROUTER_EXPLORE']
+)
+ratings_archive_lock = threading.Lock()
+
+def run_ratings_retention(retention_days: int) -> Dict[str, Any]:
+    """Archive ratings older than the retention window, one run at a time per process"""
+    with ratings_archive_lock:
+        # 先写入排队中的评分，避免它们绕过本次归档
+        ratings_writer.flush()
+        return ratings_archive.archive_older_than(retention_days)
+
+def ratings_retention_loop():
+    """Periodically archive old ratings in the background"""
+    while True:
+        try:
+            run_ratings_retention(app.config['RATINGS_RETENTION_DAYS'])
+        except Exception as e:
+            logger.error(f"Ratings retention run failed: {str(e)}", exc_info=True)
+        time.sleep(app.config['RATINGS_RETENTION_INTERVAL_HOURS'] * 3600)
+
+def start_ratings_retention():
+    """Start the retention thread when a retention window is configured"""
+    if app.config['RATINGS_RETENTION_DAYS'] <= 0:
+        return
+    if not archive_available():
+        logger.warning("RATINGS_RETENTION_DAYS is set but pyarrow is not installed; ratings will not be archived")
+        return
+    threading.Thread(target=ratings_retention_loop, name='ratings-retention', daemon=True).start()
+    logger.info(f"Archiving ratings older than {app.config['RATINGS_RETENTION_DAYS']} days every {app.config['RATINGS_RETENTION_INTERVAL_HOURS']}h")
 
 # Initialize database for ratings
 def init_db():
     """Initialize the SQLite database for storing translation ratings"""
-    conn = sqlite3.connect('translation_ratings.db')
-    c = conn.cursor()
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS ratings (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        source_text TEXT,
-        translated_text TEXT,
-        source_language TEXT,
-        target_language TEXT,
-        model_id TEXT,
-        rating INTEGER,
-        timestamp DATETIME
-    )
-    ''')
-    conn.commit()
-    conn.close()
-    logger.info("Initialized ratings database")
+    ratings_store.init_schema()
 
-# Initialize database on startup
-init_db()
+# 启动耗时报告，同时以translator_startup_seconds{phase}指标暴露
+startup_report = {}
+_app_initialized = False
+_app_init_lock = threading.Lock()
+
+def scrub_shared_credentials():
+    """Remove AWS credentials that earlier versions stored in the shared connection settings"""
+    try:
+        settings = shared_state.get('connection')
+        if settings and ('access_key' in settings or 'secret_key' in settings):
+            publish_state('connection', shared_connection_settings(settings, settings.get('region')))
+            logger.warning("Removed AWS credentials from the shared connection settings")
+    except Exception as e:
+        logger.warning(f"Could not check shared connection settings: {str(e)}")
+
+def create_app():
+    """Initialize the application once per process and return it
+    
+    Run it with `python app.py` or `gunicorn "app:create_app()"`. Importing the
+    module only defines routes; the database schema/migration and background
+    threads are started here.
+    """
+    global _app_initialized
+    with _app_init_lock:
+        if _app_initialized:
+            return app
+        init_start = time.perf_counter()
+        init_db()
+        scrub_shared_credentials()
+        db_done = time.perf_counter()
+        start_ratings_retention()
+        ready = time.perf_counter()
+        
+        startup_report.update({
+            'imports': _import_done - _import_start,
+            'init_db': db_done - init_start,
+            'background_tasks': ready - db_done,
+            'total': ready - _import_start,
+        })
+        for phase, seconds in startup_report.items():
+            STARTUP_SECONDS.set(seconds, phase=phase)
+        logger.info(f"Worker {os.getpid()} ready in {startup_report['total'] * 1000:.0f} ms "
+                    f"(imports {startup_report['imports'] * 1000:.0f} ms, "
+                    f"init_db {startup_report['init_db'] * 1000:.0f} ms, "
+                    f"background tasks {startup_report['background_tasks'] * 1000:.0f} ms)")
+        _app_initialized = True
+    return app
 
 def allowed_file(filename):
-    """Check if the file extension is allowed"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+    """Check if the file extension is allowed (txt/csv may be gzip- or zip-compressed)"""
+    extension, compression = file_extensions(filename)
+    if compression in COMPRESSED_EXTENSIONS:
+        return extension in STREAMABLE_EXTENSIONS
+    return extension in ALLOWED_EXTENSIONS
+
+@app.before_request
+def ensure_initialized():
+    """Initialize on the first request when the app was not created through create_app()"""
+    if not _app_initialized:
+        create_app()
+
+@app.before_request
+def sync_worker_state():
+    """Pick up connection and model list changes made by other workers"""
+    sync_shared_state()
+
+@app.before_request
+def start_request_timer():
+    """Remember when the request started and open a trace for it"""
+    g.request_start = time.perf_counter()
+    g.trace_token = start_trace(request.headers.get('X-Trace-Id'))
+
+@app.before_request
+def classify_traffic():
+    """Interactive translations are scheduled ahead of batch work; each client is its own flow"""
+    if request.endpoint in INTERACTIVE_ENDPOINTS:
+        set_traffic('interactive', flow=request.remote_addr or 'unknown')
+    else:
+        set_traffic('batch', flow=f'request:{request.remote_addr}')
+
+@app.errorhandler(SchedulerBusy)
+def scheduler_busy(error):
+    """Admission control rejected the request"""
+    logger.warning("Rejected %s: %s", request.endpoint, error)
+    if request.path.startswith('/api/'):
+        response = jsonify({'error': str(error), 'retry_after': error.retry_after})
+        response.status_code = 503
+    else:
+        flash(str(error), 'warning')
+        response = redirect(url_for('index'))
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response
+
+@app.after_request
+def record_request_metrics(response):
+    """Record per-endpoint request counts and latency, and return the trace headers"""
+    start = getattr(g, 'request_start', None)
+    if start is not None:
+        endpoint = request.endpoint or 'unknown'
+        HTTP_LATENCY.observe(time.perf_counter() - start, endpoint=endpoint, method=request.method)
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=str(response.status_code))
+    
+    trace = current_trace()
+    if trace is not None:
+        response.headers['X-Trace-Id'] = trace.trace_id
+        response.headers['Server-Timing'] = trace.server_timing()
+    return response
+
+@app.teardown_request
+def finish_trace(exc=None):
+    """Close the request trace"""
+    token = g.pop('trace_token', None)
+    if token is not None:
+        end_trace(token)
+
+@app.route('/metrics')
+def metrics():
+    """Expose Prometheus-style metrics"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE_LATEST)
+
+@app.route('/debug/profile')
+def debug_profile():
+    """Sample this worker's threads for N seconds and return folded stacks for a flame graph"""
+    if not app.config['ENABLE_PROFILER']:
+        return jsonify({'error': 'Profiler is disabled. Set ENABLE_PROFILER=1 to enable it.'}), 404
+    
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval_ms = float(request.args.get('interval_ms', 5))
+    except ValueError:
+        return jsonify({'error': 'Invalid seconds or interval_ms'}), 400
+    seconds = max(0.1, min(seconds, app.config['PROFILER_MAX_SECONDS']))
+    interval_ms = max(1.0, interval_ms)
+    
+    logger.info(f"Profiling worker {os.getpid()} for {seconds}s every {interval_ms}ms")
+    folded = sample_stacks(seconds, interval_ms / 1000.0)
+    
+    response = Response(folded, mimetype='text/plain')
+    response.headers['Content-Disposition'] = f'attachment; filename=profile_{os.getpid()}_{int(time.time())}.folded'
+    return response
 
 @app.route('/')
 def index():
     """Render the main page"""
     # 将模型按组分类
     grouped_models = {}
-    
+    health = {}
+    recommended_model = None
     if bedrock_client is not None:
-        # 按MODEL_GROUPS中的分组组织模型
-        for group_name, model_ids in MODEL_GROUPS.items():
-            group_models = []
-            for model_id in model_ids:
-                # 检查模型是否在available_models中
-                model_info = next((m for m in available_models if m['id'] == model_id), None)
-                if model_info:
-                    group_models.append(model_info)
-            
-            if group_models:  # 只添加非空组
-                grouped_models[group_name] = group_models
+        model_ids = [m['id'] for m in available_models]
+        grouped_models = model_catalog.grouped(model_ids)
+        health = model_health.snapshot()
+        # 未选择模型时默认选中探测最快的可用模型
+        recommended_model = model_health.fastest(model_ids)
+    
+    # 上一次表单翻译的结果
+    result = result_store.get(session.get('result_id'))
+    
+    with span('render.template'):
+        return render_template('index.html', 
+                              connected=(bedrock_client is not None),
+                              result=result,
+                              models=available_models,
+                              grouped_models=grouped_models,
+                              model_health=health,
+                              recommended_model=recommended_model,
+                              max_form_upload=app.config['MAX_CONTENT_LENGTH'],
+                              compare_max_models=app.config['COMPARE_MAX_MODELS'])
+
+def create_bedrock_session(settings: Dict[str, Any]):
+    """Build a boto3 session from connection settings"""
+    import boto3
+    
+    if settings.get('use_profile'):
+        return boto3.Session(region_name=settings.get('region'))
+    # 注意: 在生产环境中，应该使用更安全的方式处理凭证
+    # Note: In production, you should use a more secure way to handle credentials
+    return boto3.Session(
+        aws_access_key_id=settings['access_key'],
+        aws_secret_access_key=settings['secret_key'],
+        region_name=settings['region']
+    )
+
+def shared_connection_settings(settings: Dict[str, Any], region: str) -> Dict[str, Any]:
+    """Connection settings published to other workers: never the credentials themselves"""
+    return {'use_profile': bool(settings.get('use_profile')), 'region': region}
+
+def sync_shared_state(force: bool = False):
+    """Apply connection settings, model list and probe results published by other workers"""
+    global bedrock_client, last_state_sync
+    now = time.monotonic()
+    if not force and now - last_state_sync < app.config['STATE_SYNC_INTERVAL']:
+        return
+    # 其他线程正在同步时不等待
+    if not state_sync_lock.acquire(blocking=False):
+        return
+    try:
+        last_state_sync = now
+        versions = shared_state.versions(SHARED_KEYS)
+        changed = [key for key in SHARED_KEYS if versions.get(key) != synced_versions.get(key)]
+        if 'connection' in changed:
+            settings = shared_state.get('connection')
+            # 每个worker用共享的连接设置创建自己的客户端；共享设置不含凭证，
+            # 用页面输入的凭证连接时其他worker保持未连接，而不是换用默认凭证链的身份
+            if settings and not settings.get('use_profile'):
+                logger.warning("Another worker connected with credentials that are not shared; this worker stays disconnected")
+                settings = None
+            bedrock_client = create_bedrock_session(settings).client('bedrock-runtime') if settings else None
+            logger.info(f"Worker {os.getpid()} {'connected to' if settings else 'disconnected from'} AWS Bedrock from shared settings")
+        if 'model_listing' in changed:
+            use_model_catalog((shared_state.get('model_listing') or {}).get('listing'), publish=False)
+        if 'model_health' in changed:
+            model_health.load(shared_state.get('model_health') or {})
+        synced_versions.update(versions)
+    except Exception as e:
+        logger.warning(f"Could not sync shared state: {str(e)}")
+    finally:
+        state_sync_lock.release()
+
+def use_model_catalog(listing: Optional[Dict[str, Any]] = None, publish: bool = True):
+    """Make a discovered model listing (or the configured models when None) the active model list
+    
+    The worker that changes the list publishes it and probes the models; the
+    other workers pick both up from the shared state.
+    """
+    global model_catalog, available_models
+    catalog = catalog_from_listing(listing) if listing else None
+    if catalog is None or not catalog.models:
+        catalog, listing = CATALOG, None
+    model_catalog = catalog
+    available_models = list(catalog.models)
+    if publish:
+        publish_state('model_listing', {'listing': listing})
+        if bedrock_client is not None and app.config['MODEL_PROBE']:
+            model_health.probe_async([m['id'] for m in available_models], probe_model)
+
+def probe_model(model_id: str) -> Tuple[str, str, Optional[float]]:
+    """Send a tiny translation through the scheduler at batch priority, returning the path that worked and its latency"""
+    # 探测与其他批量任务一样受调用槽位和速率限制约束，不影响交互请求
+    set_traffic('batch', flow='model-probe')
+    return scheduler.submit(_probe_call, model_id).result()
+
+def _probe_call(model_id: str) -> Tuple[str, str, Optional[float]]:
+    details = {}
+    call_details.set(details)
+    _, path, target = _call_bedrock_api(model_id, PROBE_SYSTEM_PROMPT, PROBE_TEXT, use_route=False)
+    # 只计成功的那次尝试，失败的回退尝试不算作模型的延迟
+    return path, target, details.get('attempt_seconds')
+
+def discovery_scope(session) -> str:
+    """Identify which credentials a cached model listing belongs to, without storing the key"""
+    if session.profile_name and session.profile_name != 'default':
+        return f'profile:{session.profile_name}'
+    credentials = session.get_credentials()
+    access_key = credentials.access_key if credentials else 'anonymous'
+    return 'key:' + hashlib.sha256(access_key.encode('utf-8')).hexdigest()[:16]
+
+def start_model_discovery(session, region: str) -> bool:
+    """Use the cached model listing for this account/region and refresh it in the background when stale
+    
+    Returns True if a background refresh was started.
+    """
+    scope = discovery_scope(session)
+    use_model_catalog(model_discovery.cached(scope, region))
+    if model_discovery.is_fresh(scope, region):
+        return False
+    
+    client = bedrock_client
+    def on_discovered(results):
+        # 只有仍然是同一个连接时才替换模型列表
+        if bedrock_client is client and results.get(region):
+            use_model_catalog(results[region])
+            logger.info(f"Model list updated from discovery: {len(available_models)} models")
     
-    return render_template('index.html', 
-                          connected=(bedrock_client is not None),
-                          models=available_models,
-                          grouped_models=grouped_models)
+    regions = [region] + app.config['MODEL_DISCOVERY_REGIONS']
+    return model_discovery.refresh_async(scope, regions, lambda r: session.client('bedrock', region_name=r),
+                                         on_done=on_discovered)
 
 @app.route('/connect', methods=['POST'])
 def connect():
@@ -131,7 +625,8 @@ def connect():
         if use_profile:
             # Use default profile
             logger.info("Using default AWS profile")
-            session = boto3.Session()
+            settings = {'use_profile': True}
+            session = create_bedrock_session(settings)
             region = session.region_name or 'us-east-1'
         else:
             # Use explicit credentials
@@ -142,40 +637,30 @@ def connect():
             if not access_key or not secret_key:
                 flash('Please enter AWS credentials', 'danger')
                 return redirect(url_for('index'))
+            if app.config['MULTI_WORKER']:
+                # 凭证不写入共享状态，其他worker无法使用
+                flash('This server runs several workers and cannot share credentials entered here. '
+                      'Provide them through the default AWS credential chain (environment, credentials file '
+                      'or instance role) and connect with "Use default AWS profile".', 'danger')
+                return redirect(url_for('index'))
             
-            # 注意: 在生产环境中，应该使用更安全的方式处理凭证
-            # Note: In production, you should use a more secure way to handle credentials
             logger.info(f"Using explicit credentials with region {region}")
-            session = boto3.Session(
-                aws_access_key_id=access_key,
-                aws_secret_access_key=secret_key,
-                region_name=region
-            )
+            settings = {'use_profile': False, 'access_key': access_key, 'secret_key': secret_key, 'region': region}
+            session = create_bedrock_session(settings)
         
         # Create Bedrock client
         bedrock_client = session.client('bedrock-runtime')
+        # 发布连接设置（不含凭证），其他worker在下一个请求时据此创建自己的客户端
+        publish_state('connection', shared_connection_settings(settings, region))
         
-        # 初始化可用模型列表
-        available_models = []
-        
-        # 直接使用FOUNDATION_MODELS和INFERENCE_PROFILES中定义的模型
-        # 1. 添加基础模型
-        for model_key, model_id in FOUNDATION_MODELS.items():
-            # 跳过需要inference profile的模型
-            if not requires_inference_profile(model_id):
-                available_models.append({
-                    'id': model_id,
-                    'name': MODEL_DISPLAY_NAMES.get(model_id, model_id)
-                })
-        
-        # 2. 添加inference profiles
-        for profile_key, profile_arn in INFERENCE_PROFILES.items():
-            available_models.append({
-                'id': profile_arn,
-                'name': MODEL_DISPLAY_NAMES.get(profile_arn, profile_arn)
-            })
+        # 可用模型列表：优先使用缓存的发现结果，过期时在后台刷新
+        if app.config['MODEL_DISCOVERY']:
+            if start_model_discovery(session, region):
+                flash('Refreshing the model list from AWS Bedrock in the background; reload the page in a moment to see it', 'info')
+        else:
+            use_model_catalog(None)
         
-        logger.info(f"Added {len(available_models)} models from configuration")
+        logger.info(f"Added {len(available_models)} models to the model list")
         
         flash('Successfully connected to AWS Bedrock', 'success')
         logger.info("Successfully connected to AWS Bedrock")
@@ -187,6 +672,23 @@ def connect():
     
     return redirect(url_for('index'))
 
+@app.route('/api/models')
+def api_models():
+    """Return the compiled model catalog; clients revalidate with If-None-Match"""
+    response = Response(model_catalog.json, mimetype='application/json')
+    response.set_etag(model_catalog.etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@app.route('/api/models/health')
+def api_models_health():
+    """Return the latest probe result of every model"""
+    return jsonify({
+        'connected': bedrock_client is not None,
+        'recommended_model': model_health.fastest([m['id'] for m in available_models]),
+        'models': model_health.snapshot()
+    })
+
 @app.route('/translate', methods=['POST'])
 def translate():
     """Translate text using AWS Bedrock"""
@@ -208,10 +710,17 @@ def translate():
         flash('Please select a model', 'warning')
         return redirect(url_for('index'))
     
+    # auto: 为该语言对选择模型
+    requested_model = model_id
+    model_id = route_model(model_id, source_lang, target_lang)
+    if not model_id:
+        flash('No available model for automatic selection', 'danger')
+        return redirect(url_for('index'))
+    
     # 检查是否是需要inference profile的模型
-    if not is_inference_profile(model_id) and requires_inference_profile(model_id):
+    if not is_inference_profile(model_id) and model_catalog.requires_inference_profile(model_id):
         # 尝试找到对应的inference profile
-        profile_arn = get_corresponding_profile(model_id)
+        profile_arn = model_catalog.corresponding_profile(model_id)
         if profile_arn:
             flash(f'模型 {model_id} 只能通过inference profile调用。已自动切换到对应的profile。', 'warning')
             model_id = profile_arn
@@ -220,14 +729,16 @@ def translate():
             return redirect(url_for('index'))
     
     # Save user selections in session
-    session['selected_model'] = model_id
+    session['selected_model'] = AUTO_MODEL_ID if requested_model == AUTO_MODEL_ID else model_id
     session['source_language'] = source_lang
     session['target_language'] = target_lang
     session['system_prompt'] = system_prompt
     
     # Replace placeholders in system prompt
-    system_prompt = system_prompt.replace('{sourceLanguage}', source_lang)
-    system_prompt = system_prompt.replace('{targetLanguage}', target_lang)
+    with span('prompt.build'):
+        system_prompt = system_prompt.replace('{sourceLanguage}', source_lang)
+        system_prompt = system_prompt.replace('{targetLanguage}', target_lang)
+        system_prompt = glossaries.apply(system_prompt, input_text, source_lang, target_lang)
     
     logger.info(f"Starting translation from {source_lang} to {target_lang} using model {model_id}")
     
@@ -235,13 +746,21 @@ def translate():
         # Call Bedrock API for translation
         translated_text = call_bedrock_api(model_id, system_prompt, input_text)
         
-        # Store results in session for display
-        session['original_text'] = input_text
-        session['translated_text'] = translated_text
+        # Store results server-side; the session only keeps the result ID
+        session['result_id'] = result_store.put({
+            'original_text': input_text,
+            'translated_text': translated_text,
+            'source_language': source_lang,
+            'target_language': target_lang,
+            'model_id': model_id
+        })
         
         flash('Translation completed successfully', 'success')
         logger.info("Translation completed successfully")
-        
+
+    except SchedulerBusy:
+        # 由scheduler_busy处理：提示稍后重试并设置Retry-After
+        raise
     except Exception as e:
         error_msg = str(e)
         flash(f'Translation error: {error_msg}', 'danger')
@@ -268,10 +787,15 @@ def api_translate():
     if not model_id:
         return jsonify({'error': 'Please select a model'}), 400
     
+    routed = model_id == AUTO_MODEL_ID
+    model_id = route_model(model_id, source_lang, target_lang)
+    if not model_id:
+        return jsonify({'error': 'No available model for automatic selection'}), 503
+    
     # 检查是否是需要inference profile的模型
-    if not is_inference_profile(model_id) and requires_inference_profile(model_id):
+    if not is_inference_profile(model_id) and model_catalog.requires_inference_profile(model_id):
         # 尝试找到对应的inference profile
-        profile_arn = get_corresponding_profile(model_id)
+        profile_arn = model_catalog.corresponding_profile(model_id)
         if profile_arn:
             logger.warning(f'模型 {model_id} 只能通过inference profile调用。已自动切换到对应的profile: {profile_arn}')
             model_id = profile_arn
@@ -281,8 +805,10 @@ def api_translate():
             return jsonify({'error': error_msg}), 400
     
     # Replace placeholders in system prompt
-    system_prompt = system_prompt.replace('{sourceLanguage}', source_lang)
-    system_prompt = system_prompt.replace('{targetLanguage}', target_lang)
+    with span('prompt.build'):
+        system_prompt = system_prompt.replace('{sourceLanguage}', source_lang)
+        system_prompt = system_prompt.replace('{targetLanguage}', target_lang)
+        system_prompt = glossaries.apply(system_prompt, input_text, source_lang, target_lang)
     
     logger.info(f"API: Starting translation from {source_lang} to {target_lang} using model {model_id}")
     
@@ -295,29 +821,334 @@ def api_translate():
             'translated_text': translated_text,
             'source_language': source_lang,
             'target_language': target_lang,
-            'model_id': model_id
+            'model_id': model_id,
+            'auto_routed': routed
         })
         
+    except SchedulerBusy:
+        raise
     except Exception as e:
         error_msg = str(e)
         logger.error(f"API Translation error: {error_msg}", exc_info=True)
         return jsonify({'error': error_msg}), 500
 
+def resolve_model_id(model_id: str) -> Tuple[str, Optional[str]]:
+    """Switch models that need an inference profile to their profile; returns (model_id, error)"""
+    if not is_inference_profile(model_id) and model_catalog.requires_inference_profile(model_id):
+        profile_arn = model_catalog.corresponding_profile(model_id)
+        if not profile_arn:
+            return model_id, f'错误: 模型 {model_id} 只能通过inference profile调用，但找不到对应的profile。请选择带有(Inference Profile)标记的模型。'
+        logger.warning(f'模型 {model_id} 只能通过inference profile调用。已自动切换到对应的profile: {profile_arn}')
+        return profile_arn, None
+    return model_id, None
+
+def routable_models() -> List[str]:
+    """Models that automatic routing may pick: available, and callable without switching to a profile"""
+    health = model_health.snapshot()
+    return [m['id'] for m in available_models
+            if health.get(m['id'], {}).get('available', True)
+            and (is_inference_profile(m['id']) or not model_catalog.requires_inference_profile(m['id']))]
+
+def probe_latencies() -> Dict[str, float]:
+    """Probe latency (seconds) of the available models"""
+    return {model_id: result['ttfb_ms'] / 1000 for model_id, result in model_health.snapshot().items()
+            if result['available'] and result['ttfb_ms'] is not None}
+
+def route_model(model_id: str, source_lang: str, target_lang: str) -> Optional[str]:
+    """Resolve model "auto" to a concrete model for the language pair; other model IDs are returned unchanged"""
+    if model_id != AUTO_MODEL_ID:
+        return model_id
+    with span('model.route'):
+        routed, reason = model_router.choose(routable_models(), source_lang, target_lang, probe_latencies())
+    if routed:
+        logger.debug("Auto model routing %s -> %s: %s (%s)", source_lang, target_lang, routed, reason)
+    return routed
+
+@app.route('/api/models/route')
+def api_model_route():
+    """Show the automatic routing decision and its inputs for a language pair"""
+    source_lang = request.args.get('source_language', 'English')
+    target_lang = request.args.get('target_language', 'Chinese')
+    model_ids = routable_models()
+    probe_latency = probe_latencies()
+    # 与route_model相同的决策（不探索、不计入指标）
+    model_id, reason = model_router.choose(model_ids, source_lang, target_lang, probe_latency, preview=True)
+    return jsonify({
+        'source_language': source_lang,
+        'target_language': target_lang,
+        'quality_floor': model_router.quality_floor,
+        'min_ratings': model_router.min_ratings,
+        'model_id': model_id,
+        'reason': reason,
+        'candidates': model_router.candidates(model_ids, source_lang, target_lang, probe_latency)
+    })
+
+def compare_model(model_id: str, system_prompt: str, input_text: str) -> Dict[str, Any]:
+    """Translate with one model for a comparison, measuring latency, token usage and the invocation path"""
+    details = {'model_id': model_id, 'path': None, 'input_tokens': None, 'output_tokens': None}
+    call_details.set(details)
+    start = time.perf_counter()
+    try:
+        details['translated_text'] = call_bedrock_api(model_id, system_prompt, input_text)
+    except Exception as e:
+        details['error'] = str(e)
+    details['latency_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return details
+
+@app.route('/api/compare', methods=['POST'])
+def api_compare():
+    """Translate one text with several models concurrently and return the results side by side
+    
+    Body: {"input_text": ..., "model_ids": [...], "source_language": ...,
+    "target_language": ..., "system_prompt": ...}. Every result has the
+    model's `translated_text` or `error`, `latency_ms`, `input_tokens`,
+    `output_tokens` and the invocation `path`. The translation cache is not
+    used, so latencies are measured live.
+    """
+    if not bedrock_client:
+        return jsonify({'error': 'Not connected to AWS Bedrock'}), 400
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('model_ids'), list):
+        return jsonify({'error': 'Expected a JSON object with a "model_ids" array'}), 400
+    input_text = str(data.get('input_text', '')).strip()
+    model_ids = list(dict.fromkeys(m for m in data['model_ids'] if isinstance(m, str) and m))
+    source_lang = data.get('source_language', 'English')
+    target_lang = data.get('target_language', 'Chinese')
+    system_prompt = data.get('system_prompt', '')
+    if not input_text:
+        return jsonify({'error': 'Please enter text to translate'}), 400
+    if not model_ids:
+        return jsonify({'error': 'Please select at least one model'}), 400
+    if len(model_ids) > app.config['COMPARE_MAX_MODELS']:
+        return jsonify({'error': f"At most {app.config['COMPARE_MAX_MODELS']} models per comparison"}), 400
+    
+    with span('prompt.build'):
+        system_prompt = system_prompt.replace('{sourceLanguage}', source_lang)
+        system_prompt = system_prompt.replace('{targetLanguage}', target_lang)
+        system_prompt = glossaries.apply(system_prompt, input_text, source_lang, target_lang)
+    
+    logger.info(f"API: Comparing {len(model_ids)} models from {source_lang} to {target_lang}")
+    
+    # 所有模型同时提交给调度器（交互优先级），结果按选择顺序返回
+    start = time.perf_counter()
+    pending = []
+    for model_id in model_ids:
+        resolved, error_msg = resolve_model_id(model_id)
+        if error_msg:
+            pending.append({'model_id': model_id, 'error': error_msg})
+        else:
+            pending.append(scheduler.submit(compare_model, resolved, system_prompt, input_text))
+    results = [item if isinstance(item, dict) else item.result() for item in pending]
+    
+    return jsonify({
+        'original_text': input_text,
+        'source_language': source_lang,
+        'target_language': target_lang,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1),
+        'results': results
+    })
+
+@app.route('/api/translate_batch', methods=['POST'])
+def api_translate_batch():
+    """Translate an array of segments with shared model, languages and prompt
+    
+    Body: {"segments": ["text", ...], "model_id": ..., "source_language": ...,
+    "target_language": ..., "system_prompt": ...}. Results are returned in
+    input order, with an `error` instead of `translated_text` for failed items.
+    """
+    if not bedrock_client:
+        return jsonify({'error': 'Not connected to AWS Bedrock'}), 400
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not isinstance(data.get('segments'), list):
+        return jsonify({'error': 'Expected a JSON object with a "segments" array'}), 400
+    
+    segments = data['segments']
+    if len(segments) > app.config['BATCH_API_MAX_SEGMENTS']:
+        return jsonify({'error': f"At most {app.config['BATCH_API_MAX_SEGMENTS']} segments per request"}), 413
+    if not all(isinstance(segment, str) for segment in segments):
+        return jsonify({'error': 'Every segment must be a string'}), 400
+    
+    model_id = data.get('model_id', '')
+    source_lang = data.get('source_language', 'English')
+    target_lang = data.get('target_language', 'Chinese')
+    system_prompt = data.get('system_prompt', '')
+    if not model_id:
+        return jsonify({'error': 'Please select a model'}), 400
+    model_id = route_model(model_id, source_lang, target_lang)
+    if not model_id:
+        return jsonify({'error': 'No available model for automatic selection'}), 503
+    model_id, error_msg = resolve_model_id(model_id)
+    if error_msg:
+        return jsonify({'error': error_msg}), 400
+    
+    with span('prompt.build'):
+        system_prompt = system_prompt.replace('{sourceLanguage}', source_lang)
+        system_prompt = system_prompt.replace('{targetLanguage}', target_lang)
+        # 术语表按片段匹配，只把出现的术语加入提示词；无需翻译的片段原样返回
+        system_prompt = segment_prompt(system_prompt, source_lang, target_lang)
+    
+    scheduler.admit('batch')
+    set_traffic('batch', flow=f'batch-api:{request.remote_addr}')
+    logger.info(f"API: Batch translation of {len(segments)} segments from {source_lang} to {target_lang} using model {model_id}")
+    
+    # 空白片段原样返回，不调用模型
+    indexes = [i for i, segment in enumerate(segments) if segment.strip()]
+    results = [{'index': i, 'translated_text': segment, 'source': 'skipped'} for i, segment in enumerate(segments)]
+    with span('engine.translate_many', segments=len(indexes)):
+        translated = translation_engine.translate_many(model_id, system_prompt, [segments[i].strip() for i in indexes])
+    for i, result in zip(indexes, translated):
+        result['index'] = i
+        results[i] = result
+    
+    summary = {'total': len(segments), 'failed': 0, 'called': 0, 'cached': 0, 'inflight': 0, 'skipped': 0}
+    for result in results:
+        summary[result['source']] += 1
+        if 'error' in result:
+            summary['failed'] += 1
+    
+    return jsonify({
+        'model_id': model_id,
+        'source_language': source_lang,
+        'target_language': target_lang,
+        'summary': summary,
+        'results': results
+    })
+
+def iter_ndjson_lines(stream, max_bytes: int):
+    """Yield (line number, bytes or None if the line was too long) from a byte stream as it arrives"""
+    line_no = 0
+    while True:
+        line = stream.readline(max_bytes + 1)
+        if not line:
+            return
+        line_no += 1
+        if len(line) > max_bytes and not line.endswith(b'\n'):
+            # 丢弃超长行的剩余部分
+            while line and not line.endswith(b'\n'):
+                line = stream.readline(max_bytes)
+            yield line_no, None
+            continue
+        if line.strip():
+            yield line_no, line
+
+@app.route('/api/translate_stream', methods=['POST'])
+def api_translate_stream():
+    """Translate one field of every NDJSON record in the request body, streaming NDJSON results back
+    
+    Query parameters: model_id, source_language, target_language, system_prompt,
+    field (default "text"), output_field (default "<field>_translated"), window.
+    Records are read as they arrive and at most `window` are in flight, so
+    memory stays bounded however long the feed is. Output keeps each record's
+    keys and order; failed records get an "_error" key.
+    """
+    if not bedrock_client:
+        return jsonify({'error': 'Not connected to AWS Bedrock'}), 400
+    
+    args = request.args
+    model_id = args.get('model_id', '')
+    source_lang = args.get('source_language', 'English')
+    target_lang = args.get('target_language', 'Chinese')
+    system_prompt = args.get('system_prompt', '')
+    field = args.get('field', 'text')
+    output_field = args.get('output_field') or f'{field}_translated'
+    try:
+        window = max(1, min(int(args.get('window', app.config['STREAM_WINDOW'])), app.config['STREAM_MAX_WINDOW']))
+    except ValueError:
+        return jsonify({'error': 'Invalid window'}), 400
+    if not model_id:
+        return jsonify({'error': 'Please select a model'}), 400
+    model_id = route_model(model_id, source_lang, target_lang)
+    if not model_id:
+        return jsonify({'error': 'No available model for automatic selection'}), 503
+    model_id, error_msg = resolve_model_id(model_id)
+    if error_msg:
+        return jsonify({'error': error_msg}), 400
+    
+    system_prompt = system_prompt.replace('{sourceLanguage}', source_lang)
+    system_prompt = system_prompt.replace('{targetLanguage}', target_lang)
+    system_prompt = segment_prompt(system_prompt, source_lang, target_lang)
+    
+    # 直接读取请求体流（不受MAX_CONTENT_LENGTH限制），逐行处理
+    stream = get_input_stream(request.environ)
+    max_bytes = app.config['STREAM_MAX_RECORD_BYTES']
+    scheduler.admit('batch')
+    job_id = jobs.new_job_id(request.headers.get('X-Job-Id'))
+    jobs.start(job_id, kind='stream', model_id=model_id, source_language=source_lang, target_language=target_lang)
+    logger.info(f"API: Streaming translation of field '{field}' from {source_lang} to {target_lang} using model {model_id} (window {window})")
+    
+    def finish_record(record, future):
+        if future is not None:
+            try:
+                record[output_field] = future.result()
+            except Exception as e:
+                record['_error'] = str(e)
+        return json.dumps(record, ensure_ascii=False) + '\n', '_error' in record
+    
+    def generate():
+        # 生成器在视图返回后执行，在这里声明调度类别
+        set_traffic('batch', flow=f'stream:{job_id}')
+        pending = deque()
+        completed = failed = reported = 0
+        try:
+            for line_no, line in iter_ndjson_lines(stream, max_bytes):
+                record, future = None, None
+                if line is None:
+                    record = {'_error': f'Record exceeds {max_bytes} bytes', '_line': line_no}
+                else:
+                    try:
+                        record = json.loads(line)
+                    except ValueError as e:
+                        record = {'_error': f'Invalid JSON: {str(e)}', '_line': line_no}
+                    else:
+                        # 数字、字符串、列表、null等非对象记录原样包装，下面报告缺少字段
+                        if not isinstance(record, dict):
+                            record = {'_value': record}
+                if '_error' not in record:
+                    if not isinstance(record.get(field), str):
+                        record['_error'] = f'Record has no string field "{field}"'
+                    elif record[field].strip():
+                        future, _ = translation_engine.submit(model_id, system_prompt, record[field].strip())
+                    else:
+                        record[output_field] = record[field]
+                pending.append((record, future))
+                
+                # 窗口已满时等待最早的记录；已完成的记录按输入顺序立即输出
+                while len(pending) >= window or (pending and (pending[0][1] is None or pending[0][1].done())):
+                    out, error = finish_record(*pending.popleft())
+                    completed += 1
+                    failed += error
+                    yield out
+                if completed - reported >= 100:
+                    jobs.update(job_id, completed=completed, failed=failed)
+                    reported = completed
+            while pending:
+                out, error = finish_record(*pending.popleft())
+                completed += 1
+                failed += error
+                yield out
+            jobs.finish(job_id, completed=completed, total=completed, failed=failed)
+            logger.info(f"API: Streaming translation finished: {completed} records, {failed} failed")
+        except Exception as e:
+            jobs.finish(job_id, status='failed', completed=completed, failed=failed, error=str(e))
+            logger.error(f"Streaming translation error: {str(e)}", exc_info=True)
+            raise
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['X-Job-Id'] = job_id
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/translate_file', methods=['POST'])
 def translate_file():
     """Translate a file using AWS Bedrock"""
-    global translation_progress
-    
     if not bedrock_client:
         flash('Not connected to AWS Bedrock', 'danger')
         return redirect(url_for('index'))
     
-    # Reset progress tracking
-    translation_progress = {
-        'total': 0,
-        'completed': 0,
-        'percent': 0
-    }
+    # 页面在提交前生成job_id，用它从任意worker轮询/progress
+    job_id = jobs.new_job_id(request.form.get('job_id'))
     
     # Check if a file was uploaded
     if 'file' not in request.files:
@@ -331,22 +1162,34 @@ def translate_file():
         return redirect(url_for('index'))
     
     if not allowed_file(file.filename):
-        flash('Invalid file type. Please upload a TXT, CSV, or XLSX file', 'warning')
+        flash('Invalid file type. Please upload a TXT, CSV, or XLSX file (TXT/CSV may be .gz or .zip compressed)', 'warning')
         return redirect(url_for('index'))
     
     model_id = request.form.get('model_id', '')
     source_lang = request.form.get('source_language', 'English')
-    target_lang = request.form.get('target_language', 'Chinese')
+    # 可以选择多个目标语言，源文件只解析一次
+    target_langs = parse_target_languages(request.form.getlist('target_language'))
+    target_lang = ', '.join(target_langs)
     system_prompt = request.form.get('system_prompt', '')
     
     if not model_id:
         flash('Please select a model', 'warning')
         return redirect(url_for('index'))
+    if len(target_langs) > app.config['MAX_TARGET_LANGUAGES']:
+        flash(f"最多可以同时选择 {app.config['MAX_TARGET_LANGUAGES']} 种目标语言", 'warning')
+        return redirect(url_for('index'))
+    
+    # auto: 按第一个目标语言为整个任务选择模型
+    requested_model = model_id
+    model_id = route_model(model_id, source_lang, target_langs[0])
+    if not model_id:
+        flash('No available model for automatic selection', 'danger')
+        return redirect(url_for('index'))
     
     # 检查是否是需要inference profile的模型
-    if not is_inference_profile(model_id) and requires_inference_profile(model_id):
+    if not is_inference_profile(model_id) and model_catalog.requires_inference_profile(model_id):
         # 尝试找到对应的inference profile
-        profile_arn = get_corresponding_profile(model_id)
+        profile_arn = model_catalog.corresponding_profile(model_id)
         if profile_arn:
             flash(f'模型 {model_id} 只能通过inference profile调用。已自动切换到对应的profile。', 'warning')
             model_id = profile_arn
@@ -355,276 +1198,504 @@ def translate_file():
             return redirect(url_for('index'))
     
     # Save user selections in session
-    session['selected_model'] = model_id
+    session['selected_model'] = AUTO_MODEL_ID if requested_model == AUTO_MODEL_ID else model_id
     session['source_language'] = source_lang
-    session['target_language'] = target_lang
+    session['target_language'] = target_langs[0]
+    session['batch_target_languages'] = target_langs
     session['system_prompt'] = system_prompt
     
-    # Replace placeholders in system prompt
-    system_prompt = system_prompt.replace('{sourceLanguage}', source_lang)
-    system_prompt = system_prompt.replace('{targetLanguage}', target_lang)
+    # Replace placeholders in system prompt (每个目标语言一个)
+    with span('prompt.build'):
+        system_prompts = build_system_prompts(system_prompt, source_lang, target_langs)
     
-    # Save the file temporarily
     filename = secure_filename(file.filename)
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(file_path)
     
+    scheduler.admit('batch')
+    # 每个批量任务是一个独立的流，多个任务平分批量容量
+    set_traffic('batch', flow=job_id)
     logger.info(f"Starting batch translation of {filename} from {source_lang} to {target_lang} using model {model_id}")
+    jobs.start(job_id, filename=filename, model_id=model_id, source_language=source_lang,
+               target_language=target_lang, target_languages=target_langs)
     
     try:
-        # Process file based on extension
-        file_extension = os.path.splitext(filename)[1].lower()
-        lines = []
-        
-        if file_extension == '.txt':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = [line.strip() for line in f.readlines() if line.strip()]
-            logger.info(f"Read {len(lines)} lines from text file")
-        elif file_extension == '.csv':
-            with open(file_path, 'r', encoding='utf-8') as f:
-                lines = [line.strip() for line in f.readlines() if line.strip()]
-            logger.info(f"Read {len(lines)} lines from CSV file")
-        elif file_extension == '.xlsx':
-            df = pd.read_excel(file_path)
-            for _, row in df.iterrows():
-                line = ' '.join(str(cell) for cell in row if str(cell) != 'nan')
-                if line.strip():
-                    lines.append(line)
-            logger.info(f"Read {len(lines)} lines from Excel file")
+        # 直接从上传流解析（不再先保存到uploads目录再读回）
+        with span('file.parse'):
+            lines = read_file_lines(file.stream, filename)
+        logger.info(f"Read {len(lines)} lines from {filename}")
         
         # 设置总数
         total_lines = len(lines)
-        translation_progress['total'] = total_lines
+        jobs.update(job_id, total=total_lines)
         logger.info(f"设置批量翻译总数: {total_lines}")
         
-        # Translate each line
+        # 所有(行 × 目标语言)的翻译并发提交给翻译引擎，受共享的线程池和速率限制约束
         translations = []
         failed_lines = []
+        skipped = 0
         
-        for i, line in enumerate(lines):
-            if line:
-                try:
-                    # 添加延迟，避免API调用过于频繁
-                    if i > 0:
-                        time.sleep(0.5)  # 每次调用之间添加0.5秒延迟
-                    
-                    # 记录详细的调用参数
-                    logger.info(f"Batch translation line {i+1}: model_id={model_id}, text_length={len(line)}")
-                    
-                    # 直接使用model_id进行翻译，与常规翻译保持一致
-                    translated_text = call_bedrock_api(model_id, system_prompt, line)
-                    translations.append({'original': line, 'translated': translated_text})
-                    logger.info(f"Translated line {i+1}/{len(lines)}")
-                except Exception as line_error:
-                    # 记录失败的行，但继续处理其他行
-                    error_msg = str(line_error)
-                    logger.error(f"Failed to translate line {i+1}: {error_msg}")
-                    translations.append({'original': line, 'translated': f"[翻译失败: {error_msg}]"})
-                    failed_lines.append(i+1)
+        with span('engine.translate_fanout', segments=total_lines, languages=len(target_langs)):
+            for item in translation_engine.translate_fanout(model_id, system_prompts, lines,
+                                                            window=app.config['UPLOAD_WINDOW']):
+                i = item['index']
+                translated = []
+                for language, result in zip(target_langs, item['results']):
+                    if 'error' in result:
+                        # 记录失败的行，但继续处理其他行
+                        logger.error(f"Failed to translate line {i+1} to {language}: {result['error']}")
+                        translated.append(f"[翻译失败: {result['error']}]")
+                    else:
+                        translated.append(result['translated_text'])
+                if any('error' in result for result in item['results']):
+                    failed_lines.append(i + 1)
+                skipped += sum(result['source'] == 'skipped' for result in item['results'])
+                translations.append({'original': item['text'], 'translated': translated})
                 
                 # 更新进度
-                translation_progress['completed'] = i + 1
-                translation_progress['percent'] = int((i + 1) / total_lines * 100)
-                logger.info(f"更新批量翻译进度: {i+1}/{total_lines} ({translation_progress['percent']}%)")
+                if (i + 1) % 10 == 0 or i + 1 == total_lines:
+                    progress = jobs.update(job_id, completed=i + 1, failed=len(failed_lines), skipped=skipped)
+                    logger.debug("更新批量翻译进度: %d/%d (%s%%)", i + 1, total_lines, progress['percent'])
         
         # Generate HTML output
-        html_content = generate_translation_html(translations, source_lang, target_lang)
+        with span('render.html'):
+            html_content = generate_translation_html(translations, source_lang, target_langs)
         
-        # Create a temporary file to serve
+        # 保存到结果存储（会自动淘汰旧结果）
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         output_filename = f"{os.path.splitext(filename)[0]}_translated_{timestamp}.html"
-        output_path = os.path.join(app.config['UPLOAD_FOLDER'], output_filename)
-        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        with span('artifact.store'):
+            artifact_id = artifact_store.put(html_content, output_filename)
         
         # 显示翻译结果摘要
         if failed_lines:
             flash(f'批量翻译完成，但有 {len(failed_lines)} 行翻译失败。失败的行号: {", ".join(map(str, failed_lines))}', 'warning')
         else:
             flash(f'批量翻译成功完成，共翻译 {len(translations)} 行文本。', 'success')
+        if skipped:
+            flash(f'{skipped} 个片段无需翻译（数字、编号、URL、邮箱或已是目标语言），已原样保留。', 'info')
         
-        logger.info(f"Batch translation completed, saved to {output_filename}")
+        logger.info(f"Batch translation completed, saved to {output_filename} (artifact {artifact_id})")
+        jobs.finish(job_id, output_filename=output_filename, artifact_id=artifact_id,
+                    download_url=url_for('download_artifact', artifact_id=artifact_id))
         
         # Return the file for download
-        return send_file(
-            output_path,
-            as_attachment=True,
-            download_name=output_filename,
-            mimetype='text/html'
-        )
+        return send_artifact(artifact_id)
         
     except Exception as e:
         error_msg = str(e)
         flash(f'批量翻译错误: {error_msg}', 'danger')
         logger.error(f"Batch translation error: {error_msg}", exc_info=True)
+        jobs.finish(job_id, status='failed', error=error_msg)
         return redirect(url_for('index'))
+
+def parse_target_languages(values: List[str]) -> List[str]:
+    """Target languages from form/JSON values, which may also be comma-separated; duplicates removed"""
+    languages = [language.strip() for value in values for language in str(value).split(',') if language.strip()]
+    return list(dict.fromkeys(languages)) or ['Chinese']
+
+def segment_prompt(system_prompt: str, source_lang: str, target_lang: str) -> PromptSpec:
+    """Per-segment prompt for the translation engine: applies the glossary and the local pre-filter
+    
+    Returns None for segments that need no translation, which the engine
+    passes through unchanged.
+    """
+    prompt = glossaries.prompt_for(system_prompt, source_lang, target_lang)
+    if not app.config['PREFILTER']:
+        return prompt
+    
+    def build(text: str) -> Optional[str]:
+        reason = classify_segment(text, target_lang, source_lang)
+        if reason is not None:
+            SEGMENTS_SKIPPED.inc(reason=reason)
+            return None
+        return prompt(text) if callable(prompt) else prompt
+    return build
+
+def build_system_prompts(system_prompt: str, source_lang: str, target_langs: List[str]) -> List[PromptSpec]:
+    """The per-segment prompt for each target language (placeholders replaced, glossary and pre-filter applied)"""
+    system_prompt = system_prompt.replace('{sourceLanguage}', source_lang)
+    return [segment_prompt(system_prompt.replace('{targetLanguage}', target_lang), source_lang, target_lang)
+            for target_lang in target_langs]
+
+def read_excel_lines(source) -> List[str]:
+    """Rows of an Excel sheet joined into lines"""
+    import pandas as pd
+    lines = []
+    df = pd.read_excel(source)
+    for _, row in df.iterrows():
+        line = ' '.join(str(cell) for cell in row if str(cell) != 'nan')
+        if line.strip():
+            lines.append(line)
+    return lines
+
+def read_file_lines(stream, filename: str) -> List[str]:
+    """Non-empty lines of an uploaded TXT/CSV (optionally .gz/.zip) or XLSX file"""
+    if file_extensions(filename)[0] == 'xlsx':
+        return read_excel_lines(stream)
+    return list(iter_lines(read_chunks(stream), filename))
+
+def run_upload_job(upload_id: str, job_id: str, filename: str, model_id: str, system_prompts: List[str],
+                   source_lang: str, target_langs: List[str]):
+    """Translate a chunked upload (into one or more languages) while it is being received and write the HTML result"""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    output_filename = f"{os.path.splitext(filename)[0]}_translated_{timestamp}.html"
+    idle_timeout = app.config['UPLOAD_IDLE_TIMEOUT']
+    completed = failed = skipped = 0
+    set_traffic('batch', flow=job_id)
+    try:
+        if file_extensions(filename)[0] == 'xlsx':
+            # xlsx无法流式解析，等待上传完成
+            upload_manager.wait(upload_id, idle_timeout=idle_timeout)
+            lines = read_excel_lines(upload_manager.path(upload_id))
+            jobs.update(job_id, total=len(lines))
+        else:
+            lines = iter_lines(upload_manager.follow(upload_id, idle_timeout=idle_timeout), filename)
+        
+        with artifact_store.create(output_filename) as f:
+            f.write(translation_html_header(source_lang, target_langs))
+            for item in translation_engine.translate_fanout(model_id, system_prompts, lines,
+                                                            window=app.config['UPLOAD_WINDOW']):
+                translated = [f"[翻译失败: {result['error']}]" if 'error' in result else result['translated_text']
+                              for result in item['results']]
+                failed += any('error' in result for result in item['results'])
+                skipped += sum(result['source'] == 'skipped' for result in item['results'])
+                f.write(translation_html_item({'original': item['text'], 'translated': translated},
+                                              source_lang, target_langs))
+                completed += 1
+                if completed % 100 == 0:
+                    upload = upload_manager.get(upload_id) or {}
+                    jobs.update(job_id, completed=completed, failed=failed, skipped=skipped,
+                                bytes_received=upload.get('offset'))
+            f.write(translation_html_footer())
+        
+        jobs.finish(job_id, total=completed, completed=completed, failed=failed, skipped=skipped,
+                    output_filename=output_filename,
+                    artifact_id=f.artifact_id, download_url=url_for('download_artifact', artifact_id=f.artifact_id))
+        logger.info(f"Upload {upload_id}: translated {completed} lines ({failed} failed), saved to {output_filename}")
+    except Exception as e:
+        logger.error(f"Upload {upload_id} translation error: {str(e)}", exc_info=True)
+        jobs.finish(job_id, status='failed', error=str(e), completed=completed, failed=failed)
     finally:
-        # Clean up the uploaded file
-        if os.path.exists(file_path):
-            os.remove(file_path)
+        upload_manager.discard(upload_id)
+
+@app.route('/api/uploads', methods=['POST'])
+def api_create_upload():
+    """Start a chunked upload and its translation job
+    
+    Body: {"filename": ..., "size": ..., "model_id": ..., "source_language": ...,
+    "target_language": ... or "target_languages": [...], "system_prompt": ...,
+    "job_id": ...}. Then PUT the
+    file to /api/uploads/<upload_id> in chunks; TXT/CSV lines (also inside
+    .gz/.zip) are translated while the upload is still running.
+    """
+    if not bedrock_client:
+        return jsonify({'error': 'Not connected to AWS Bedrock'}), 400
+    
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.get('filename'):
+        return jsonify({'error': 'Expected a JSON object with a "filename"'}), 400
+    filename = secure_filename(str(data['filename']))
+    if not allowed_file(filename):
+        return jsonify({'error': 'Invalid file type. Please upload a TXT, CSV, or XLSX file (TXT/CSV may be .gz or .zip compressed)'}), 400
+    size = data.get('size')
+    if size is not None and (not isinstance(size, int) or size < 0):
+        return jsonify({'error': 'Invalid size'}), 400
+    if size is not None and size > app.config['UPLOAD_MAX_BYTES']:
+        return jsonify({'error': f"Files are limited to {app.config['UPLOAD_MAX_BYTES']} bytes"}), 413
+    
+    model_id = data.get('model_id', '')
+    source_lang = data.get('source_language', 'English')
+    target_langs = data.get('target_languages') or [data.get('target_language', 'Chinese')]
+    if not isinstance(target_langs, list):
+        return jsonify({'error': '"target_languages" must be an array'}), 400
+    target_langs = parse_target_languages(target_langs)
+    if len(target_langs) > app.config['MAX_TARGET_LANGUAGES']:
+        return jsonify({'error': f"At most {app.config['MAX_TARGET_LANGUAGES']} target languages per job"}), 400
+    system_prompt = data.get('system_prompt', '')
+    if not model_id:
+        return jsonify({'error': 'Please select a model'}), 400
+    model_id = route_model(model_id, source_lang, target_langs[0])
+    if not model_id:
+        return jsonify({'error': 'No available model for automatic selection'}), 503
+    model_id, error_msg = resolve_model_id(model_id)
+    if error_msg:
+        return jsonify({'error': error_msg}), 400
+    
+    system_prompts = build_system_prompts(system_prompt, source_lang, target_langs)
+    
+    scheduler.admit('batch')
+    job_id = jobs.new_job_id(data.get('job_id'))
+    upload = upload_manager.create(filename, size=size, job_id=job_id)
+    jobs.start(job_id, kind='upload', upload_id=upload['upload_id'], filename=filename, size=size,
+               model_id=model_id, source_language=source_lang, target_language=', '.join(target_langs),
+               target_languages=target_langs)
+    logger.info(f"Chunked upload {upload['upload_id']} of {filename} ({size} bytes) from {source_lang} "
+                f"to {', '.join(target_langs)} using model {model_id}")
+    
+    # 任务线程保留请求上下文，以便用url_for生成结果的下载地址
+    threading.Thread(target=copy_current_request_context(run_upload_job), name=f"upload-{upload['upload_id']}", daemon=True,
+                     args=(upload['upload_id'], job_id, filename, model_id, system_prompts,
+                           source_lang, target_langs)).start()
+    
+    return jsonify({'upload_id': upload['upload_id'], 'job_id': job_id, 'offset': 0,
+                    'chunk_size': app.config['UPLOAD_CHUNK_SIZE']}), 201
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def api_upload_status(upload_id):
+    """Upload offset (where to resume) and translation progress"""
+    upload = upload_manager.get(upload_id)
+    if upload is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    upload['job'] = jobs.get(upload['job_id'])
+    return jsonify(upload)
+
+@app.route('/api/uploads/<upload_id>', methods=['PUT', 'PATCH'])
+def api_upload_chunk(upload_id):
+    """Append a chunk at the `Upload-Offset` header; `Upload-Complete: 1` marks the last chunk
+    
+    Returns the new offset. On 409 the client resumes from the returned offset.
+    """
+    try:
+        offset = int(request.headers.get('Upload-Offset', request.args.get('offset', '')))
+    except ValueError:
+        return jsonify({'error': 'Missing or invalid Upload-Offset'}), 400
+    final = request.headers.get('Upload-Complete', request.args.get('final', '')).lower() in ('1', 'true', 'yes')
+    try:
+        with span('upload.chunk'):
+            size = upload_manager.append(upload_id, offset, request.stream, final=final)
+    except KeyError:
+        return jsonify({'error': 'Unknown upload'}), 404
+    except UploadOffsetError as e:
+        return jsonify({'error': str(e), 'offset': e.expected}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'upload_id': upload_id, 'offset': size, 'complete': final})
+
+@app.route('/api/uploads/<upload_id>/result', methods=['GET'])
+def api_upload_result(upload_id):
+    """Download the translated HTML once the upload's job has completed"""
+    upload = upload_manager.get(upload_id)
+    job = jobs.get(upload['job_id']) if upload else None
+    if job is None:
+        return jsonify({'error': 'Unknown upload'}), 404
+    if job.get('status') != 'completed':
+        return jsonify({'error': 'Translation is not finished', 'job': job}), 409
+    return send_artifact(job['artifact_id'])
+
+def send_artifact(artifact_id: str):
+    """Stream an artifact, precompressed when the client accepts it; Range requests get the plain file"""
+    meta = artifact_store.get(artifact_id)
+    if meta is None:
+        return jsonify({'error': 'Result is no longer available'}), 410
+    encoding = None if request.range else ArtifactStore.choose_encoding(meta, request.accept_encodings)
+    response = send_file(artifact_store.path(artifact_id, encoding), mimetype=meta['mimetype'],
+                         as_attachment=True, download_name=meta['download_name'], conditional=True,
+                         etag=f"{artifact_id}-{encoding or 'identity'}")
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
+
+@app.route('/artifacts/<artifact_id>')
+def download_artifact(artifact_id):
+    """Download a batch translation result"""
+    return send_artifact(artifact_id)
+
+@app.route('/api/glossaries', methods=['GET'])
+def list_glossaries():
+    """Language pairs that have a glossary, with their term counts"""
+    return jsonify({'glossaries': glossaries.pairs()})
+
+@app.route('/api/glossaries/<source_lang>/<target_lang>', methods=['GET'])
+def get_glossary(source_lang, target_lang):
+    """Terms of one glossary"""
+    glossary = glossaries.get(source_lang, target_lang)
+    if glossary is None:
+        return jsonify({'error': 'No glossary for this language pair'}), 404
+    return jsonify({'source_language': source_lang, 'target_language': target_lang,
+                    'terms': dict(glossary.entries.values())})
+
+@app.route('/api/glossaries/<source_lang>/<target_lang>', methods=['PUT', 'POST'])
+def save_glossary(source_lang, target_lang):
+    """Replace a glossary: a CSV/TSV upload ("file"), a CSV body, or JSON {"terms": {"source": "target", ...}}"""
+    if 'file' in request.files:
+        content = request.files['file'].read(app.config['GLOSSARY_MAX_BYTES'] + 1)
+    elif request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not isinstance(data.get('terms'), dict):
+            return jsonify({'error': 'Expected a JSON object with a "terms" object'}), 400
+        content = None
+        entries = {str(k): str(v) for k, v in data['terms'].items()}
+    else:
+        content = request.get_data(cache=False)
+    if content is not None:
+        if len(content) > app.config['GLOSSARY_MAX_BYTES']:
+            return jsonify({'error': 'Glossary file is too large'}), 413
+        try:
+            entries = parse_glossary(content.decode('utf-8-sig'))
+        except UnicodeDecodeError:
+            return jsonify({'error': 'Glossary must be UTF-8 encoded'}), 400
+    try:
+        with span('glossary.build', terms=len(entries)):
+            glossary = glossaries.save(source_lang, target_lang, entries)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    logger.info(f"Saved glossary {source_lang}-{target_lang}: {len(glossary)} terms")
+    return jsonify({'source_language': source_lang, 'target_language': target_lang, 'terms': len(glossary)})
+
+@app.route('/api/glossaries/<source_lang>/<target_lang>', methods=['DELETE'])
+def delete_glossary(source_lang, target_lang):
+    """Delete the glossary of a language pair"""
+    if not glossaries.delete(source_lang, target_lang):
+        return jsonify({'error': 'No glossary for this language pair'}), 404
+    return jsonify({'deleted': True})
 
 @app.route('/progress')
 def get_progress():
-    """Get the current progress of batch translation"""
-    global translation_progress
-    logger.info(f"获取进度: {translation_progress}")
-    return jsonify(translation_progress)
+    """Get the progress of a batch translation job (?job_id=..., default the latest job)"""
+    job = jobs.get(request.args.get('job_id'))
+    if job is None:
+        return jsonify({'total': 0, 'completed': 0, 'percent': 0, 'status': 'unknown'})
+    logger.debug("获取进度: %s", job)
+    return jsonify(job)
 
-@app.route('/submit_rating', methods=['POST'])
-def submit_rating():
-    """Submit a rating for a translation"""
-    data = request.json
-    
-    source_text = data.get('source_text')
-    translated_text = data.get('translated_text')
-    source_language = data.get('source_language')
-    target_language = data.get('target_language')
-    model_id = data.get('model_id')
-    rating = data.get('rating')
+def parse_rating(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Validate a submitted rating and return it as a row for the ratings store"""
+    if not isinstance(data, dict):
+        raise ValueError('Rating must be a JSON object')
     
     # Validate rating
     try:
-        rating = int(rating)
-        if not 1 <= rating <= 5:
-            return jsonify({'error': 'Rating must be between 1 and 5'}), 400
+        rating = int(data.get('rating'))
     except (ValueError, TypeError):
-        return jsonify({'error': 'Invalid rating value'}), 400
+        raise ValueError('Invalid rating value')
+    if not 1 <= rating <= 5:
+        raise ValueError('Rating must be between 1 and 5')
+    
+    timestamp = None
+    if data.get('timestamp'):
+        try:
+            timestamp = datetime.fromisoformat(str(data['timestamp']))
+        except ValueError:
+            raise ValueError('Invalid timestamp, expected ISO 8601')
+    
+    return {
+        'source_text': data.get('source_text'),
+        'translated_text': data.get('translated_text'),
+        'source_language': data.get('source_language'),
+        'target_language': data.get('target_language'),
+        'model_id': data.get('model_id'),
+        'rating': rating,
+        'timestamp': timestamp
+    }
+
+@app.route('/submit_rating', methods=['POST'])
+def submit_rating():
+    """Submit a rating for a translation"""
+    try:
+        row = parse_rating(request.json)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Store rating in database
     try:
-        conn = sqlite3.connect('translation_ratings.db')
-        c = conn.cursor()
-        c.execute('''
-        INSERT INTO ratings (source_text, translated_text, source_language, target_language, model_id, rating, timestamp)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (source_text, translated_text, source_language, target_language, model_id, rating, datetime.now()))
-        conn.commit()
-        conn.close()
+        if app.config['RATINGS_WRITE_BEHIND'] and ratings_writer.submit(row):
+            queued = True
+        else:
+            # 队列已满或未启用时同步写入
+            ratings_store.add_ratings([row])
+            RATINGS_WRITTEN.inc(mode='sync')
+            invalidate_rating_stats_cache()
+            queued = False
         
-        logger.info(f"Rating submitted: {rating}/5 for translation from {source_language} to {target_language}")
-        return jsonify({'success': True})
+        logger.info(f"Rating submitted: {row['rating']}/5 for translation from {row['source_language']} to {row['target_language']}")
+        return jsonify({'success': True, 'queued': queued})
     
     except Exception as e:
         logger.error(f"Error submitting rating: {str(e)}", exc_info=True)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/submit_ratings', methods=['POST'])
+def submit_ratings():
+    """Submit many ratings at once; valid ones are written in a single transaction"""
+    data = request.get_json(silent=True)
+    items = data.get('ratings') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Expected a non-empty JSON array of ratings'}), 400
+    if len(items) > app.config['RATINGS_BULK_MAX']:
+        return jsonify({'error': f"At most {app.config['RATINGS_BULK_MAX']} ratings per request"}), 413
+    
+    rows = []
+    errors = []
+    for index, item in enumerate(items):
+        try:
+            rows.append(parse_rating(item))
+        except ValueError as e:
+            errors.append({'index': index, 'error': str(e)})
+    
+    if not rows:
+        return jsonify({'success': False, 'inserted': 0, 'errors': errors}), 400
+    
+    try:
+        inserted = ratings_store.add_ratings(rows)
+        RATINGS_WRITTEN.inc(inserted, mode='bulk')
+        invalidate_rating_stats_cache()
+        logger.info(f"Bulk ratings submitted: {inserted} inserted, {len(errors)} rejected")
+        return jsonify({'success': True, 'inserted': inserted, 'errors': errors})
+    
+    except Exception as e:
+        logger.error(f"Error submitting bulk ratings: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/rating_stats', methods=['GET'])
 def rating_stats():
     """Get rating statistics"""
     granularity = request.args.get('granularity', 'day')  # 'hour' or 'day'
+    if granularity != 'hour':
+        granularity = 'day'
+    
+    # 统计窗口（天），默认一周；数据来自小时汇总表，较长窗口同样很快
+    try:
+        days = int(request.args.get('days', 7))
+    except ValueError:
+        return jsonify({'error': 'Invalid days value'}), 400
+    days = max(1, min(days, app.config['RATING_STATS_MAX_DAYS']))
     
-    # Calculate one week ago
-    one_week_ago = datetime.now() - timedelta(days=7)
+    window_start = datetime.now() - timedelta(days=days)
     
     try:
-        conn = sqlite3.connect('translation_ratings.db')
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
+        # 先写入本进程队列中的评分，保证刚提交的评分立即反映在统计中
+        if ratings_writer.pending():
+            ratings_writer.flush()
         
-        # 检查是否有评分数据
-        c.execute('SELECT COUNT(*) as count FROM ratings')
-        count = c.fetchone()['count']
+        # 汇总表按小时对齐，因此同一小时内窗口起点不变，结果只随写入而变化
+        window_hour = window_start.strftime('%Y%m%d%H')
+        cache_key = (granularity, days, window_hour)
+        version = ratings_store.data_version()
+        etag = f'{version}-{granularity}-{days}-{window_hour}'
         
-        if count == 0:
-            # 如果没有数据，返回空结果
-            logger.warning("No rating data found in database")
-            return jsonify({
-                'time_series': [],
-                'rating_distribution': [],
-                'language_pairs': [],
-                'models': [],
-                'insights': ["暂无评分数据，请先进行一些翻译并评分"]
-            })
-        
-        if granularity == 'hour':
-            # By hour
-            c.execute('''
-            SELECT 
-                strftime('%Y-%m-%d %H:00:00', timestamp) as time_period,
-                AVG(rating) as avg_rating,
-                COUNT(*) as count
-            FROM ratings
-            WHERE timestamp >= ?
-            GROUP BY time_period
-            ORDER BY time_period
-            ''', (one_week_ago.strftime('%Y-%m-%d %H:%M:%S'),))
+        if request.if_none_match.contains(etag):
+            CACHE_REQUESTS.inc(cache='rating_stats', result='not_modified')
+            response = Response(status=304)
         else:
-            # By day
-            c.execute('''
-            SELECT 
-                strftime('%Y-%m-%d', timestamp) as time_period,
-                AVG(rating) as avg_rating,
-                COUNT(*) as count
-            FROM ratings
-            WHERE timestamp >= ?
-            GROUP BY time_period
-            ORDER BY time_period
-            ''', (one_week_ago.strftime('%Y-%m-%d %H:%M:%S'),))
-        
-        time_series = [dict(row) for row in c.fetchall()]
-        logger.info(f"Found {len(time_series)} time periods with ratings")
-        
-        # Get rating distribution
-        c.execute('''
-        SELECT 
-            rating,
-            COUNT(*) as count
-        FROM ratings
-        WHERE timestamp >= ?
-        GROUP BY rating
-        ORDER BY rating
-        ''', (one_week_ago.strftime('%Y-%m-%d %H:%M:%S'),))
-        
-        rating_distribution = [dict(row) for row in c.fetchall()]
-        logger.info(f"Found {len(rating_distribution)} different rating values")
-        
-        # Get language pair stats
-        c.execute('''
-        SELECT 
-            source_language || ' -> ' || target_language as language_pair,
-            AVG(rating) as avg_rating,
-            COUNT(*) as count
-        FROM ratings
-        WHERE timestamp >= ?
-        GROUP BY language_pair
-        ORDER BY avg_rating DESC
-        ''', (one_week_ago.strftime('%Y-%m-%d %H:%M:%S'),))
-        
-        language_pairs = [dict(row) for row in c.fetchall()]
-        logger.info(f"Found {len(language_pairs)} language pairs with ratings")
-        
-        # Get model stats
-        c.execute('''
-        SELECT 
-            model_id,
-            AVG(rating) as avg_rating,
-            COUNT(*) as count
-        FROM ratings
-        WHERE timestamp >= ?
-        GROUP BY model_id
-        ORDER BY avg_rating DESC
-        ''', (one_week_ago.strftime('%Y-%m-%d %H:%M:%S'),))
-        
-        models = [dict(row) for row in c.fetchall()]
-        logger.info(f"Found {len(models)} models with ratings")
-        
-        conn.close()
-        
-        # Generate insights
-        insights = generate_insights(time_series, rating_distribution, language_pairs, models)
-        
-        # 记录返回的数据大小
-        response_data = {
-            'time_series': time_series,
-            'rating_distribution': rating_distribution,
-            'language_pairs': language_pairs,
-            'models': models,
-            'insights': insights
-        }
-        logger.info(f"Returning rating stats with {len(time_series)} time periods, {len(rating_distribution)} rating values, {len(language_pairs)} language pairs, {len(models)} models")
+            with rating_stats_cache_lock:
+                cached = rating_stats_cache.get(cache_key)
+            if cached is not None and cached[0] == version:
+                CACHE_REQUESTS.inc(cache='rating_stats', result='hit')
+                body = cached[1]
+            else:
+                CACHE_REQUESTS.inc(cache='rating_stats', result='miss')
+                body = json.dumps(compute_rating_stats(window_start, granularity), ensure_ascii=False)
+                with rating_stats_cache_lock:
+                    # 丢弃旧版本或过期窗口的条目
+                    for key in [k for k, v in rating_stats_cache.items() if v[0] != version or k[2] != window_hour]:
+                        del rating_stats_cache[key]
+                    rating_stats_cache[cache_key] = (version, body)
+            response = Response(body, mimetype='application/json')
         
-        return jsonify(response_data)
+        response.set_etag(etag)
+        # 浏览器每次都带If-None-Match重新验证
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     
     except Exception as e:
         logger.error(f"Error getting rating stats: {str(e)}", exc_info=True)
@@ -637,6 +1708,83 @@ def rating_stats():
             'insights': [f"获取统计数据时出错: {str(e)}"]
         }), 500
 
+def compute_rating_stats(window_start: datetime, granularity: str) -> Dict[str, Any]:
+    """Build the rating stats payload from the rollup tables"""
+    # 检查是否有评分数据
+    if not ratings_store.has_ratings():
+        # 如果没有数据，返回空结果
+        logger.warning("No rating data found in database")
+        return {
+            'time_series': [],
+            'rating_distribution': [],
+            'language_pairs': [],
+            'models': [],
+            'insights': ["暂无评分数据，请先进行一些翻译并评分"]
+        }
+    
+    stats = ratings_store.get_stats(window_start, granularity)
+    time_series = stats['time_series']
+    rating_distribution = stats['rating_distribution']
+    language_pairs = stats['language_pairs']
+    models = stats['models']
+    
+    # Generate insights
+    insights = generate_insights(time_series, rating_distribution, language_pairs, models)
+    
+    # 记录返回的数据大小
+    logger.info(f"Computed rating stats with {len(time_series)} time periods, {len(rating_distribution)} rating values, {len(language_pairs)} language pairs, {len(models)} models")
+    
+    return {
+        'time_series': time_series,
+        'rating_distribution': rating_distribution,
+        'language_pairs': language_pairs,
+        'models': models,
+        'insights': insights
+    }
+
+@app.route('/admin/ratings/archive', methods=['POST'])
+def archive_ratings():
+    """Archive ratings older than the retention window and prune them from the live table"""
+    data = request.get_json(silent=True) or {}
+    try:
+        retention_days = int(data.get('retention_days') or app.config['RATINGS_RETENTION_DAYS'])
+    except (ValueError, TypeError):
+        return jsonify({'error': 'Invalid retention_days value'}), 400
+    if retention_days <= 0:
+        return jsonify({'error': 'retention_days must be a positive number of days'}), 400
+    if not archive_available():
+        return jsonify({'error': 'pyarrow is required for the ratings archive'}), 501
+    
+    try:
+        return jsonify(run_ratings_retention(retention_days))
+    except Exception as e:
+        logger.error(f"Error archiving ratings: {str(e)}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/ratings/archive', methods=['GET'])
+def query_ratings_archive():
+    """Query archived ratings with column projection, a time range and equality filters"""
+    if not archive_available():
+        return jsonify({'error': 'pyarrow is required for the ratings archive'}), 501
+    
+    columns = [c for c in request.args.get('columns', '').split(',') if c] or [c for c in ARCHIVE_COLUMNS if not c.endswith('_text')]
+    try:
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else None
+        end = datetime.fromisoformat(request.args['end']) if request.args.get('end') else None
+        limit = min(int(request.args.get('limit', 1000)), 100000)
+        filters = {name: request.args[name] for name in ('model_id', 'source_language', 'target_language') if request.args.get(name)}
+        if request.args.get('rating'):
+            filters['rating'] = int(request.args['rating'])
+        table = ratings_archive.query(columns, start, end, filters, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    rows = table.to_pylist()
+    for row in rows:
+        if isinstance(row.get('timestamp'), datetime):
+            row['timestamp'] = row['timestamp'].isoformat()
+    return jsonify({'columns': columns, 'count': len(rows), 'rows': rows})
+
 def generate_insights(time_series, rating_distribution, language_pairs, models):
     """Generate insights from rating data"""
     insights = []
@@ -679,20 +1827,141 @@ def generate_insights(time_series, rating_distribution, language_pairs, models):
     if models:
         try:
             best_model = models[0]
-            model_name = get_model_display_name(best_model['model_id'])
+            model_name = model_catalog.display_name(best_model['model_id'])
             insights.append(f"最佳模型: {model_name} (平均评分: {float(best_model['avg_rating']):.2f})")
         except (ValueError, TypeError, KeyError) as e:
             logger.warning(f"Error calculating best model: {e}")
     
     return insights
-    
-    return insights
+
+def _error_code(error: Exception) -> str:
+    """Extract the AWS error code from a botocore ClientError, or the exception type"""
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        code = response.get('Error', {}).get('Code')
+        if code:
+            return code
+    return type(error).__name__
+
+# 调用方需要时收集本次调用的详细信息（调用路径、token数），例如模型对比
+call_details: contextvars.ContextVar = contextvars.ContextVar('bedrock_call_details', default=None)
+
+def _record_usage(model_id: str, response: Dict[str, Any]):
+    """Record input/output token counts from a Bedrock response"""
+    usage = response.get('usage')
+    if isinstance(usage, dict):
+        input_tokens = usage.get('inputTokens')
+        output_tokens = usage.get('outputTokens')
+    else:
+        # invoke_model在响应头中返回token数量
+        headers = response.get('ResponseMetadata', {}).get('HTTPHeaders', {})
+        input_tokens = headers.get('x-amzn-bedrock-input-token-count')
+        output_tokens = headers.get('x-amzn-bedrock-output-token-count')
+    details = call_details.get()
+    try:
+        if input_tokens is not None:
+            BEDROCK_TOKENS.inc(int(input_tokens), model=model_id, direction='input')
+            if details is not None:
+                details['input_tokens'] = int(input_tokens)
+        if output_tokens is not None:
+            BEDROCK_TOKENS.inc(int(output_tokens), model=model_id, direction='output')
+            if details is not None:
+                details['output_tokens'] = int(output_tokens)
+    except (TypeError, ValueError):
+        pass
+
+def _bedrock_attempt(path: str, model_id: str, method: str, **kwargs) -> Dict[str, Any]:
+    """Run a single Bedrock invocation attempt, recording latency, errors and usage"""
+    start = time.perf_counter()
+    try:
+        with span(f'bedrock.{path}', model=model_id):
+            response = getattr(bedrock_client, method)(modelId=model_id, **kwargs)
+    except Exception as e:
+        code = _error_code(e)
+        BEDROCK_ATTEMPT_ERRORS.inc(model=model_id, path=path, code=code)
+        if code in ('ThrottlingException', 'TooManyRequestsException'):
+            BEDROCK_THROTTLES.inc(model=model_id)
+        raise
+    finally:
+        BEDROCK_ATTEMPT_LATENCY.observe(time.perf_counter() - start, model=model_id, path=path)
+    details = call_details.get()
+    if details is not None:
+        details['attempt_seconds'] = time.perf_counter() - start
+    _record_usage(model_id, response)
+    return response
 
 def call_bedrock_api(model_id: str, system_prompt: str, input_text: str) -> str:
-    """Call AWS Bedrock API for translation"""
-    global bedrock_client
+    """Call AWS Bedrock API for translation (scheduled by priority class and flow of the caller)"""
+    return scheduler.call(_scheduled_bedrock_call, model_id, system_prompt, input_text)
+
+def _scheduled_bedrock_call(model_id: str, system_prompt: str, input_text: str) -> str:
+    start = time.perf_counter()
+    try:
+        with span('bedrock.call', model=model_id):
+            translated_text, path, _ = _call_bedrock_api(model_id, system_prompt, input_text)
+    except Exception:
+        BEDROCK_REQUESTS.inc(model=model_id, outcome='error')
+        model_router.observe(model_id, time.perf_counter() - start, ok=False)
+        raise
+    finally:
+        BEDROCK_LATENCY.observe(time.perf_counter() - start, model=model_id)
+    
+    model_router.observe(model_id, time.perf_counter() - start)
+    BEDROCK_REQUESTS.inc(model=model_id, outcome='success')
+    details = call_details.get()
+    if details is not None:
+        details['path'] = path
+    BEDROCK_PATH.inc(model=model_id, path=path)
+    return translated_text
+
+def _converse(model_id: str, system_prompt: str, input_text: str) -> str:
+    """Translate with the converse API"""
+    response = _bedrock_attempt(
+        'converse', model_id, 'converse',
+        messages=[
+            {
+                "role": "user",
+                "content": [{"text": f"{system_prompt}\n\n{input_text}"}]
+            }
+        ],
+        inferenceConfig={
+            "temperature": 0.5,
+            "maxTokens": 2000
+        }
+    )
     
-    logger.debug(f"Calling Bedrock API with model/profile {model_id}")
+    # Extract the translated text from the response
+    if 'output' in response and 'message' in response['output']:
+        output_message = response['output']['message']
+        if 'content' in output_message:
+            for content_item in output_message['content']:
+                if 'text' in content_item:
+                    return content_item['text'].strip()
+    
+    # Fallback if the expected structure is not found
+    logger.warning(f"Unexpected converse API response structure: {response}")
+    return str(response)
+
+def _call_bedrock_api(model_id: str, system_prompt: str, input_text: str,
+                      use_route: bool = True) -> Tuple[str, str, str]:
+    """Try the Bedrock invocation paths in order
+    
+    Returns the text, the path that succeeded and the model ID that served it.
+    """
+    logger.debug("Calling Bedrock API with model/profile %s", model_id)
+    
+    # 探测已知可用的调用方式时直接使用，跳过会失败的尝试
+    route = model_health.route(model_id) if use_route else None
+    if route is not None:
+        path, target = route
+        try:
+            if path == 'converse':
+                return _converse(target, system_prompt, input_text), path, target
+            translated_text, _, _ = _call_bedrock_api(target, system_prompt, input_text, use_route=False)
+            return translated_text, path, target
+        except Exception as e:
+            logger.warning("Probed path %s for %s failed, trying all invocation paths: %s", path, model_id, e)
+            model_health.forget_route(model_id)
     
     # 使用model_config中的函数检查是否是inference profile
     is_profile = is_inference_profile(model_id)
@@ -704,12 +1973,12 @@ def call_bedrock_api(model_id: str, system_prompt: str, input_text: str) -> str:
         model_parts = model_id.split('/')
         if len(model_parts) > 1:
             base_model_id = model_parts[-1]
-            logger.info(f"Extracted base model ID from profile: {base_model_id}")
+            logger.debug("Extracted base model ID from profile: %s", base_model_id)
     
     # 特殊处理DeepSeek模型
     if 'deepseek' in model_id.lower():
         try:
-            logger.info(f"Using DeepSeek-specific format for {model_id}")
+            logger.debug("Using DeepSeek-specific format for %s", model_id)
             
             # DeepSeek模型使用特定的提示格式
             body = json.dumps({
@@ -720,22 +1989,19 @@ def call_bedrock_api(model_id: str, system_prompt: str, input_text: str) -> str:
                 "stop": ["<|user|>"]  # 防止模型继续生成用户输入
             })
             
-            response = bedrock_client.invoke_model(
-                modelId=model_id,
-                body=body
-            )
+            response = _bedrock_attempt('deepseek', model_id, 'invoke_model', body=body)
             
             response_body = json.loads(response['body'].read())
-            return response_body.get('generation', '').strip()
+            return response_body.get('generation', '').strip(), 'deepseek', model_id
         except Exception as e:
             error_msg = str(e)
-            logger.error(f"DeepSeek API error: {error_msg}", exc_info=True)
+            logger.error("DeepSeek API error: %s", error_msg, exc_info=True)
             # 继续尝试其他方法
     
     # 特殊处理Mistral模型
     if 'mistral' in model_id.lower() or 'pixtral' in model_id.lower():
         try:
-            logger.info(f"Using Mistral-specific format for {model_id}")
+            logger.debug("Using Mistral-specific format for %s", model_id)
             
             # Mistral模型使用特定的提示格式
             body = json.dumps({
@@ -748,33 +2014,27 @@ def call_bedrock_api(model_id: str, system_prompt: str, input_text: str) -> str:
             # 如果是推理配置文件，尝试使用基础模型ID
             if is_profile and base_model_id:
                 try:
-                    logger.info(f"Trying Mistral with base model ID: {base_model_id}")
-                    response = bedrock_client.invoke_model(
-                        modelId=base_model_id,
-                        body=body
-                    )
+                    logger.info("Trying Mistral with base model ID: %s", base_model_id)
+                    response = _bedrock_attempt('mistral_base_model', base_model_id, 'invoke_model', body=body)
                     
                     response_body = json.loads(response['body'].read())
-                    return response_body.get('outputs', [{}])[0].get('text', '').strip()
+                    return response_body.get('outputs', [{}])[0].get('text', '').strip(), 'mistral_base_model', base_model_id
                 except Exception as base_error:
-                    logger.error(f"Mistral base model error: {str(base_error)}", exc_info=True)
+                    logger.error("Mistral base model error: %s", base_error, exc_info=True)
             
             # 尝试使用原始模型ID
-            response = bedrock_client.invoke_model(
-                modelId=model_id,
-                body=body
-            )
+            response = _bedrock_attempt('mistral', model_id, 'invoke_model', body=body)
             
             response_body = json.loads(response['body'].read())
-            return response_body.get('outputs', [{}])[0].get('text', '').strip()
+            return response_body.get('outputs', [{}])[0].get('text', '').strip(), 'mistral', model_id
         except Exception as e:
             error_msg = str(e)
-            logger.error(f"Mistral API error: {error_msg}", exc_info=True)
+            logger.error("Mistral API error: %s", error_msg, exc_info=True)
             # 继续尝试其他方法
     
     # 对于所有其他模型，首先尝试使用invoke_model API
     try:
-        logger.info(f"Using invoke_model API with {'inference profile' if is_profile else 'model'}: {model_id}")
+        logger.debug("Using invoke_model API with %s: %s", 'inference profile' if is_profile else 'model', model_id)
         
         # Format request based on model type
         if 'claude' in model_id.lower():
@@ -837,83 +2097,56 @@ def call_bedrock_api(model_id: str, system_prompt: str, input_text: str) -> str:
             })
         
         # 调用API
-        response = bedrock_client.invoke_model(
-            modelId=model_id,
-            body=body
-        )
+        response = _bedrock_attempt('invoke_model', model_id, 'invoke_model', body=body)
         
         # 解析响应
         response_body = json.loads(response['body'].read())
         
         # 根据模型类型提取结果
         if 'claude' in model_id.lower() and ('claude-3' in model_id.lower() or 'claude-3-5' in model_id.lower() or 'claude-3-7' in model_id.lower() or 'claude-4' in model_id.lower()):
-            return response_body.get('content', [{}])[0].get('text', '').strip()
+            return response_body.get('content', [{}])[0].get('text', '').strip(), 'invoke_model', model_id
         elif 'claude' in model_id.lower():
-            return response_body.get('completion', '').strip()
+            return response_body.get('completion', '').strip(), 'invoke_model', model_id
         elif 'nova' in model_id.lower() or 'titan' in model_id.lower():
-            return response_body.get('results', [{}])[0].get('outputText', '').strip()
+            return response_body.get('results', [{}])[0].get('outputText', '').strip(), 'invoke_model', model_id
         elif 'llama' in model_id.lower() or 'meta' in model_id.lower():
-            return response_body.get('generation', '').strip()
+            return response_body.get('generation', '').strip(), 'invoke_model', model_id
         else:
             # 通用提取方法
             if 'completion' in response_body:
-                return response_body.get('completion', '').strip()
+                return response_body.get('completion', '').strip(), 'invoke_model', model_id
             elif 'generated_text' in response_body:
-                return response_body.get('generated_text', '').strip()
+                return response_body.get('generated_text', '').strip(), 'invoke_model', model_id
             else:
-                return str(response_body)  # Fallback
+                return str(response_body), 'invoke_model', model_id  # Fallback
                 
     except Exception as e:
         error_msg = str(e)
-        logger.error(f"invoke_model API error: {error_msg}", exc_info=True)
+        logger.error("invoke_model API error: %s", error_msg, exc_info=True)
         
         # 尝试使用不同的方法
         
         # 1. 尝试使用converse API
         try:
-            logger.info(f"Trying converse API for {model_id}")
-            
-            # 使用converse API
-            response = bedrock_client.converse(
-                modelId=model_id,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [{"text": f"{system_prompt}\n\n{input_text}"}]
-                    }
-                ],
-                inferenceConfig={
-                    "temperature": 0.5,
-                    "maxTokens": 2000
-                }
-            )
-            
-            # Extract the translated text from the response
-            if 'output' in response and 'message' in response['output']:
-                output_message = response['output']['message']
-                if 'content' in output_message:
-                    for content_item in output_message['content']:
-                        if 'text' in content_item:
-                            return content_item['text'].strip()
+            logger.info("Trying converse API for %s", model_id)
             
-            # Fallback if the expected structure is not found
-            logger.warning(f"Unexpected converse API response structure: {response}")
-            return str(response)
+            return _converse(model_id, system_prompt, input_text), 'converse', model_id
             
         except Exception as converse_error:
-            logger.error(f"Converse API error: {str(converse_error)}", exc_info=True)
+            logger.error("Converse API error: %s", converse_error, exc_info=True)
             
             # 2. 如果有基础模型ID，尝试使用基础模型ID
             if base_model_id:
                 try:
-                    logger.info(f"Trying with base model ID: {base_model_id}")
+                    logger.info("Trying with base model ID: %s", base_model_id)
                     
                     # 递归调用，但使用基础模型ID
                     # 注意：这里不会导致无限递归，因为base_model_id不是inference profile
-                    return call_bedrock_api(base_model_id, system_prompt, input_text)
+                    translated_text, _, _ = _call_bedrock_api(base_model_id, system_prompt, input_text, use_route=False)
+                    return translated_text, 'base_model', base_model_id
                     
                 except Exception as base_model_error:
-                    logger.error(f"Base model API error: {str(base_model_error)}", exc_info=True)
+                    logger.error("Base model API error: %s", base_model_error, exc_info=True)
             
             # 3. 尝试在INFERENCE_PROFILES中查找替代的profile
             for profile_name, profile_arn in INFERENCE_PROFILES.items():
@@ -927,20 +2160,37 @@ def call_bedrock_api(model_id: str, system_prompt: str, input_text: str) -> str:
                     ('pixtral' in model_id.lower() and 'pixtral' in profile_arn.lower())
                 ):
                     try:
-                        logger.info(f"Trying alternative profile: {profile_arn}")
-                        return call_bedrock_api(profile_arn, system_prompt, input_text)
+                        logger.info("Trying alternative profile: %s", profile_arn)
+                        translated_text, _, _ = _call_bedrock_api(profile_arn, system_prompt, input_text, use_route=False)
+                        return translated_text, 'alt_profile', profile_arn
                     except Exception as alt_profile_error:
-                        logger.error(f"Alternative profile error: {str(alt_profile_error)}", exc_info=True)
+                        logger.error("Alternative profile error: %s", alt_profile_error, exc_info=True)
                         continue
             
             # 如果所有尝试都失败，抛出异常
             raise Exception(f"Translation failed: All API methods failed. Original error: {error_msg}")
 
-def generate_translation_html(translations: List[Dict[str, str]], 
-                             source_language: str, target_language: str) -> str:
-    """Generate HTML for translation results"""
+def generate_translation_html(translations: List[Dict[str, Any]], 
+                             source_language: str, target_language: Union[str, List[str]]) -> str:
+    """Generate HTML for translation results
     
-    html_content = f"""
+    With a list of target languages each item's `translated` is a list with
+    one translation per language, shown as one column each.
+    """
+    
+    html_content = translation_html_header(source_language, target_language)
+    for item in translations:
+        html_content += translation_html_item(item, source_language, target_language)
+    html_content += translation_html_footer()
+    
+    return html_content
+
+def translation_html_header(source_language: str, target_language: Union[str, List[str]]) -> str:
+    """Head of the translation results page, up to the first item"""
+    if not isinstance(target_language, str):
+        target_language = ', '.join(target_language)
+    
+    return f"""
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -968,7 +2218,7 @@ def generate_translation_html(translations: List[Dict[str, str]],
                 flex: 1;
                 padding: 10px;
             }}
-            .original {{
+            .original, .translated:not(:last-child) {{
                 border-right: 1px solid #eee;
             }}
             .header {{
@@ -987,30 +2237,38 @@ def generate_translation_html(translations: List[Dict[str, str]],
     <body>
         <h1>Translation Results: {source_language} to {target_language}</h1>
     """
-    
-    for item in translations:
-        html_content += f"""
-        <div class="translation-container">
-            <div class="original">
-                <div class="header">{source_language}</div>
-                <div>{item['original']}</div>
-            </div>
-            <div class="translated">
-                <div class="header">{target_language}</div>
-                <div>{item['translated']}</div>
-            </div>
-        </div>
-        """
-    
+
+def translation_html_item(item: Dict[str, Any], source_language: str, target_language: Union[str, List[str]]) -> str:
+    """One original text and its translation(s) on the translation results page"""
+    if isinstance(target_language, str):
+        columns = [(target_language, item['translated'])]
+    else:
+        columns = list(zip(target_language, item['translated']))
+    translated_html = ''.join(f"""
+        <div class="translated">
+            <div class="header">{language}</div>
+            <div>{translated}</div>
+        </div>""" for language, translated in columns)
+    return f"""
+    <div class="translation-container">
+        <div class="original">
+            <div class="header">{source_language}</div>
+            <div>{item['original']}</div>
+        </div>{translated_html}
+    </div>
+    """
+
+def translation_html_footer() -> str:
+    """Tail of the translation results page"""
     # Add timestamp
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    html_content += f"""
+    return f"""
         <div class="timestamp">Generated on {timestamp}</div>
     </body>
     </html>
     """
-    
-    return html_content
+
+_import_done = time.perf_counter()
 
 if __name__ == '__main__':
     import argparse
@@ -1023,4 +2281,4 @@ if __name__ == '__main__':
     
     args = parser.parse_args()
     
-    app.run(host=args.host, port=args.port, debug=args.debug)
+    create_app().run(host=args.host, port=args.port, debug=args.debug)
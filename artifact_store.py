@@ -0,0 +1,210 @@
+"""
+AWS Bedrock Translation Web Application - Artifact Store
+
+Job outputs (the translated HTML pages) are kept in a managed directory
+instead of piling up in uploads/. Artifacts expire after a TTL and the
+oldest are evicted when the directory exceeds its size budget.
+
+Each artifact is written once and then precompressed (gzip, and brotli when
+the brotli package is installed), so a download streams the smallest
+representation the client accepts without compressing per request. Range
+requests are served from the uncompressed file.
+"""
+
+import gzip
+import json
+import logging
+import os
+import secrets
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional
+
+from metrics import REGISTRY
+
+try:
+    import brotli
+except ImportError:  # brotli为可选，未安装时只提供gzip
+    brotli = None
+
+logger = logging.getLogger("BedrockTranslationApp")
+
+ARTIFACT_BYTES = REGISTRY.gauge(
+    'translator_artifact_store_bytes', 'Bytes on disk in the artifact store (all encodings)')
+ARTIFACT_EVICTIONS = REGISTRY.counter(
+    'translator_artifact_evictions_total', 'Artifacts removed from the artifact store', ('reason',))
+
+# 压缩格式 -> 文件后缀
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def new_artifact_id() -> str:
+    return secrets.token_urlsafe(12)
+
+
+class ArtifactWriter:
+    """Write an artifact incrementally; it becomes visible when the block exits without an error"""
+
+    def __init__(self, store: 'ArtifactStore', download_name: str, mimetype: str):
+        self.store = store
+        self.artifact_id = new_artifact_id()
+        self.download_name = download_name
+        self.mimetype = mimetype
+        self._tmp_path = store.path(self.artifact_id) + '.tmp'
+        self._file = open(self._tmp_path, 'wb')
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._file.write(data)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is not None:
+            os.remove(self._tmp_path)
+            return False
+        self.store._commit(self.artifact_id, self._tmp_path, self.download_name, self.mimetype)
+        return False
+
+
+class ArtifactStore:
+    """Job outputs on disk with TTL and total-size eviction"""
+
+    def __init__(self, folder: str, max_bytes: int = 1024 ** 3, ttl_seconds: float = 72 * 3600,
+                 compress_min_bytes: int = 1024):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.compress_min_bytes = compress_min_bytes
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, artifact_id: str, encoding: Optional[str] = None) -> str:
+        return os.path.join(self.folder, artifact_id + ENCODING_SUFFIXES.get(encoding, ''))
+
+    def _meta_path(self, artifact_id: str) -> str:
+        return os.path.join(self.folder, artifact_id + '.json')
+
+    def create(self, download_name: str, mimetype: str = 'text/html') -> ArtifactWriter:
+        return ArtifactWriter(self, download_name, mimetype)
+
+    def put(self, data, download_name: str, mimetype: str = 'text/html') -> str:
+        with self.create(download_name, mimetype) as writer:
+            writer.write(data)
+        return writer.artifact_id
+
+    def _commit(self, artifact_id: str, tmp_path: str, download_name: str, mimetype: str):
+        path = self.path(artifact_id)
+        os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        encodings = []
+        if size >= self.compress_min_bytes:
+            encodings = self._compress(path)
+        meta = {'artifact_id': artifact_id, 'download_name': download_name, 'mimetype': mimetype,
+                'size': size, 'encodings': encodings, 'created_at': time.time(),
+                'stored_bytes': size + sum(os.path.getsize(self.path(artifact_id, e)) for e in encodings)}
+        with open(self._meta_path(artifact_id) + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        os.replace(self._meta_path(artifact_id) + '.tmp', self._meta_path(artifact_id))
+        self.evict()
+
+    def _compress(self, path: str) -> List[str]:
+        """Precompress an artifact; returns the encodings that were written"""
+        encodings = []
+        with open(path, 'rb') as src, gzip.open(path + ENCODING_SUFFIXES['gzip'], 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+        encodings.append('gzip')
+        if brotli is not None:
+            compressor = brotli.Compressor(quality=5)
+            with open(path, 'rb') as src, open(path + ENCODING_SUFFIXES['br'], 'wb') as dst:
+                for chunk in iter(lambda: src.read(COPY_CHUNK_SIZE), b''):
+                    dst.write(compressor.process(chunk))
+                dst.write(compressor.finish())
+            encodings.append('br')
+        return encodings
+
+    def get(self, artifact_id: str) -> Optional[Dict]:
+        """Metadata of a live artifact"""
+        if not artifact_id or os.path.basename(artifact_id) != artifact_id or artifact_id.startswith('.'):
+            return None
+        try:
+            with open(self._meta_path(artifact_id), encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta['created_at'] + self.ttl_seconds < time.time():
+            self.delete(artifact_id)
+            ARTIFACT_EVICTIONS.inc(reason='expired')
+            return None
+        return meta
+
+    def delete(self, artifact_id: str):
+        for path in [self._meta_path(artifact_id), self.path(artifact_id)] + \
+                [self.path(artifact_id, encoding) for encoding in ENCODING_SUFFIXES]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _list(self) -> List[Dict]:
+        artifacts = []
+        for name in os.listdir(self.folder):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.folder, name), encoding='utf-8') as f:
+                    artifacts.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return artifacts
+
+    def evict(self) -> int:
+        """Remove expired artifacts, then the oldest until the store fits its size budget"""
+        removed = 0
+        with self._lock:
+            now = time.time()
+            artifacts = sorted(self._list(), key=lambda meta: meta['created_at'])
+            total = 0
+            live = []
+            for meta in artifacts:
+                if meta['created_at'] + self.ttl_seconds < now:
+                    self.delete(meta['artifact_id'])
+                    ARTIFACT_EVICTIONS.inc(reason='expired')
+                    removed += 1
+                else:
+                    live.append(meta)
+                    total += meta['stored_bytes']
+            # 保留最新的一个，即使它本身超过容量上限
+            while total > self.max_bytes and len(live) > 1:
+                meta = live.pop(0)
+                self.delete(meta['artifact_id'])
+                ARTIFACT_EVICTIONS.inc(reason='size')
+                total -= meta['stored_bytes']
+                removed += 1
+            ARTIFACT_BYTES.set(total)
+            # 中断的写入留下的临时文件
+            for name in os.listdir(self.folder):
+                path = os.path.join(self.folder, name)
+                try:
+                    if name.endswith('.tmp') and os.path.getmtime(path) + self.ttl_seconds < now:
+                        os.remove(path)
+                except OSError:
+                    pass
+        if removed:
+            logger.info(f"Artifact store: evicted {removed} artifacts, {total / 1024 / 1024:.1f} MB in use")
+        return removed
+
+    @staticmethod
+    def choose_encoding(meta: Dict, accept_encoding) -> Optional[str]:
+        """Best precompressed encoding the client accepts (werkzeug Accept-Encoding header object)"""
+        best = None
+        for encoding in ('br', 'gzip'):
+            if encoding in meta['encodings'] and accept_encoding[encoding] > 0:
+                if best is None or accept_encoding[encoding] > accept_encoding[best]:
+                    best = encoding
+        return best
@@ -0,0 +1,251 @@
+"""
+AWS Bedrock Translation Web Application - Glossaries
+
+Term lists per language pair (e.g. glossaries/English-Chinese.csv, two
+columns: source term, target term). Each glossary is compiled into an
+Aho-Corasick automaton, so the terms occurring in a segment are found in
+one pass over the segment regardless of the glossary size. Only those
+terms are added to the system prompt of that segment's call.
+"""
+
+import csv
+import io
+import logging
+import os
+import re
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from metrics import REGISTRY
+from translation_engine import PromptSpec
+
+logger = logging.getLogger("BedrockTranslationApp")
+
+GLOSSARY_TERMS_INJECTED = REGISTRY.counter(
+    'translator_glossary_terms_injected_total', 'Glossary terms added to translation prompts', ('pair',))
+
+_PAIR_PATTERN = re.compile(r'^[A-Za-z][A-Za-z ]{0,40}$')
+
+
+def _is_word_char(char: str) -> bool:
+    # 中日韩文字没有单词边界
+    return char.isalnum() and ord(char) < 0x2E80
+
+
+class AhoCorasick:
+    """Multi-pattern matcher: finds all occurrences of many terms in one pass over the text"""
+
+    def __init__(self, terms: List[str]):
+        self.terms = terms
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for index, term in enumerate(terms):
+            self._add(term, index)
+        self._build_failure_links()
+
+    def _add(self, term: str, index: int):
+        state = 0
+        for char in term:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = next_state
+        self._out[state].append(index)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._out[next_state] = self._out[next_state] + self._out[self._fail[next_state]]
+
+    def find(self, text: str) -> List[Tuple[int, int, int]]:
+        """All matches as (start, end, term index)"""
+        matches = []
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for index in self._out[state]:
+                matches.append((position + 1 - len(self.terms[index]), position + 1, index))
+        return matches
+
+    def __len__(self):
+        return len(self._goto)
+
+
+class Glossary:
+    """Source term -> target term mapping for one language pair"""
+
+    def __init__(self, entries: Dict[str, str], case_sensitive: bool = False):
+        self.case_sensitive = case_sensitive
+        # 规范化的源术语 -> (源术语, 目标术语)
+        self.entries: Dict[str, Tuple[str, str]] = {}
+        for source, target in entries.items():
+            source, target = source.strip(), target.strip()
+            if source and target:
+                self.entries[self._normalize(source)] = (source, target)
+        self._matcher = AhoCorasick(list(self.entries))
+
+    def _normalize(self, text: str) -> str:
+        # lower()对绝大多数字符不改变长度，匹配位置与原文一致
+        return text if self.case_sensitive else text.lower()
+
+    def match(self, text: str, max_terms: int = 50) -> List[Tuple[str, str]]:
+        """Glossary terms occurring in the text as whole words (leftmost-longest, in text order)"""
+        text = self._normalize(text)
+        terms = self._matcher.terms
+        selected = []
+        seen = set()
+        last_end = 0
+        for start, end, index in sorted(self._matcher.find(text), key=lambda m: (m[0], -m[1])):
+            if start < last_end:
+                continue
+            term = terms[index]
+            if (_is_word_char(term[0]) and start > 0 and _is_word_char(text[start - 1])) or \
+                    (_is_word_char(term[-1]) and end < len(text) and _is_word_char(text[end])):
+                continue
+            last_end = end
+            if term not in seen:
+                seen.add(term)
+                selected.append(self.entries[term])
+                if len(selected) >= max_terms:
+                    break
+        return selected
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def parse_glossary(content: str, delimiter: Optional[str] = None) -> Dict[str, str]:
+    """Two-column CSV/TSV (source term, target term); an optional header row is skipped"""
+    if delimiter is None:
+        delimiter = '\t' if '\t' in content.split('\n', 1)[0] else ','
+    entries = {}
+    for row_number, row in enumerate(csv.reader(io.StringIO(content), delimiter=delimiter)):
+        if len(row) < 2:
+            continue
+        if row_number == 0 and row[0].strip().lower() in ('source', 'term', 'source term'):
+            continue
+        entries[row[0]] = row[1]
+    return entries
+
+
+def glossary_instructions(terms: List[Tuple[str, str]]) -> str:
+    lines = '\n'.join(f'- {source} => {target}' for source, target in terms)
+    return f'\n\nUse these translations for the following terms:\n{lines}'
+
+
+class GlossaryStore:
+    """Glossaries per language pair, loaded from a directory and rebuilt when their file changes"""
+
+    def __init__(self, directory: str, max_terms: int = 50):
+        self.directory = directory
+        self.max_terms = max_terms
+        # pair -> (file mtime, Glossary)
+        self._glossaries: Dict[Tuple[str, str], Tuple[float, Glossary]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def valid_language(language: str) -> bool:
+        return bool(language and _PAIR_PATTERN.match(language))
+
+    def path(self, source_lang: str, target_lang: str) -> str:
+        return os.path.join(self.directory, f'{source_lang}-{target_lang}.csv')
+
+    def get(self, source_lang: str, target_lang: str) -> Optional[Glossary]:
+        if not (self.valid_language(source_lang) and self.valid_language(target_lang)):
+            return None
+        path = self.path(source_lang, target_lang)
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return None
+        key = (source_lang, target_lang)
+        cached = self._glossaries.get(key)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with self._lock:
+            cached = self._glossaries.get(key)
+            if cached is None or cached[0] != mtime:
+                with open(path, encoding='utf-8-sig') as f:
+                    glossary = Glossary(parse_glossary(f.read()))
+                self._glossaries[key] = (mtime, glossary)
+                logger.info(f"Loaded glossary {source_lang}-{target_lang}: {len(glossary)} terms")
+            return self._glossaries[key][1]
+
+    def save(self, source_lang: str, target_lang: str, entries: Dict[str, str]) -> Glossary:
+        """Replace the glossary of a language pair"""
+        if not (self.valid_language(source_lang) and self.valid_language(target_lang)):
+            raise ValueError('Invalid language name')
+        glossary = Glossary(entries)
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path(source_lang, target_lang)
+        with open(path + '.tmp', 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['source', 'target'])
+            writer.writerows(glossary.entries.values())
+        os.replace(path + '.tmp', path)
+        with self._lock:
+            self._glossaries[(source_lang, target_lang)] = (os.stat(path).st_mtime, glossary)
+        return glossary
+
+    def delete(self, source_lang: str, target_lang: str) -> bool:
+        if not (self.valid_language(source_lang) and self.valid_language(target_lang)):
+            return False
+        with self._lock:
+            self._glossaries.pop((source_lang, target_lang), None)
+        try:
+            os.remove(self.path(source_lang, target_lang))
+            return True
+        except OSError:
+            return False
+
+    def pairs(self) -> List[Dict]:
+        result = []
+        if not os.path.isdir(self.directory):
+            return result
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.csv') or name.count('-') != 1:
+                continue
+            source_lang, target_lang = name[:-4].split('-')
+            glossary = self.get(source_lang, target_lang)
+            if glossary is not None:
+                result.append({'source_language': source_lang, 'target_language': target_lang, 'terms': len(glossary)})
+        return result
+
+    def apply(self, system_prompt: str, text: str, source_lang: str, target_lang: str) -> str:
+        """The system prompt plus the glossary terms that occur in the text"""
+        glossary = self.get(source_lang, target_lang)
+        if glossary is None:
+            return system_prompt
+        return self._apply(glossary, system_prompt, text, f'{source_lang}-{target_lang}')
+
+    def _apply(self, glossary: Glossary, system_prompt: str, text: str, pair: str) -> str:
+        terms = glossary.match(text, self.max_terms)
+        if not terms:
+            return system_prompt
+        GLOSSARY_TERMS_INJECTED.inc(len(terms), pair=pair)
+        return system_prompt + glossary_instructions(terms)
+
+    def prompt_for(self, system_prompt: str, source_lang: str, target_lang: str) -> PromptSpec:
+        """A per-segment prompt function for the translation engine, or the plain prompt without a glossary"""
+        glossary = self.get(source_lang, target_lang)
+        if glossary is None:
+            return system_prompt
+        pair = f'{source_lang}-{target_lang}'
+        return lambda text: self._apply(glossary, system_prompt, text, pair)
@@ -0,0 +1,168 @@
+"""
+AWS Bedrock Translation Web Application - Logging Setup
+
+Log records are written off the request path: the root logger only has a
+QueueHandler, and a QueueListener thread formats the records (including
+tracebacks) and writes them to the log file and the console. Request
+threads pay for an enqueue, never for disk I/O.
+
+Repetitive messages are rate-limited per call site (at most `burst` records
+per `interval` seconds; the next record that gets through reports how many
+were suppressed), and a call site that keeps logging the same exception
+gets its full traceback only once per interval. Errors are never sampled;
+when the queue is full, lower-level records are dropped (and counted) while
+errors wait briefly for room and are otherwise written straight to stderr.
+
+With LOG_FORMAT=json every record is one JSON object per line.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from metrics import REGISTRY
+from tracing import TraceIdFilter
+
+LOG_RECORDS_DROPPED = REGISTRY.counter(
+    'translator_log_records_dropped_total', 'Log records dropped by sampling or a full log queue', ('reason',))
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s'
+
+# LogRecord的标准属性，其余属性（extra=...）写入JSON
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'trace_id', 'suppressed'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'trace_id': getattr(record, 'trace_id', '-'),
+            'message': record.getMessage(),
+            'thread': record.threadName,
+            'source': f'{record.module}:{record.lineno}',
+        }
+        if getattr(record, 'suppressed', 0):
+            entry['suppressed'] = record.suppressed
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Rate-limit records per call site and keep one full traceback per site and interval"""
+
+    def __init__(self, burst: int = 20, interval: float = 10.0, max_level: int = logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        # 只对该级别及以下的记录采样，错误总是记录
+        self.max_level = max_level
+        # 调用位置 -> [窗口开始时间, 窗口内记录数, 被抑制数]
+        self._sites: Dict[Tuple[str, int], list] = {}
+        # (调用位置, 异常类型) -> 上次输出完整堆栈的时间
+        self._tracebacks: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if self.burst <= 0:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            if record.exc_info and record.exc_info[0] is not None:
+                key = site + (record.exc_info[0],)
+                if self._tracebacks.get(key, -self.interval) + self.interval > now:
+                    # 重复的异常只保留消息，不再格式化堆栈
+                    record.exc_info = None
+                else:
+                    self._tracebacks[key] = now
+            if record.levelno > self.max_level:
+                return True
+            state = self._sites.get(site)
+            if state is None or state[0] + self.interval <= now:
+                suppressed = state[2] if state is not None else 0
+                state = self._sites[site] = [now, 0, 0]
+            else:
+                suppressed = 0
+            state[1] += 1
+            if state[1] > self.burst:
+                state[2] += 1
+                LOG_RECORDS_DROPPED.inc(reason='sampled')
+                return False
+            if suppressed:
+                record.suppressed = suppressed
+                record.msg = f'{record.msg} (suppressed {suppressed} similar messages)'
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records without formatting them; drop (and count) records below ERROR when the queue is full"""
+
+    # 队列满时错误记录最多等待的时间（秒），之后同步写入stderr
+    error_timeout = 0.1
+
+    def prepare(self, record):
+        # 只在调用线程中做消息插值（参数可能之后被修改），堆栈和格式化在写入线程中完成
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if record.levelno < logging.ERROR:
+                LOG_RECORDS_DROPPED.inc(reason='queue_full')
+                return
+            try:
+                self.queue.put(record, timeout=self.error_timeout)
+            except queue.Full:
+                sys.stderr.write(self.format(record) + '\n')
+
+
+def configure_logging(path: Optional[str] = 'translation_app.log', level: str = 'INFO', fmt: str = 'text',
+                      sample_burst: int = 20, sample_interval: float = 10.0,
+                      queue_size: int = 10000) -> logging.handlers.QueueListener:
+    """Send all log records through a queue to a background writer thread and return the listener"""
+    formatter = JsonFormatter() if fmt == 'json' else logging.Formatter(TEXT_FORMAT)
+    handlers = [logging.StreamHandler()]
+    if path:
+        handlers.insert(0, logging.FileHandler(path, encoding='utf-8'))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    # 只用于队列满时同步输出的错误记录
+    queue_handler.setFormatter(formatter)
+    # trace ID来自请求线程的上下文，必须在入队前设置
+    queue_handler.addFilter(TraceIdFilter())
+    queue_handler.addFilter(SamplingFilter(sample_burst, sample_interval))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level.upper())
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # 退出时写完队列中剩余的记录
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,270 @@
+"""
+AWS Bedrock Translation Web Application - Metrics
+
+A small, dependency-free Prometheus-style metrics registry.
+Counters, gauges and histograms are kept in memory and rendered in the
+Prometheus text exposition format by the /metrics endpoint.
+"""
+
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+# 默认延迟桶（秒），覆盖从短文本到长文档的Bedrock调用
+DEFAULT_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+def _escape_label_value(value) -> str:
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(label_names: Tuple[str, ...], label_values: Tuple[str, ...], extra: str = '') -> str:
+    """Render a label set like {model="x",path="y"}"""
+    parts = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base class for labelled metrics"""
+
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, label_names: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"Metric {self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> str:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        lines.extend(self._render_samples())
+        return '\n'.join(lines)
+
+    def _render_samples(self):
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """A monotonically increasing counter"""
+
+    metric_type = 'counter'
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+
+
+class Gauge(_Metric):
+    """A value that can go up and down, optionally computed at scrape time"""
+
+    metric_type = 'gauge'
+
+    def __init__(self, name, documentation, label_names=()):
+        super().__init__(name, documentation, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._callbacks: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, func: Callable[[], float], **labels):
+        """Compute the gauge value lazily whenever /metrics is scraped"""
+        key = self._key(labels)
+        with self._lock:
+            self._callbacks[key] = func
+
+    def _render_samples(self):
+        with self._lock:
+            values = dict(self._values)
+            callbacks = dict(self._callbacks)
+        for key, func in callbacks.items():
+            try:
+                values[key] = float(func())
+            except Exception:
+                continue
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}'
+
+
+class Histogram(_Metric):
+    """A cumulative histogram with fixed buckets"""
+
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # key -> [bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = [0] * len(self.buckets) + [0.0, 0]
+                self._values[key] = state
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def time(self, **labels):
+        """Context manager that observes the elapsed wall-clock time"""
+        return _Timer(self, labels)
+
+    def _render_samples(self):
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in items:
+            cumulative = 0
+            for i, bound in enumerate(self.buckets):
+                cumulative += state[i]
+                le = 'le="' + _format_value(bound) + '"'
+                yield f'{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}'
+            yield f'{self.name}_sum{_format_labels(self.label_names, key)} {_format_value(state[-2])}'
+            yield f'{self.name}_count{_format_labels(self.label_names, key)} {state[-1]}'
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRegistry:
+    """Holds all metrics of the process and renders them for scraping"""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, label_names=()) -> Counter:
+        return self._register(Counter(name, documentation, label_names))
+
+    def gauge(self, name, documentation, label_names=()) -> Gauge:
+        return self._register(Gauge(name, documentation, label_names))
+
+    def histogram(self, name, documentation, label_names=(), buckets=DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, label_names, buckets))
+
+    def get(self, name) -> Optional[_Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+# 进程级默认注册表
+REGISTRY = MetricsRegistry()
+
+CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+# ---- 应用指标 ----
+
+HTTP_REQUESTS = REGISTRY.counter(
+    'translator_http_requests_total', 'HTTP requests handled, by endpoint and status code',
+    ('endpoint', 'method', 'status'))
+HTTP_LATENCY = REGISTRY.histogram(
+    'translator_http_request_duration_seconds', 'HTTP request latency by endpoint',
+    ('endpoint', 'method'))
+
+BEDROCK_REQUESTS = REGISTRY.counter(
+    'translator_bedrock_requests_total', 'Translation calls to Bedrock, by model/profile and outcome',
+    ('model', 'outcome'))
+BEDROCK_LATENCY = REGISTRY.histogram(
+    'translator_bedrock_request_duration_seconds', 'End-to-end latency of call_bedrock_api including fallbacks',
+    ('model',))
+BEDROCK_ATTEMPT_LATENCY = REGISTRY.histogram(
+    'translator_bedrock_attempt_duration_seconds', 'Latency of a single Bedrock invocation attempt',
+    ('model', 'path'))
+BEDROCK_PATH = REGISTRY.counter(
+    'translator_bedrock_invocation_path_total', 'Which invocation path in call_bedrock_api produced the result',
+    ('model', 'path'))
+BEDROCK_ATTEMPT_ERRORS = REGISTRY.counter(
+    'translator_bedrock_attempt_errors_total', 'Failed Bedrock invocation attempts, by path and error code',
+    ('model', 'path', 'code'))
+BEDROCK_THROTTLES = REGISTRY.counter(
+    'translator_bedrock_throttles_total', 'Bedrock attempts rejected with a throttling error',
+    ('model',))
+BEDROCK_TOKENS = REGISTRY.counter(
+    'translator_bedrock_tokens_total', 'Tokens reported by Bedrock usage fields',
+    ('model', 'direction'))
+
+CACHE_REQUESTS = REGISTRY.counter(
+    'translator_cache_requests_total', 'Cache lookups by cache name and result (hit, miss, not_modified)',
+    ('cache', 'result'))
+
+RATINGS_WRITTEN = REGISTRY.counter(
+    'translator_ratings_written_total', 'Ratings committed to the database, by write mode',
+    ('mode',))
+RATINGS_WRITE_QUEUE_DEPTH = REGISTRY.gauge(
+    'translator_ratings_write_queue_depth', 'Ratings waiting in the write-behind queue')
+
+STARTUP_SECONDS = REGISTRY.gauge(
+    'translator_startup_seconds', 'Worker startup time by phase (imports, init_db, background_tasks, total)',
+    ('phase',))
+
+BATCH_QUEUE_DEPTH = REGISTRY.gauge(
+    'translator_batch_queue_depth', 'Batch translation segments waiting to be translated')
@@ -3,8 +3,15 @@ AWS Bedrock Translation Web Application - Model Configuration
 
 This file contains the configuration for AWS Bedrock models and inference profiles.
 It provides a central place to define model IDs and inference profile ARNs.
+
+The configuration is compiled once into an immutable ModelCatalog with dict
+indexes, so model lookups on the request path are O(1).
 """
 
+import hashlib
+import json
+from types import MappingProxyType
+
 # 注意: 请根据您的AWS账户中可用的模型和推理配置文件修改以下配置
 # Note: Please modify the following configuration based on the models and inference profiles available in your AWS account
 
@@ -123,27 +130,6 @@ MODEL_DISPLAY_NAMES = {
     'amazon.nova-micro-v1:0': 'Nova Micro (需要Inference Profile)',
     'deepseek.r1-v1:0': 'DeepSeek-R1 (需要Inference Profile)',
 }
-    'arn:aws:bedrock:us-east-1:770042106018:inference-profile/us.meta.llama3-2-1b-instruct-v1:0': 'Llama 3.2 1B',
-    'arn:aws:bedrock:us-east-1:770042106018:inference-profile/us.meta.llama3-2-3b-instruct-v1:0': 'Llama 3.2 3B',
-    'arn:aws:bedrock:us-east-1:770042106018:inference-profile/us.meta.llama3-2-11b-instruct-v1:0': 'Llama 3.2 11B',
-    'arn:aws:bedrock:us-east-1:770042106018:inference-profile/us.meta.llama3-2-90b-instruct-v1:0': 'Llama 3.2 90B',
-    'arn:aws:bedrock:us-east-1:770042106018:inference-profile/us.meta.llama3-3-70b-instruct-v1:0': 'Llama 3.3 70B',
-    'arn:aws:bedrock:us-east-1:770042106018:inference-profile/us.meta.llama4-scout-17b-instruct-v1:0': 'Llama 4 Scout 17B',
-    'arn:aws:bedrock:us-east-1:770042106018:inference-profile/us.meta.llama4-maverick-17b-instruct-v1:0': 'Llama 4 Maverick 17B',
-    
-    # Inference Profiles - 其他模型
-    'arn:aws:bedrock:us-east-1:770042106018:inference-profile/us.deepseek.r1-v1:0': 'DeepSeek-R1',
-    'arn:aws:bedrock:us-east-1:770042106018:inference-profile/us.mistral.pixtral-large-2502-v1:0': 'Mistral Pixtral Large',
-    
-    # 只能通过Inference Profile调用的模型 (用于显示警告)
-    'anthropic.claude-3-7-sonnet-20250219-v1:0': 'Claude 3.7 Sonnet (需要Inference Profile)',
-    'anthropic.claude-3-5-sonnet-20240620-v1:0': 'Claude 3.5 Sonnet (需要Inference Profile)',
-    'amazon.nova-premier-v1:0': 'Nova Premier (需要Inference Profile)',
-    'amazon.nova-lite-v1:0': 'Nova Lite (需要Inference Profile)',
-    'amazon.nova-pro-v1:0': 'Nova Pro (需要Inference Profile)',
-    'amazon.nova-micro-v1:0': 'Nova Micro (需要Inference Profile)',
-    'deepseek.r1-v1:0': 'DeepSeek-R1 (需要Inference Profile)',
-}
 
 # Default fallback models list when API listing fails
 DEFAULT_MODELS = [
@@ -182,23 +168,15 @@ def is_inference_profile(model_id):
 
 def requires_inference_profile(model_id):
     """Check if a model requires an inference profile to be used"""
-    # 检查模型ID是否在只能通过Inference Profile调用的列表中
-    for profile_only_model in PROFILE_ONLY_MODELS:
-        if profile_only_model in model_id:
-            return True
-    return False
+    return CATALOG.requires_inference_profile(model_id)
 
 def get_model_display_name(model_id):
     """Get the display name for a model ID or inference profile ARN"""
-    return MODEL_DISPLAY_NAMES.get(model_id, model_id)
+    return CATALOG.display_name(model_id)
 
 def get_corresponding_profile(model_id):
     """尝试获取与模型对应的inference profile ARN"""
-    # 这里简单实现，实际应用中可能需要更复杂的映射逻辑
-    for profile_name, profile_arn in INFERENCE_PROFILES.items():
-        if model_id in profile_arn:
-            return profile_arn
-    return None
+    return CATALOG.corresponding_profile(model_id)
 
 # 模型分组配置，用于在UI中组织模型
 MODEL_GROUPS = {
@@ -243,42 +221,89 @@ MODEL_GROUPS = {
     ]
 }
 
-def is_inference_profile(model_id):
-    """Check if a model ID is an inference profile ARN"""
-    return model_id.startswith('arn:aws:bedrock:')
+# 跨区域推理配置文件ID的地理前缀，例如 us.anthropic.claude-3-5-haiku-20241022-v1:0
+GEO_PREFIXES = ('us.', 'eu.', 'apac.', 'us-gov.', 'global.', 'jp.', 'au.', 'ca.')
 
-def requires_inference_profile(model_id):
-    """Check if a model requires an inference profile to be used"""
-    # 检查模型ID是否在只能通过Inference Profile调用的列表中
-    for profile_only_model in PROFILE_ONLY_MODELS:
-        if profile_only_model in model_id:
-            return True
-    return False
+def base_model_id(model_id):
+    """Reduce a model ID, cross-region profile ID or profile ARN to the plain model ID"""
+    model_id = model_id.rsplit('/', 1)[-1]
+    for prefix in GEO_PREFIXES:
+        if model_id.startswith(prefix):
+            return model_id[len(prefix):]
+    return model_id
 
-def get_model_display_name(model_id):
-    """Get the display name for a model ID or inference profile ARN"""
-    return MODEL_DISPLAY_NAMES.get(model_id, model_id)
+class ModelCatalog:
+    """Immutable, indexed view of the model configuration"""
 
-def get_corresponding_profile(model_id):
-    """尝试获取与模型对应的inference profile ARN"""
-    # 这里简单实现，实际应用中可能需要更复杂的映射逻辑
-    for profile_name, profile_arn in INFERENCE_PROFILES.items():
-        if model_id in profile_arn:
-            return profile_arn
-    return None
-    "Meta Llama 系列": [
-        INFERENCE_PROFILES['llama3_1_8b'],
-        INFERENCE_PROFILES['llama3_1_70b'],
-        INFERENCE_PROFILES['llama3_2_1b'],
-        INFERENCE_PROFILES['llama3_2_3b'],
-        INFERENCE_PROFILES['llama3_2_11b'],
-        INFERENCE_PROFILES['llama3_2_90b'],
-        INFERENCE_PROFILES['llama3_3_70b'],
-        INFERENCE_PROFILES['llama4_scout_17b'],
-        INFERENCE_PROFILES['llama4_maverick_17b'],
-    ],
-    "其他模型": [
-        INFERENCE_PROFILES['deepseek_r1'],
-        INFERENCE_PROFILES['mistral_pixtral_large'],
-    ]
-}
+    def __init__(self, foundation_models, inference_profiles, display_names, profile_only_models, model_groups):
+        self._display_names = MappingProxyType(dict(display_names))
+        self._profile_only = frozenset(base_model_id(model_id) for model_id in profile_only_models)
+
+        # 基础模型ID -> 第一个包含它的inference profile
+        profile_index = {}
+        for profile_arn in inference_profiles.values():
+            profile_index.setdefault(base_model_id(profile_arn), profile_arn)
+            profile_index.setdefault(profile_arn.rsplit('/', 1)[-1], profile_arn)
+        self._profile_index = MappingProxyType(profile_index)
+
+        # /connect 注册的模型：可直接调用的基础模型 + 所有inference profiles
+        models = []
+        for model_id in foundation_models.values():
+            if not self.requires_inference_profile(model_id):
+                models.append({'id': model_id, 'name': self.display_name(model_id)})
+        for profile_arn in inference_profiles.values():
+            models.append({'id': profile_arn, 'name': self.display_name(profile_arn)})
+        self.models = tuple(models)
+        self._by_id = MappingProxyType({model['id']: model for model in models})
+
+        self.groups = tuple((group_name, tuple(model_ids)) for group_name, model_ids in model_groups.items())
+        self._grouped_cache = {}
+
+        self.json = json.dumps(self.to_dict(), ensure_ascii=False, sort_keys=True)
+        self.etag = hashlib.sha1(self.json.encode('utf-8')).hexdigest()[:16]
+
+    @classmethod
+    def from_config(cls):
+        """Compile the dictionaries defined in this module"""
+        return cls(FOUNDATION_MODELS, INFERENCE_PROFILES, MODEL_DISPLAY_NAMES, PROFILE_ONLY_MODELS, MODEL_GROUPS)
+
+    def __contains__(self, model_id):
+        return model_id in self._by_id
+
+    def get(self, model_id):
+        return self._by_id.get(model_id)
+
+    def display_name(self, model_id):
+        return self._display_names.get(model_id, model_id)
+
+    def requires_inference_profile(self, model_id):
+        return base_model_id(model_id) in self._profile_only
+
+    def corresponding_profile(self, model_id):
+        return self._profile_index.get(base_model_id(model_id)) or self._profile_index.get(model_id.rsplit('/', 1)[-1])
+
+    def grouped(self, available_ids=None):
+        """Group models by MODEL_GROUPS, keeping only available ones; cached per available set"""
+        key = frozenset(self._by_id if available_ids is None else available_ids)
+        grouped = self._grouped_cache.get(key)
+        if grouped is None:
+            grouped = {}
+            for group_name, model_ids in self.groups:
+                group_models = [self._by_id[model_id] for model_id in model_ids
+                                if model_id in key and model_id in self._by_id]
+                if group_models:  # 只添加非空组
+                    grouped[group_name] = group_models
+            if len(self._grouped_cache) > 64:
+                self._grouped_cache.clear()
+            self._grouped_cache[key] = grouped
+        return grouped
+
+    def to_dict(self):
+        return {
+            'models': [dict(model, requires_inference_profile=self.requires_inference_profile(model['id']))
+                       for model in self.models],
+            'groups': [{'name': name, 'model_ids': list(model_ids)} for name, model_ids in self.groups],
+        }
+
+# 编译后的模型目录
+CATALOG = ModelCatalog.from_config()
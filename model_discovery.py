@@ -0,0 +1,287 @@
+"""
+AWS Bedrock Translation Web Application - Model Discovery
+
+Discovers the foundation models and inference profiles available to the
+connected account through the Bedrock control-plane listing APIs
+(ListFoundationModels, ListInferenceProfiles). All regions are listed in
+parallel and the result is kept in an on-disk TTL cache, so startup and
+/connect use the cached catalog immediately and stale entries are refreshed
+in the background.
+
+The control-plane client is created by an injectable factory
+(region -> client), which makes discovery testable against a stub.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from model_config import (
+    MODEL_DISPLAY_NAMES,
+    MODEL_GROUPS,
+    PROFILE_ONLY_MODELS,
+    ModelCatalog,
+    base_model_id
+)
+from metrics import REGISTRY
+
+logger = logging.getLogger("BedrockTranslationApp")
+
+DISCOVERY_REFRESHES = REGISTRY.counter(
+    'translator_model_discovery_refreshes_total', 'Model discovery refreshes per region, by outcome',
+    ('region', 'outcome'))
+DISCOVERY_LATENCY = REGISTRY.histogram(
+    'translator_model_discovery_duration_seconds', 'Time to list models and inference profiles for one region',
+    ('region',))
+
+CACHE_VERSION = 1
+# 每页最多返回的inference profiles数量（API上限1000）
+PROFILE_PAGE_SIZE = 1000
+PROFILE_TYPES = ('SYSTEM_DEFINED', 'APPLICATION')
+
+ClientFactory = Callable[[str], Any]
+
+
+def _paginate(method, result_key: str, **kwargs) -> List[Dict]:
+    """Follow nextToken until the listing is exhausted"""
+    items = []
+    token = None
+    while True:
+        if token:
+            kwargs['nextToken'] = token
+        response = method(**kwargs)
+        items.extend(response.get(result_key, []))
+        token = response.get('nextToken')
+        if not token:
+            return items
+
+
+def _list_foundation_models(client) -> List[Dict]:
+    """Text-generating foundation models that are not retired"""
+    models = []
+    for summary in _paginate(client.list_foundation_models, 'modelSummaries', byOutputModality='TEXT'):
+        if summary.get('modelLifecycle', {}).get('status', 'ACTIVE') != 'ACTIVE':
+            continue
+        models.append({
+            'id': summary['modelId'],
+            'name': summary.get('modelName') or summary['modelId'],
+            'provider': summary.get('providerName', ''),
+            'inference_types': summary.get('inferenceTypesSupported', []),
+        })
+    return models
+
+
+def _list_inference_profiles(client, profile_type: str) -> List[Dict]:
+    """Active inference profiles of one type"""
+    profiles = []
+    for summary in _paginate(client.list_inference_profiles, 'inferenceProfileSummaries',
+                             maxResults=PROFILE_PAGE_SIZE, typeEquals=profile_type):
+        if summary.get('status', 'ACTIVE') != 'ACTIVE':
+            continue
+        profiles.append({
+            'id': summary['inferenceProfileId'],
+            'arn': summary['inferenceProfileArn'],
+            'name': summary.get('inferenceProfileName') or summary['inferenceProfileId'],
+            'type': summary.get('type', profile_type),
+            'models': [model.get('modelArn', '').rsplit('/', 1)[-1] for model in summary.get('models', [])],
+        })
+    return profiles
+
+
+def catalog_from_listing(listing: Dict[str, List[Dict]]) -> ModelCatalog:
+    """Build a ModelCatalog from one region's listing, reusing configured names and groups"""
+    # 配置中的显示名称和分组按基础模型ID匹配（配置的ARN中含有账户ID占位符）
+    configured_names = {}
+    for model_id, name in MODEL_DISPLAY_NAMES.items():
+        configured_names.setdefault((model_id.startswith('arn:'), base_model_id(model_id)), name)
+    configured_groups = {}
+    for group_name, model_ids in MODEL_GROUPS.items():
+        for model_id in model_ids:
+            configured_groups.setdefault((model_id.startswith('arn:'), base_model_id(model_id)), group_name)
+
+    text_models = {model['id']: model for model in listing.get('foundation_models', [])}
+    foundation_models = {}
+    display_names = {}
+    profile_only = list(PROFILE_ONLY_MODELS)
+    groups: Dict[str, List[str]] = {name: [] for name in MODEL_GROUPS}
+
+    def add_to_group(key, model_id, provider):
+        group_name = configured_groups.get(key) or provider or '其他模型'
+        groups.setdefault(group_name, []).append(model_id)
+
+    for model in listing.get('foundation_models', []):
+        inference_types = model['inference_types']
+        if 'ON_DEMAND' not in inference_types:
+            if 'INFERENCE_PROFILE' in inference_types:
+                profile_only.append(model['id'])
+            continue
+        key = (False, base_model_id(model['id']))
+        foundation_models[model['id']] = model['id']
+        display_names[model['id']] = configured_names.get(key) or model['name']
+        add_to_group(key, model['id'], model['provider'])
+
+    inference_profiles = {}
+    for profile in listing.get('inference_profiles', []):
+        # 只保留指向文本模型的profile
+        if text_models and profile['models'] and not any(
+                base_model_id(model_id) in text_models for model_id in profile['models']):
+            continue
+        key = (True, base_model_id(profile['id']))
+        underlying = text_models.get(key[1], {})
+        inference_profiles[profile['id']] = profile['arn']
+        display_names[profile['arn']] = configured_names.get(key) or profile['name']
+        add_to_group(key, profile['arn'], underlying.get('provider'))
+
+    return ModelCatalog(foundation_models, inference_profiles, display_names, profile_only,
+                        {name: ids for name, ids in groups.items() if ids})
+
+
+class ModelDiscovery:
+    """List models per region in parallel and cache the listings on disk"""
+
+    def __init__(self, cache_path: str, ttl_seconds: float = 12 * 3600, max_workers: int = 8):
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self.max_workers = max_workers
+        self._entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self._load_cache()
+
+    @staticmethod
+    def cache_key(scope: str, region: str) -> str:
+        return f'{scope}|{region}'
+
+    def _read_cache_file(self) -> Dict[str, Dict]:
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable model cache {self.cache_path}: {str(e)}")
+            return {}
+        if data.get('version') != CACHE_VERSION:
+            return {}
+        return data.get('entries', {})
+
+    def _load_cache(self):
+        entries = self._read_cache_file()
+        with self._lock:
+            self._entries = entries
+        if entries:
+            logger.info(f"Loaded {len(entries)} cached model listings from {self.cache_path}")
+
+    def _save_cache(self, updated: Dict[str, Dict]):
+        """Merge freshly listed entries into the cache file (other workers may share it)"""
+        entries = self._read_cache_file()
+        entries.update(updated)
+        with self._lock:
+            for key, entry in entries.items():
+                current = self._entries.get(key)
+                if current is None or current.get('fetched_at', 0) < entry.get('fetched_at', 0):
+                    self._entries[key] = entry
+        directory = os.path.dirname(os.path.abspath(self.cache_path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f'{self.cache_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'entries': entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_path)
+
+    def cached(self, scope: str, region: str) -> Optional[Dict]:
+        """Cached listing entry ({'fetched_at', 'foundation_models', 'inference_profiles'}) or None"""
+        with self._lock:
+            return self._entries.get(self.cache_key(scope, region))
+
+    def is_fresh(self, scope: str, region: str) -> bool:
+        entry = self.cached(scope, region)
+        return entry is not None and time.time() - entry.get('fetched_at', 0) < self.ttl_seconds
+
+    def catalog(self, scope: str, region: str) -> Optional[ModelCatalog]:
+        """Catalog built from the cached listing, even if it is stale"""
+        entry = self.cached(scope, region)
+        if not entry:
+            return None
+        return catalog_from_listing(entry)
+
+    def _list_region(self, client, region: str, pool: ThreadPoolExecutor) -> Dict:
+        start = time.perf_counter()
+        models_future = pool.submit(_list_foundation_models, client)
+        profile_futures = [pool.submit(_list_inference_profiles, client, profile_type)
+                           for profile_type in PROFILE_TYPES]
+        entry = {
+            'fetched_at': time.time(),
+            'foundation_models': models_future.result(),
+            'inference_profiles': [profile for future in profile_futures for profile in future.result()],
+        }
+        DISCOVERY_LATENCY.observe(time.perf_counter() - start, region=region)
+        return entry
+
+    def refresh(self, scope: str, regions: Iterable[str], client_factory: ClientFactory) -> Dict[str, Dict]:
+        """List all regions in parallel and store the results; failed regions keep their old entry"""
+        regions = list(dict.fromkeys(regions))
+        # boto3 Session不是线程安全的，客户端在当前线程中创建
+        clients = {}
+        for region in regions:
+            try:
+                clients[region] = client_factory(region)
+            except Exception as e:
+                DISCOVERY_REFRESHES.inc(region=region, outcome='error')
+                logger.warning(f"Could not create Bedrock control-plane client for {region}: {str(e)}")
+
+        results = {}
+        if not clients:
+            return results
+        # 每个区域一个任务，区域内的三个列表调用并行执行
+        with ThreadPoolExecutor(max_workers=self.max_workers) as list_pool, \
+                ThreadPoolExecutor(max_workers=len(clients)) as region_pool:
+            futures = {region: region_pool.submit(self._list_region, client, region, list_pool)
+                       for region, client in clients.items()}
+            for region, future in futures.items():
+                try:
+                    results[region] = future.result()
+                    DISCOVERY_REFRESHES.inc(region=region, outcome='success')
+                except Exception as e:
+                    DISCOVERY_REFRESHES.inc(region=region, outcome='error')
+                    logger.warning(f"Model discovery failed in {region}: {str(e)}")
+
+        if results:
+            updated = {self.cache_key(scope, region): entry for region, entry in results.items()}
+            with self._lock:
+                self._entries.update(updated)
+            try:
+                self._save_cache(updated)
+            except OSError as e:
+                logger.warning(f"Could not write model cache {self.cache_path}: {str(e)}")
+            logger.info(f"Discovered models in {', '.join(sorted(results))}: "
+                        + ', '.join(f"{region}={len(entry['foundation_models'])} models/"
+                                    f"{len(entry['inference_profiles'])} profiles"
+                                    for region, entry in sorted(results.items())))
+        return results
+
+    def refresh_async(self, scope: str, regions: Iterable[str], client_factory: ClientFactory,
+                      on_done: Optional[Callable[[Dict[str, Dict]], None]] = None) -> bool:
+        """Refresh in a background thread; returns False if a refresh for this scope is already running"""
+        with self._lock:
+            if scope in self._refreshing:
+                return False
+            self._refreshing.add(scope)
+        regions = list(regions)
+
+        def run():
+            try:
+                results = self.refresh(scope, regions, client_factory)
+                if on_done is not None:
+                    on_done(results)
+            except Exception as e:
+                logger.error(f"Background model discovery failed: {str(e)}", exc_info=True)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(scope)
+
+        threading.Thread(target=run, name='model-discovery', daemon=True).start()
+        return True
@@ -0,0 +1,148 @@
+"""
+AWS Bedrock Translation Web Application - Model Health
+
+After /connect every model in the list is probed concurrently with a tiny
+translation. The results (availability, latency of the attempt that
+succeeded and the invocation path that worked) are shown in the model picker, pick the
+default model, and let call_bedrock_api go straight to the working path
+instead of walking its fallback chain on the first real request. The
+concurrent probes also open and warm the client's HTTP connection pool.
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger("BedrockTranslationApp")
+
+MODEL_PROBE_LATENCY = REGISTRY.histogram(
+    'translator_model_probe_duration_seconds', 'Time to first response of model probes',
+    ('model',))
+MODEL_AVAILABLE = REGISTRY.gauge(
+    'translator_model_available', 'Whether the last probe of a model succeeded (1) or failed (0)',
+    ('model',))
+
+# 只有这些路径需要先经历失败的尝试，值得记住并直接使用
+ROUTABLE_PATHS = ('converse', 'base_model', 'alt_profile')
+
+# probe(model_id) -> (path, target model ID, latency of the successful attempt in seconds or None)
+ProbeFunction = Callable[[str], Tuple[str, str, Optional[float]]]
+
+
+class ModelHealth:
+    """Latest probe result per model"""
+
+    def __init__(self, max_workers: int = 8, on_complete: Optional[Callable[[Dict[str, Dict]], None]] = None):
+        self.max_workers = max_workers
+        # 一轮探测完成后回调（例如发布给其他worker）
+        self.on_complete = on_complete
+        self._results: Dict[str, Dict] = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def reset(self) -> int:
+        """Forget all results (e.g. after reconnecting) and return the new probe generation"""
+        with self._lock:
+            self._generation += 1
+            self._results = {}
+            return self._generation
+
+    def load(self, results: Dict[str, Dict]):
+        """Replace all results with a snapshot probed elsewhere (e.g. by another worker)"""
+        with self._lock:
+            self._generation += 1
+            self._results = {model_id: dict(result) for model_id, result in results.items()}
+
+    def record(self, model_id: str, available: bool, ttfb: Optional[float] = None, path: Optional[str] = None,
+               target: Optional[str] = None, error: Optional[str] = None, generation: Optional[int] = None):
+        with self._lock:
+            # 忽略上一次连接遗留的探测结果
+            if generation is not None and generation != self._generation:
+                return
+            self._results[model_id] = {
+                'available': available,
+                'ttfb_ms': round(ttfb * 1000, 1) if ttfb is not None else None,
+                'path': path,
+                'target': target,
+                'error': error,
+                'checked_at': time.time(),
+            }
+        MODEL_AVAILABLE.set(1 if available else 0, model=model_id)
+
+    def get(self, model_id: str) -> Optional[Dict]:
+        with self._lock:
+            result = self._results.get(model_id)
+            return dict(result) if result else None
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {model_id: dict(result) for model_id, result in self._results.items()}
+
+    def route(self, model_id: str) -> Optional[Tuple[str, str]]:
+        """The (path, target) that worked for this model if it is not the first path tried"""
+        with self._lock:
+            result = self._results.get(model_id)
+            if result and result['available'] and result['path'] in ROUTABLE_PATHS and result['target']:
+                return result['path'], result['target']
+        return None
+
+    def forget_route(self, model_id: str):
+        with self._lock:
+            result = self._results.get(model_id)
+            if result:
+                result['path'] = None
+
+    def fastest(self, model_ids: Iterable[str]) -> Optional[str]:
+        """The available model with the lowest probe latency"""
+        with self._lock:
+            candidates = [(self._results[model_id]['ttfb_ms'], model_id) for model_id in model_ids
+                          if model_id in self._results and self._results[model_id]['available']]
+        return min(candidates)[1] if candidates else None
+
+    def _probe_one(self, model_id: str, probe: ProbeFunction, generation: int):
+        start = time.perf_counter()
+        try:
+            path, target, ttfb = probe(model_id)
+        except Exception as e:
+            self.record(model_id, False, error=str(e)[:300], generation=generation)
+            return
+        if ttfb is None:
+            ttfb = time.perf_counter() - start
+        MODEL_PROBE_LATENCY.observe(ttfb, model=model_id)
+        self.record(model_id, True, ttfb, path, target, generation=generation)
+
+    def probe_all(self, model_ids: Iterable[str], probe: ProbeFunction, generation: Optional[int] = None):
+        """Probe all models concurrently and wait for the results"""
+        if generation is None:
+            generation = self.reset()
+        model_ids = list(dict.fromkeys(model_ids))
+        if not model_ids:
+            return
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(model_ids)),
+                                thread_name_prefix='model-probe') as pool:
+            for model_id in model_ids:
+                pool.submit(self._probe_one, model_id, probe, generation)
+        results = self.snapshot()
+        available = sum(1 for model_id in model_ids if results.get(model_id, {}).get('available'))
+        logger.info(f"Probed {len(model_ids)} models in {time.perf_counter() - start:.1f}s: {available} available")
+        if self.on_complete is not None and generation == self._generation:
+            self.on_complete(results)
+
+    def probe_async(self, model_ids: Iterable[str], probe: ProbeFunction) -> int:
+        """Start a new probe round in a background thread and return its generation"""
+        generation = self.reset()
+        model_ids = list(model_ids)
+
+        def run():
+            try:
+                self.probe_all(model_ids, probe, generation)
+            except Exception as e:
+                logger.error(f"Model probing failed: {str(e)}", exc_info=True)
+
+        threading.Thread(target=run, name='model-probe', daemon=True).start()
+        return generation
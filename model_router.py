@@ -0,0 +1,154 @@
+"""
+AWS Bedrock Translation Web Application - Automatic Model Routing
+
+With model "auto" each request is routed to the fastest model whose rated
+quality for the language pair meets a configured floor:
+
+    - latency: exponentially weighted moving average of the model's recent
+      calls in this worker (the connect-time probe until it has been called)
+    - quality: average rating per model and language pair over a rolling
+      window, read from the hourly rating rollups (the model's average over
+      all pairs when the pair has too few ratings) and refreshed periodically
+
+Models that keep failing are skipped for a while. A small share of the
+requests goes to another qualifying model so its latency estimate stays
+current.
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger("BedrockTranslationApp")
+
+ROUTER_DECISIONS = REGISTRY.counter(
+    'translator_router_decisions_total', 'Models chosen by automatic routing', ('model', 'reason'))
+
+AUTO_MODEL_ID = 'auto'
+
+# quality(source_language, target_language) -> {model_id: {'avg_rating', 'count'}}；语言为None时返回所有语言对的平均
+QualityFunction = Callable[[Optional[str], Optional[str]], Dict[str, Dict]]
+
+
+class ModelRouter:
+    """Pick the fastest model that meets the quality floor for a language pair"""
+
+    def __init__(self, quality: QualityFunction, quality_floor: float = 4.0, min_ratings: int = 5,
+                 refresh_seconds: float = 60, explore: float = 0.05, alpha: float = 0.2,
+                 max_error_rate: float = 0.5, retry_failed_seconds: float = 300):
+        self.quality_source = quality
+        self.quality_floor = quality_floor
+        self.min_ratings = min_ratings
+        self.refresh_seconds = refresh_seconds
+        self.explore = explore
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.retry_failed_seconds = retry_failed_seconds
+        # model_id -> [延迟EWMA(秒), 错误率EWMA, 调用次数, 最后一次调用时间]
+        self._latency: Dict[str, List[float]] = {}
+        # (source, target) -> (读取时间, 质量数据)
+        self._quality: Dict[Tuple, Tuple[float, Dict[str, Dict]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model_id: str, seconds: float, ok: bool = True):
+        """Record the outcome of a call"""
+        with self._lock:
+            stats = self._latency.get(model_id)
+            if stats is None:
+                self._latency[model_id] = [seconds if ok else 0.0, 0.0 if ok else 1.0, 1, time.time()]
+                return
+            if ok:
+                # 第一次成功前只有失败记录，直接使用本次延迟
+                stats[0] = seconds if not stats[0] else stats[0] + self.alpha * (seconds - stats[0])
+            stats[1] += self.alpha * ((0.0 if ok else 1.0) - stats[1])
+            stats[2] += 1
+            stats[3] = time.time()
+
+    def latency(self, model_id: str) -> Optional[float]:
+        with self._lock:
+            stats = self._latency.get(model_id)
+            return stats[0] if stats and stats[0] else None
+
+    def error_rate(self, model_id: str) -> float:
+        with self._lock:
+            stats = self._latency.get(model_id)
+            # 失败的模型在一段时间后重新尝试
+            if not stats or stats[3] + self.retry_failed_seconds < time.time():
+                return 0.0
+            return stats[1]
+
+    def _quality_for(self, source_lang: Optional[str], target_lang: Optional[str]) -> Dict[str, Dict]:
+        key = (source_lang, target_lang)
+        cached = self._quality.get(key)
+        if cached is not None and cached[0] + self.refresh_seconds > time.time():
+            return cached[1]
+        try:
+            quality = self.quality_source(source_lang, target_lang)
+        except Exception as e:
+            logger.warning(f"Model router: could not read ratings: {str(e)}")
+            quality = cached[1] if cached is not None else {}
+        self._quality[key] = (time.time(), quality)
+        return quality
+
+    def quality(self, model_id: str, source_lang: str, target_lang: str) -> Tuple[Optional[float], int, str]:
+        """(average rating, rating count, scope) of a model; scope is 'pair', 'overall' or 'none'"""
+        rated = self._quality_for(source_lang, target_lang).get(model_id)
+        if rated and rated['count'] >= self.min_ratings:
+            return rated['avg_rating'], rated['count'], 'pair'
+        overall = self._quality_for(None, None).get(model_id)
+        if overall and overall['count'] >= self.min_ratings:
+            return overall['avg_rating'], overall['count'], 'overall'
+        return None, 0, 'none'
+
+    def candidates(self, model_ids: Iterable[str], source_lang: str, target_lang: str,
+                   probe_latency: Optional[Dict[str, float]] = None) -> List[Dict]:
+        """Routing inputs per model, fastest first (models without any latency estimate last)"""
+        probe_latency = probe_latency or {}
+        result = []
+        for model_id in dict.fromkeys(model_ids):
+            latency = self.latency(model_id)
+            if latency is None:
+                latency = probe_latency.get(model_id)
+            avg_rating, count, scope = self.quality(model_id, source_lang, target_lang)
+            result.append({
+                'model_id': model_id,
+                'latency_ms': round(latency * 1000, 1) if latency is not None else None,
+                'error_rate': round(self.error_rate(model_id), 3),
+                'avg_rating': round(avg_rating, 2) if avg_rating is not None else None,
+                'ratings': count,
+                'quality_scope': scope,
+                'qualifies': avg_rating is not None and avg_rating >= self.quality_floor,
+            })
+        result.sort(key=lambda c: (c['latency_ms'] is None, c['latency_ms'] or 0))
+        return result
+
+    def choose(self, model_ids: Iterable[str], source_lang: str, target_lang: str,
+               probe_latency: Optional[Dict[str, float]] = None, preview: bool = False) -> Tuple[Optional[str], str]:
+        """The model to use and why: fastest_qualifying, explore, best_rated or fastest
+
+        A preview (e.g. for showing the decision) never explores and is not counted.
+        """
+        candidates = [c for c in self.candidates(model_ids, source_lang, target_lang, probe_latency)
+                      if c['error_rate'] <= self.max_error_rate]
+        if not candidates:
+            return None, 'none'
+        qualifying = [c for c in candidates if c['qualifies']]
+        if qualifying:
+            if not preview and len(qualifying) > 1 and random.random() < self.explore:
+                model_id, reason = random.choice(qualifying[1:])['model_id'], 'explore'
+            else:
+                model_id, reason = qualifying[0]['model_id'], 'fastest_qualifying'
+        else:
+            rated = [c for c in candidates if c['avg_rating'] is not None]
+            if rated:
+                # 没有模型达到质量要求时，使用评分最高的模型
+                model_id, reason = max(rated, key=lambda c: c['avg_rating'])['model_id'], 'best_rated'
+            else:
+                model_id, reason = candidates[0]['model_id'], 'fastest'
+        if not preview:
+            ROUTER_DECISIONS.inc(model=model_id, reason=reason)
+        return model_id, reason
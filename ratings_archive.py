@@ -0,0 +1,157 @@
+"""
+AWS Bedrock Translation Web Application - Ratings Archive
+
+Retention management for the ratings table. Ratings older than the
+retention window are written to monthly Parquet files
+(archive_dir/month=YYYY-MM/part-<first id>-<last id>.parquet) and pruned
+from the live SQLite table, which keeps the hot database small. The hourly
+rollups are not touched, so /rating_stats keeps covering archived periods.
+
+Archived ratings can be queried with column projection and month
+partition pruning through RatingsArchive.query().
+
+Requires pyarrow (optional dependency, imported on first use).
+"""
+
+import importlib.util
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+# pyarrow在首次归档或查询时才导入（导入耗时较长，且为可选依赖）
+pa = ds = pq = None
+
+from ratings_db import RatingsStore
+
+logger = logging.getLogger("BedrockTranslationApp")
+
+ARCHIVE_COLUMNS = ('id', 'timestamp', 'source_language', 'target_language', 'model_id', 'rating',
+                   'source_text', 'translated_text')
+
+
+def archive_available() -> bool:
+    """Check whether pyarrow is installed, without importing it"""
+    return pa is not None or importlib.util.find_spec('pyarrow') is not None
+
+
+def _import_pyarrow():
+    global pa, ds, pq
+    if pa is None:
+        import pyarrow
+        import pyarrow.dataset
+        import pyarrow.parquet
+        pa, ds, pq = pyarrow, pyarrow.dataset, pyarrow.parquet
+
+
+def _archive_schema():
+    return pa.schema([
+        ('id', pa.int64()),
+        ('timestamp', pa.timestamp('us')),
+        ('source_language', pa.string()),
+        ('target_language', pa.string()),
+        ('model_id', pa.string()),
+        ('rating', pa.int8()),
+        ('source_text', pa.string()),
+        ('translated_text', pa.string()),
+    ])
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+class RatingsArchive:
+    """Move old ratings into monthly Parquet files and query them"""
+
+    def __init__(self, store: RatingsStore, archive_dir: str):
+        self.store = store
+        self.archive_dir = archive_dir
+
+    def _require_pyarrow(self):
+        if not archive_available():
+            raise RuntimeError('pyarrow is required for the ratings archive. Install it with: pip install pyarrow')
+        _import_pyarrow()
+
+    def archive_older_than(self, retention_days: int, batch_size: int = 50000) -> Dict[str, Any]:
+        """Archive and prune ratings older than `retention_days` days"""
+        self._require_pyarrow()
+        cutoff = datetime.now() - timedelta(days=retention_days)
+        archived = 0
+        files = set()
+
+        for batch in self.store.iter_ratings(before=cutoff, batch_size=batch_size):
+            by_month: Dict[str, List[Dict[str, Any]]] = {}
+            for row in batch:
+                row['timestamp'] = _parse_timestamp(row['timestamp'])
+                month = row['timestamp'].strftime('%Y-%m') if row['timestamp'] else 'unknown'
+                by_month.setdefault(month, []).append(row)
+
+            for month, rows in by_month.items():
+                # 文件名由ID范围决定，中断后重跑会覆盖同一文件而不是产生重复
+                month_dir = os.path.join(self.archive_dir, f'month={month}')
+                os.makedirs(month_dir, exist_ok=True)
+                path = os.path.join(month_dir, f'part-{rows[0]["id"]}-{rows[-1]["id"]}.parquet')
+                table = pa.Table.from_pylist([{name: row.get(name) for name in ARCHIVE_COLUMNS} for row in rows],
+                                             schema=_archive_schema())
+                pq.write_table(table, path, compression='zstd')
+                files.add(path)
+
+            # 确认写入归档后才从活动表删除
+            self.store.delete_ratings([row['id'] for row in batch])
+            archived += len(batch)
+
+        orphan_texts = self.store.delete_orphan_texts() if archived else 0
+        if archived:
+            self.store.connection().execute('PRAGMA optimize')
+        logger.info(f"Archived {archived} ratings older than {cutoff:%Y-%m-%d} into {len(files)} files, removed {orphan_texts} unreferenced texts")
+        return {
+            'archived': archived,
+            'cutoff': cutoff.isoformat(),
+            'files': sorted(os.path.relpath(path, self.archive_dir) for path in files),
+            'removed_texts': orphan_texts,
+        }
+
+    def query(self, columns: Optional[List[str]] = None, start: Optional[datetime] = None,
+              end: Optional[datetime] = None, filters: Optional[Dict[str, Any]] = None,
+              limit: Optional[int] = None):
+        """Scan archived ratings, reading only the requested columns and months
+
+        Returns a pyarrow Table.
+        """
+        self._require_pyarrow()
+        columns = list(columns or ARCHIVE_COLUMNS)
+        unknown = [name for name in columns if name not in ARCHIVE_COLUMNS]
+        if unknown:
+            raise ValueError(f"Unknown archive columns: {', '.join(unknown)}")
+
+        if not os.path.isdir(self.archive_dir):
+            return _archive_schema().empty_table().select(columns)
+
+        dataset = ds.dataset(self.archive_dir, format='parquet', partitioning='hive',
+                             schema=_archive_schema().append(pa.field('month', pa.string())))
+
+        expression = None
+        conditions = []
+        if start is not None:
+            # 月份分区条件用于跳过整个目录
+            conditions.append(ds.field('month') >= start.strftime('%Y-%m'))
+            conditions.append(ds.field('timestamp') >= pa.scalar(start, pa.timestamp('us')))
+        if end is not None:
+            conditions.append(ds.field('month') <= end.strftime('%Y-%m'))
+            conditions.append(ds.field('timestamp') < pa.scalar(end, pa.timestamp('us')))
+        for name, value in (filters or {}).items():
+            if name not in ('model_id', 'source_language', 'target_language', 'rating'):
+                raise ValueError(f"Cannot filter archive on {name}")
+            conditions.append(ds.field(name) == value)
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+
+        if limit is not None:
+            return dataset.head(limit, columns=columns, filter=expression)
+        return dataset.to_table(columns=columns, filter=expression)
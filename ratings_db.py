@@ -0,0 +1,590 @@
+"""
+AWS Bedrock Translation Web Application - Ratings Storage
+
+SQLite storage layer for translation ratings. Connections are reused per
+thread and the database runs in WAL mode so readers never block on writers.
+
+Statistics are served from an hourly rollup table (count and rating sum per
+hour x model x language pair x rating) that is updated in the same
+transaction as every insert, so their cost does not grow with the number
+of raw ratings.
+
+Single ratings can be buffered by RatingWriteBehindQueue, which writes them
+in batches from a background thread.
+
+Source and translated texts are stored once in a content-addressed table
+(keyed by SHA-256) and compressed with zlib or, if installed, zstd; ratings
+reference them by ID.
+"""
+
+import hashlib
+import logging
+import sqlite3
+import threading
+import zlib
+from collections import Counter
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd为可选依赖
+    zstandard = None
+
+logger = logging.getLogger("BedrockTranslationApp")
+
+# 每个连接建立时执行的pragma
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous = NORMAL',      # WAL模式下NORMAL已足够安全，避免每次提交fsync
+    'PRAGMA busy_timeout = 5000',       # 写锁竞争时等待而不是立即报错
+    'PRAGMA cache_size = -16000',       # 约16MB页缓存
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA mmap_size = 268435456',     # 256MB内存映射读取
+)
+
+# 去重后的评分文本，按内容哈希寻址
+TEXTS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS rating_texts (
+    id INTEGER PRIMARY KEY,
+    hash BLOB NOT NULL UNIQUE,
+    codec TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    body BLOB NOT NULL
+)
+'''
+
+RATINGS_TABLE = '''
+CREATE TABLE IF NOT EXISTS {table} (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    source_text_id INTEGER REFERENCES rating_texts (id),
+    translated_text_id INTEGER REFERENCES rating_texts (id),
+    source_language TEXT,
+    target_language TEXT,
+    model_id TEXT,
+    rating INTEGER,
+    timestamp DATETIME
+)
+'''
+
+SCHEMA = (
+    RATINGS_TABLE.format(table='ratings'),
+    # 统计改为读取小时汇总表，原始表只按主键扫描（归档、导出），旧版本的二级索引只会拖慢写入
+    'DROP INDEX IF EXISTS idx_ratings_timestamp',
+    'DROP INDEX IF EXISTS idx_ratings_model',
+    'DROP INDEX IF EXISTS idx_ratings_language_pair',
+    '''
+    CREATE TABLE IF NOT EXISTS rating_rollup_hourly (
+        hour TEXT NOT NULL,
+        model_id TEXT NOT NULL,
+        source_language TEXT NOT NULL,
+        target_language TEXT NOT NULL,
+        rating INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        rating_sum INTEGER NOT NULL,
+        PRIMARY KEY (hour, model_id, source_language, target_language, rating)
+    ) WITHOUT ROWID
+    ''',
+    # 写入版本号：每次写入评分时递增，用于统计缓存失效和ETag
+    '''
+    CREATE TABLE IF NOT EXISTS ratings_meta (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    ''',
+    "INSERT OR IGNORE INTO ratings_meta (key, value) VALUES ('data_version', 0)",
+)
+
+ROLLUP_HOUR_FORMAT = '%Y-%m-%d %H:00:00'
+
+ROLLUP_UPSERT = '''
+INSERT INTO rating_rollup_hourly (hour, model_id, source_language, target_language, rating, count, rating_sum)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (hour, model_id, source_language, target_language, rating)
+DO UPDATE SET count = count + excluded.count, rating_sum = rating_sum + excluded.rating_sum
+'''
+
+BUMP_DATA_VERSION = "UPDATE ratings_meta SET value = value + 1 WHERE key = 'data_version'"
+
+# 从原始评分表重建汇总（用于已有数据的首次迁移）
+ROLLUP_BACKFILL = '''
+INSERT INTO rating_rollup_hourly (hour, model_id, source_language, target_language, rating, count, rating_sum)
+SELECT
+    strftime('%Y-%m-%d %H:00:00', timestamp),
+    COALESCE(model_id, ''),
+    COALESCE(source_language, ''),
+    COALESCE(target_language, ''),
+    rating,
+    COUNT(*),
+    SUM(rating)
+FROM ratings
+WHERE timestamp IS NOT NULL AND rating IS NOT NULL
+GROUP BY 1, 2, 3, 4, 5
+'''
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# 超过该字节数的文本才尝试压缩
+COMPRESS_MIN_BYTES = 256
+TEXT_CODECS = ('zlib', 'zstd', 'none')
+
+
+def encode_text(text: str, codec: str = 'zlib'):
+    """Encode a text body, returning (codec, body); compression is kept only if it saves space"""
+    data = text.encode('utf-8')
+    if codec != 'none' and len(data) >= COMPRESS_MIN_BYTES:
+        if codec == 'zstd' and zstandard is not None:
+            compressed = zstandard.ZstdCompressor(level=6).compress(data)
+        else:
+            codec = 'zlib'
+            compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            return codec, compressed
+    return 'raw', data
+
+
+def decode_text(codec: str, body: bytes) -> str:
+    """Decode a text body stored by encode_text"""
+    if codec == 'zlib':
+        body = zlib.decompress(body)
+    elif codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('The zstandard package is required to read zstd-compressed rating texts')
+        body = zstandard.ZstdDecompressor().decompress(body)
+    return bytes(body).decode('utf-8')
+
+
+def text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode('utf-8')).digest()
+
+
+def format_timestamp(value: Optional[datetime] = None) -> str:
+    """Format a datetime the way the ratings table stores it"""
+    return (value or datetime.now()).strftime(TIMESTAMP_FORMAT)
+
+
+class RatingsStore:
+    """Thread-safe access to the ratings database with per-thread connections"""
+
+    def __init__(self, db_path: str, text_codec: str = 'zlib'):
+        self.db_path = db_path
+        if text_codec not in TEXT_CODECS:
+            raise ValueError(f"Unknown text codec {text_codec}, expected one of {TEXT_CODECS}")
+        if text_codec == 'zstd' and zstandard is None:
+            logger.warning("zstandard is not installed, compressing rating texts with zlib instead")
+            text_codec = 'zlib'
+        self.text_codec = text_codec
+        self._local = threading.local()
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+
+    def connection(self) -> sqlite3.Connection:
+        """Return this thread's connection, creating the schema on first use"""
+        conn = self._thread_connection()
+        if not self._schema_ready:
+            self.init_schema()
+        return conn
+
+    def _thread_connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute('PRAGMA journal_mode = WAL')
+            for pragma in CONNECTION_PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+        return conn
+
+    def init_schema(self):
+        """Create (or migrate) the ratings tables"""
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            conn = self._thread_connection()
+            with conn:
+                conn.execute(TEXTS_SCHEMA)
+            self._migrate_inline_texts(conn)
+            with conn:
+                for statement in SCHEMA:
+                    conn.execute(statement)
+                self._backfill_rollups(conn)
+            # 更新查询规划器的统计信息
+            conn.execute('PRAGMA optimize')
+            self._schema_ready = True
+        logger.info(f"Initialized ratings database at {self.db_path} (WAL mode)")
+
+    def _migrate_inline_texts(self, conn: sqlite3.Connection, chunk_size: int = 5000):
+        """Move texts stored inline in old ratings rows into rating_texts"""
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(ratings)')}
+        if 'source_text' not in columns:
+            return
+
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # 其他进程可能已完成迁移
+            columns = {row['name'] for row in conn.execute('PRAGMA table_info(ratings)')}
+            if 'source_text' not in columns:
+                conn.rollback()
+                return
+
+            logger.info("Migrating rating texts into the content-addressed text table")
+            conn.execute('CREATE TEMP TABLE rating_text_map (rating_id INTEGER PRIMARY KEY, source_text_id INTEGER, translated_text_id INTEGER)')
+            last_id = 0
+            migrated = 0
+            while True:
+                rows = conn.execute(
+                    'SELECT id, source_text, translated_text FROM ratings WHERE id > ? ORDER BY id LIMIT ?',
+                    (last_id, chunk_size)).fetchall()
+                if not rows:
+                    break
+                ids = self._intern_texts(conn, [row['source_text'] for row in rows] +
+                                         [row['translated_text'] for row in rows])
+                conn.executemany('INSERT INTO rating_text_map VALUES (?, ?, ?)', [
+                    (row['id'], ids.get(row['source_text']), ids.get(row['translated_text'])) for row in rows
+                ])
+                last_id = rows[-1]['id']
+                migrated += len(rows)
+
+            conn.execute(RATINGS_TABLE.format(table='ratings_migrated'))
+            conn.execute('''
+            INSERT INTO ratings_migrated (id, source_text_id, translated_text_id, source_language, target_language, model_id, rating, timestamp)
+            SELECT r.id, m.source_text_id, m.translated_text_id, r.source_language, r.target_language, r.model_id, r.rating, r.timestamp
+            FROM ratings r JOIN rating_text_map m ON m.rating_id = r.id
+            ''')
+            conn.execute('DROP TABLE ratings')
+            conn.execute('ALTER TABLE ratings_migrated RENAME TO ratings')
+            conn.execute('DROP TABLE rating_text_map')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        # 回收旧文本占用的空间
+        conn.execute('VACUUM')
+        logger.info(f"Migrated texts of {migrated} ratings")
+
+    def _intern_texts(self, conn: sqlite3.Connection, texts: Iterable[Optional[str]]) -> Dict[str, int]:
+        """Store each distinct text once and return a text -> rating_texts.id mapping"""
+        hashes = {text: text_hash(text) for text in texts if text is not None}
+        if not hashes:
+            return {}
+
+        ids_by_hash = self._lookup_text_ids(conn, list(set(hashes.values())))
+        missing = {h: text for text, h in hashes.items() if h not in ids_by_hash}
+        if missing:
+            rows = []
+            for h, text in missing.items():
+                codec, body = encode_text(text, self.text_codec)
+                rows.append((h, codec, len(text), body))
+            conn.executemany('INSERT OR IGNORE INTO rating_texts (hash, codec, length, body) VALUES (?, ?, ?, ?)', rows)
+            ids_by_hash.update(self._lookup_text_ids(conn, list(missing)))
+        return {text: ids_by_hash[h] for text, h in hashes.items()}
+
+    @staticmethod
+    def _lookup_text_ids(conn: sqlite3.Connection, hashes: List[bytes]) -> Dict[bytes, int]:
+        found = {}
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for row in conn.execute(f'SELECT id, hash FROM rating_texts WHERE hash IN ({placeholders})', chunk):
+                found[bytes(row['hash'])] = row['id']
+        return found
+
+    def get_texts(self, text_ids: Iterable[int]) -> Dict[int, str]:
+        """Load and decompress texts by ID"""
+        ids = [text_id for text_id in set(text_ids) if text_id is not None]
+        conn = self.connection()
+        texts = {}
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            placeholders = ','.join('?' * len(chunk))
+            for row in conn.execute(f'SELECT id, codec, body FROM rating_texts WHERE id IN ({placeholders})', chunk):
+                texts[row['id']] = decode_text(row['codec'], row['body'])
+        return texts
+
+    def iter_ratings(self, before: Optional[datetime] = None, batch_size: int = 5000) -> Iterator[List[Dict[str, Any]]]:
+        """Yield batches of ratings with their texts resolved, oldest first"""
+        conn = self.connection()
+        before_value = format_timestamp(before) if before else None
+        last_id = 0
+        while True:
+            rows = conn.execute('''
+            SELECT id, source_text_id, translated_text_id, source_language, target_language, model_id, rating, timestamp
+            FROM ratings
+            WHERE id > ? AND (? IS NULL OR timestamp < ?)
+            ORDER BY id
+            LIMIT ?
+            ''', (last_id, before_value, before_value, batch_size)).fetchall()
+            if not rows:
+                return
+            texts = self.get_texts([row['source_text_id'] for row in rows] +
+                                   [row['translated_text_id'] for row in rows])
+            batch = []
+            for row in rows:
+                item = dict(row)
+                item['source_text'] = texts.get(item.pop('source_text_id'))
+                item['translated_text'] = texts.get(item.pop('translated_text_id'))
+                batch.append(item)
+            yield batch
+            last_id = rows[-1]['id']
+
+    def delete_ratings(self, rating_ids: List[int]):
+        """Delete raw ratings by ID; the hourly rollups are kept"""
+        conn = self.connection()
+        with conn:
+            conn.executemany('DELETE FROM ratings WHERE id = ?', [(rating_id,) for rating_id in rating_ids])
+
+    def delete_orphan_texts(self) -> int:
+        """Remove texts that are no longer referenced by any rating"""
+        conn = self.connection()
+        with conn:
+            cursor = conn.execute('''
+            DELETE FROM rating_texts
+            WHERE id NOT IN (
+                SELECT source_text_id FROM ratings WHERE source_text_id IS NOT NULL
+                UNION
+                SELECT translated_text_id FROM ratings WHERE translated_text_id IS NOT NULL
+            )
+            ''')
+        return cursor.rowcount
+
+    def _backfill_rollups(self, conn: sqlite3.Connection):
+        """Populate the rollup table from raw ratings if it has never been filled"""
+        has_rollups = conn.execute('SELECT EXISTS (SELECT 1 FROM rating_rollup_hourly)').fetchone()[0]
+        has_ratings = conn.execute('SELECT EXISTS (SELECT 1 FROM ratings)').fetchone()[0]
+        if has_ratings and not has_rollups:
+            conn.execute(ROLLUP_BACKFILL)
+            conn.execute(BUMP_DATA_VERSION)
+            logger.info("Backfilled hourly rating rollups from existing ratings")
+
+    def close(self):
+        """Close this thread's connection"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def add_rating(self, source_text: str, translated_text: str, source_language: str,
+                   target_language: str, model_id: str, rating: int,
+                   timestamp: Optional[datetime] = None):
+        """Insert a single rating and update the hourly rollup in the same transaction"""
+        self.add_ratings([{
+            'source_text': source_text,
+            'translated_text': translated_text,
+            'source_language': source_language,
+            'target_language': target_language,
+            'model_id': model_id,
+            'rating': rating,
+            'timestamp': timestamp,
+        }])
+
+    def add_ratings(self, rows: List[Dict[str, Any]]) -> int:
+        """Insert many ratings with executemany in one transaction, updating the rollups once"""
+        if not rows:
+            return 0
+        inserts = []
+        rollup_deltas = Counter()
+        for row in rows:
+            timestamp = row.get('timestamp') or datetime.now()
+            rating = row['rating']
+            inserts.append((row.get('source_text'), row.get('translated_text'), row.get('source_language'),
+                            row.get('target_language'), row.get('model_id'), rating, format_timestamp(timestamp)))
+            rollup_deltas[(timestamp.strftime(ROLLUP_HOUR_FORMAT), row.get('model_id') or '',
+                           row.get('source_language') or '', row.get('target_language') or '', rating)] += 1
+
+        conn = self.connection()
+        with conn:
+            text_ids = self._intern_texts(conn, [row[0] for row in inserts] + [row[1] for row in inserts])
+            inserts = [(text_ids.get(row[0]), text_ids.get(row[1])) + row[2:] for row in inserts]
+            conn.executemany('''
+            INSERT INTO ratings (source_text_id, translated_text_id, source_language, target_language, model_id, rating, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', inserts)
+            conn.executemany(ROLLUP_UPSERT, [key + (count, key[4] * count) for key, count in rollup_deltas.items()])
+            conn.execute(BUMP_DATA_VERSION)
+        return len(inserts)
+
+    def data_version(self) -> int:
+        """Return a counter that changes whenever ratings are written, from any process"""
+        row = self.connection().execute("SELECT value FROM ratings_meta WHERE key = 'data_version'").fetchone()
+        return row['value'] if row else 0
+
+    def has_ratings(self) -> bool:
+        """Check whether any rating has been recorded"""
+        row = self.connection().execute(
+            'SELECT EXISTS (SELECT 1 FROM rating_rollup_hourly) AS has_rows').fetchone()
+        return bool(row['has_rows'])
+
+    def get_stats(self, since: datetime, granularity: str = 'day') -> Dict[str, List[Dict[str, Any]]]:
+        """Aggregate ratings from the hourly rollups, starting at the hour containing `since`"""
+        since_hour = since.strftime(ROLLUP_HOUR_FORMAT)
+        period_expr = 'hour' if granularity == 'hour' else 'substr(hour, 1, 10)'
+        conn = self.connection()
+        conn.execute('BEGIN')
+        try:
+            time_series = conn.execute(f'''
+            SELECT
+                {period_expr} as time_period,
+                CAST(SUM(rating_sum) AS REAL) / SUM(count) as avg_rating,
+                SUM(count) as count
+            FROM rating_rollup_hourly
+            WHERE hour >= ?
+            GROUP BY time_period
+            ORDER BY time_period
+            ''', (since_hour,)).fetchall()
+
+            rating_distribution = conn.execute('''
+            SELECT
+                rating,
+                SUM(count) as count
+            FROM rating_rollup_hourly
+            WHERE hour >= ?
+            GROUP BY rating
+            ORDER BY rating
+            ''', (since_hour,)).fetchall()
+
+            language_pairs = conn.execute('''
+            SELECT
+                source_language || ' -> ' || target_language as language_pair,
+                CAST(SUM(rating_sum) AS REAL) / SUM(count) as avg_rating,
+                SUM(count) as count
+            FROM rating_rollup_hourly
+            WHERE hour >= ?
+            GROUP BY language_pair
+            ORDER BY avg_rating DESC
+            ''', (since_hour,)).fetchall()
+
+            models = conn.execute('''
+            SELECT
+                model_id,
+                CAST(SUM(rating_sum) AS REAL) / SUM(count) as avg_rating,
+                SUM(count) as count
+            FROM rating_rollup_hourly
+            WHERE hour >= ?
+            GROUP BY model_id
+            ORDER BY avg_rating DESC
+            ''', (since_hour,)).fetchall()
+        finally:
+            conn.execute('COMMIT')
+
+        return {
+            'time_series': [dict(row) for row in time_series],
+            'rating_distribution': [dict(row) for row in rating_distribution],
+            'language_pairs': [dict(row) for row in language_pairs],
+            'models': [dict(row) for row in models],
+        }
+
+    def model_quality(self, since: datetime, source_language: Optional[str] = None,
+                      target_language: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """Average rating and count per model from the hourly rollups, optionally for one language pair"""
+        query = '''
+        SELECT model_id, CAST(SUM(rating_sum) AS REAL) / SUM(count) as avg_rating, SUM(count) as count
+        FROM rating_rollup_hourly
+        WHERE hour >= ?'''
+        params = [since.strftime(ROLLUP_HOUR_FORMAT)]
+        if source_language is not None and target_language is not None:
+            query += ' AND source_language = ? AND target_language = ?'
+            params += [source_language, target_language]
+        query += ' GROUP BY model_id'
+        rows = self.connection().execute(query, params).fetchall()
+        return {row['model_id']: {'avg_rating': row['avg_rating'], 'count': row['count']}
+                for row in rows if row['model_id']}
+
+
+class RatingWriteBehindQueue:
+    """Buffer single ratings in memory and write them in batches from a background thread
+
+    A batch is written when `batch_size` ratings are pending or `flush_interval`
+    seconds have passed, so request threads never wait for a disk sync.
+    """
+
+    def __init__(self, store: RatingsStore, batch_size: int = 500, flush_interval: float = 0.5,
+                 max_pending: int = 100000, max_retries: int = 3,
+                 on_flush: Optional[Callable[[int], None]] = None):
+        self.store = store
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.on_flush = on_flush
+        self._buffer: List[Dict[str, Any]] = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._failures = 0
+        self._stopping = False
+        self._thread = None
+
+    def start(self):
+        """Start the background writer thread if it is not running"""
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='ratings-writer', daemon=True)
+            self._thread.start()
+
+    def submit(self, row: Dict[str, Any]) -> bool:
+        """Queue a rating; returns False when the queue is full and the caller should write directly"""
+        self.start()
+        with self._cond:
+            if len(self._buffer) >= self.max_pending:
+                return False
+            # 以提交时间为准（parse_rating总是设置timestamp键，可能为None），刷新或重试时不再改变
+            if row.get('timestamp') is None:
+                row['timestamp'] = datetime.now()
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def flush(self) -> int:
+        """Write everything that is pending, blocking until it is committed"""
+        with self._write_lock:
+            with self._cond:
+                batch, self._buffer = self._buffer, []
+            return self._write(batch)
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the writer thread after flushing pending ratings"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._stopping or len(self._buffer) >= self.batch_size,
+                                    timeout=self.flush_interval)
+                if self._stopping:
+                    return
+            with self._write_lock:
+                with self._cond:
+                    batch = self._buffer[:self.batch_size]
+                    del self._buffer[:self.batch_size]
+                self._write(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> int:
+        if not batch:
+            return 0
+        try:
+            written = self.store.add_ratings(batch)
+        except Exception as e:
+            self._failures += 1
+            if self._failures > self.max_retries:
+                logger.error(f"Dropping {len(batch)} queued ratings after {self._failures} failed writes: {e}")
+                self._failures = 0
+            else:
+                logger.warning(f"Failed to write {len(batch)} queued ratings, will retry: {e}")
+                with self._cond:
+                    self._buffer[:0] = batch
+            return 0
+        self._failures = 0
+        if self.on_flush is not None:
+            self.on_flush(written)
+        return written
@@ -0,0 +1,100 @@
+"""
+AWS Bedrock Translation Web Application - Result Store
+
+Translation results shown after the /translate form redirect are kept on
+the server; the cookie session only carries a short, unguessable result ID.
+This keeps request and response sizes small and lets long documents go
+through the form flow without overflowing the ~4 KB cookie limit.
+
+Two stores are available:
+    MemoryResultStore   per-process LRU with TTL and a size budget
+    SharedResultStore   the shared state backend (SQLite on disk or Redis),
+                        needed when several workers serve the same users
+"""
+
+import json
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from shared_state import StateBackend
+
+
+def new_result_id() -> str:
+    return secrets.token_urlsafe(12)
+
+
+class MemoryResultStore:
+    """LRU + TTL result store bounded by item count and total size"""
+
+    def __init__(self, max_items: int = 1000, max_bytes: int = 64 * 1024 * 1024, ttl_seconds: float = 3600):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        # result_id -> (expires_at, size, value)
+        self._items: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float):
+        # 先清理过期项，再按LRU顺序淘汰直到满足容量限制
+        for result_id in [key for key, item in self._items.items() if item[0] < now]:
+            self._bytes -= self._items.pop(result_id)[1]
+        while self._items and (len(self._items) > self.max_items or self._bytes > self.max_bytes):
+            self._bytes -= self._items.popitem(last=False)[1][1]
+
+    def put(self, value: Dict[str, Any]) -> str:
+        result_id = new_result_id()
+        size = len(json.dumps(value, ensure_ascii=False).encode('utf-8'))
+        now = time.time()
+        with self._lock:
+            self._items[result_id] = (now + self.ttl_seconds, size, value)
+            self._bytes += size
+            self._evict(now)
+        return result_id
+
+    def get(self, result_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not result_id:
+            return None
+        with self._lock:
+            item = self._items.get(result_id)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                self._bytes -= self._items.pop(result_id)[1]
+                return None
+            self._items.move_to_end(result_id)
+            return item[2]
+
+    def delete(self, result_id: str):
+        with self._lock:
+            item = self._items.pop(result_id, None)
+            if item is not None:
+                self._bytes -= item[1]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'items': len(self._items), 'bytes': self._bytes}
+
+
+class SharedResultStore:
+    """Result store on the shared state backend, readable by every worker"""
+
+    def __init__(self, backend: StateBackend, ttl_seconds: float = 3600):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+
+    def put(self, value: Dict[str, Any]) -> str:
+        result_id = new_result_id()
+        self.backend.set(f'result:{result_id}', value, ttl=self.ttl_seconds)
+        return result_id
+
+    def get(self, result_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not result_id:
+            return None
+        return self.backend.get(f'result:{result_id}')
+
+    def delete(self, result_id: str):
+        self.backend.delete(f'result:{result_id}')
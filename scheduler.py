@@ -0,0 +1,184 @@
+"""
+AWS Bedrock Translation Web Application - Request Scheduler
+
+Every Bedrock translation call goes through one scheduler that owns the
+call slots (maximum concurrency) and the account-wide rate limit:
+
+    - priority classes: queued interactive calls (/translate, /api/translate)
+      are always dispatched before batch calls
+    - weighted fair queuing within a class: each flow (a batch job, or an
+      interactive client) gets its weighted share, so one large job cannot
+      starve the others (start-time fair queuing)
+    - admission control: new work is rejected with SchedulerBusy when the
+      queue of its class is already deep
+
+The class and flow of a call come from a context variable set by the
+request handler (set_traffic) and are carried into worker threads with
+the rest of the context (trace ID, ...).
+"""
+
+import contextvars
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger("BedrockTranslationApp")
+
+SCHEDULER_QUEUE = REGISTRY.gauge(
+    'translator_scheduler_queue_depth', 'Bedrock calls waiting in the scheduler', ('priority',))
+SCHEDULER_WAIT = REGISTRY.histogram(
+    'translator_scheduler_wait_seconds', 'Time Bedrock calls waited in the scheduler', ('priority',))
+SCHEDULER_REJECTED = REGISTRY.counter(
+    'translator_scheduler_rejected_total', 'Work rejected by scheduler admission control', ('priority',))
+
+# 优先级类别，数值越小越先调度
+PRIORITIES = {'interactive': 0, 'batch': 1}
+
+# (优先级类别, 流标识, 权重)
+_traffic: contextvars.ContextVar = contextvars.ContextVar('translator_traffic', default=('batch', 'default', 1.0))
+
+
+def set_traffic(priority: str, flow: str, weight: float = 1.0):
+    """Declare the priority class and flow of the calls made from the current context"""
+    if priority not in PRIORITIES:
+        raise ValueError(f'Unknown priority class {priority}')
+    return _traffic.set((priority, flow, weight))
+
+
+def current_traffic() -> Tuple[str, str, float]:
+    return _traffic.get()
+
+
+class SchedulerBusy(RuntimeError):
+    """Admission control rejected the work; retry after `retry_after` seconds"""
+
+    def __init__(self, priority: str, retry_after: int = 5):
+        super().__init__(f'Translation service is busy ({priority} queue is full), please retry in {retry_after}s')
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class RequestScheduler:
+    """Priority + weighted fair queuing executor for Bedrock calls"""
+
+    def __init__(self, max_concurrency: int = 16, rate_limiter=None, max_queue: Optional[Dict[str, int]] = None,
+                 backlog: Optional[Callable[[], int]] = None, max_backlog: int = 0):
+        self.max_concurrency = max_concurrency
+        self.rate_limiter = rate_limiter
+        self.max_queue = dict(max_queue or {})
+        # 批量任务准入：已提交但未完成的批量调用数（例如翻译引擎的积压）
+        self.backlog = backlog
+        self.max_backlog = max_backlog
+        self._heap = []
+        self._seq = itertools.count()
+        self._virtual_time = {priority: 0.0 for priority in PRIORITIES}
+        # (类别, 流) -> [上一个任务的结束标记, 排队中的任务数]
+        self._flows: Dict[Tuple[str, str], list] = {}
+        self._queued = {priority: 0 for priority in PRIORITIES}
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._workers = []
+        self._shutdown = False
+        for priority in PRIORITIES:
+            SCHEDULER_QUEUE.set_function(lambda priority=priority: self._queued[priority], priority=priority)
+
+    def _start_workers(self):
+        while len(self._workers) < self.max_concurrency:
+            worker = threading.Thread(target=self._worker, name=f'bedrock-call-{len(self._workers)}', daemon=True)
+            self._workers.append(worker)
+            worker.start()
+
+    def admit(self, priority: str = 'batch'):
+        """Admission check for a new job or call of this class; raises SchedulerBusy when overloaded"""
+        limit = self.max_queue.get(priority)
+        if limit and self._queued[priority] >= limit:
+            SCHEDULER_REJECTED.inc(priority=priority)
+            raise SchedulerBusy(priority, retry_after=2 if priority == 'interactive' else 30)
+        if priority == 'batch' and self.backlog is not None and self.max_backlog and self.backlog() >= self.max_backlog:
+            SCHEDULER_REJECTED.inc(priority=priority)
+            raise SchedulerBusy(priority, retry_after=60)
+
+    def submit(self, fn: Callable, *args, cost: float = 1.0) -> Future:
+        """Queue a call under the current context's priority class and flow"""
+        priority, flow, weight = _traffic.get()
+        if priority == 'interactive':
+            self.admit(priority)
+        future = Future()
+        context = contextvars.copy_context()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError('Scheduler is shut down')
+            self._start_workers()
+            state = self._flows.setdefault((priority, flow), [0.0, 0])
+            # 开始标记 = max(虚拟时间, 本流上一个任务的结束标记)
+            start = max(self._virtual_time[priority], state[0])
+            state[0] = start + cost / max(weight, 0.001)
+            state[1] += 1
+            self._queued[priority] += 1
+            heapq.heappush(self._heap, (PRIORITIES[priority], start, next(self._seq),
+                                        (priority, flow, time.perf_counter(), future, context, fn, args)))
+            self._cond.notify()
+        return future
+
+    def call(self, fn: Callable, *args):
+        """Run a call through the scheduler and wait for it (directly when already on a scheduler worker)"""
+        if getattr(self._local, 'worker', False):
+            return fn(*args)
+        return self.submit(fn, *args).result()
+
+    def _next_task(self):
+        with self._cond:
+            while True:
+                if self._shutdown:
+                    return None
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                # 令牌分配给队首任务，保证限速时仍按优先级和公平顺序调度
+                wait = self.rate_limiter.try_acquire() if self.rate_limiter is not None else 0
+                if wait:
+                    self._cond.wait(wait)
+                    continue
+                _, start, _, task = heapq.heappop(self._heap)
+                priority, flow = task[0], task[1]
+                self._virtual_time[priority] = start
+                self._queued[priority] -= 1
+                state = self._flows[(priority, flow)]
+                state[1] -= 1
+                if not state[1]:
+                    # 空闲的流不保留额度
+                    del self._flows[(priority, flow)]
+                return task
+
+    def _worker(self):
+        self._local.worker = True
+        while True:
+            task = self._next_task()
+            if task is None:
+                return
+            priority, flow, queued_at, future, context, fn, args = task
+            SCHEDULER_WAIT.observe(time.perf_counter() - queued_at, priority=priority)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(context.run(fn, *args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def stats(self) -> Dict:
+        with self._cond:
+            return {'queued': dict(self._queued), 'flows': len(self._flows), 'workers': len(self._workers)}
+
+    def shutdown(self, wait: bool = False):
+        with self._cond:
+            self._shutdown = True
+            self._cond.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
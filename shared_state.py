@@ -0,0 +1,284 @@
+"""
+AWS Bedrock Translation Web Application - Shared State
+
+State that every worker process must agree on: the Bedrock connection
+settings, the active model list and probe results, and batch job
+progress. Each worker keeps its own boto3 client and rebuilds it when the
+shared connection settings change.
+
+Backends (selected with STATE_BACKEND_URL):
+    sqlite:///path/to/shared_state.db   one host, any number of workers (default)
+    redis://host:6379/0                 several hosts (requires the redis package)
+    memory://                           single process only
+
+Values are JSON documents. Every key carries a version that is bumped on
+each write, so workers can detect changes with one cheap read.
+"""
+
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Optional
+
+try:
+    import redis
+except ImportError:  # Redis后端为可选
+    redis = None
+
+logger = logging.getLogger("BedrockTranslationApp")
+
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS shared_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    expires_at REAL
+)
+'''
+SQLITE_UPSERT = '''
+INSERT INTO shared_state (key, value, version, expires_at) VALUES (?, ?, 1, ?)
+ON CONFLICT(key) DO UPDATE SET
+    value = excluded.value,
+    version = shared_state.version + 1,
+    expires_at = excluded.expires_at
+RETURNING version
+'''
+# 每写入多少次清理一次过期的键
+PURGE_EVERY = 200
+
+
+class StateBackend:
+    """Interface of a shared state backend"""
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> int:
+        """Store a value and return its new version"""
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def versions(self, keys: Iterable[str]) -> Dict[str, int]:
+        """Current version of each existing key"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryStateBackend(StateBackend):
+    """In-process backend for a single worker"""
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key):
+        item = self._data.get(key)
+        if item is not None and item[2] is not None and item[2] < time.time():
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self._lock:
+            item = self._live(key)
+        return json.loads(item[0]) if item else None
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            item = self._live(key)
+            version = item[1] + 1 if item else 1
+            self._data[key] = (json.dumps(value), version, time.time() + ttl if ttl else None)
+            return version
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def versions(self, keys):
+        with self._lock:
+            return {key: item[1] for key in keys for item in [self._live(key)] if item}
+
+
+class SQLiteStateBackend(StateBackend):
+    """Backend on a local SQLite file in WAL mode, shared by all workers on the host"""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._writes = 0
+        self._init_lock = threading.Lock()
+        self._ready = False
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = NORMAL')
+            self._local.conn = conn
+        if not self._ready:
+            with self._init_lock:
+                if not self._ready:
+                    conn.execute(SQLITE_SCHEMA)
+                    # 任务进度和翻译结果可能包含用户文本，只允许当前用户读取
+                    try:
+                        os.chmod(self.db_path, 0o600)
+                    except OSError:
+                        pass
+                    self._ready = True
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            'SELECT value, expires_at FROM shared_state WHERE key = ?', (key,)).fetchone()
+        if row is None or (row[1] is not None and row[1] < time.time()):
+            return None
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        conn = self._connection()
+        expires_at = time.time() + ttl if ttl else None
+        version = conn.execute(SQLITE_UPSERT, (key, json.dumps(value, ensure_ascii=False), expires_at)).fetchone()[0]
+        self._writes += 1
+        if self._writes % PURGE_EVERY == 0:
+            conn.execute('DELETE FROM shared_state WHERE expires_at IS NOT NULL AND expires_at < ?', (time.time(),))
+        return version
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM shared_state WHERE key = ?', (key,))
+
+    def versions(self, keys):
+        keys = list(keys)
+        placeholders = ','.join('?' * len(keys))
+        rows = self._connection().execute(
+            f'SELECT key, version FROM shared_state WHERE key IN ({placeholders})', keys).fetchall()
+        return dict(rows)
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+class RedisStateBackend(StateBackend):
+    """Backend on Redis, shared by workers on several hosts"""
+
+    def __init__(self, url: str, prefix: str = 'translator:'):
+        if redis is None:
+            raise RuntimeError('The redis package is required for a redis:// state backend. Install it with: pip install redis')
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.hget(self.prefix + key, 'value')
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl=None):
+        name = self.prefix + key
+        pipe = self.client.pipeline()
+        pipe.hset(name, 'value', json.dumps(value, ensure_ascii=False))
+        pipe.hincrby(name, 'version', 1)
+        if ttl:
+            pipe.expire(name, int(ttl))
+        else:
+            pipe.persist(name)
+        return pipe.execute()[1]
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def versions(self, keys):
+        keys = list(keys)
+        pipe = self.client.pipeline()
+        for key in keys:
+            pipe.hget(self.prefix + key, 'version')
+        return {key: int(version) for key, version in zip(keys, pipe.execute()) if version is not None}
+
+
+def create_state_backend(url: str) -> StateBackend:
+    """Create a backend from a URL (sqlite:///path, redis://..., memory://)"""
+    if url.startswith('memory://'):
+        return MemoryStateBackend()
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisStateBackend(url)
+    if url.startswith('sqlite:///'):
+        # sqlite:///relative/path 或 sqlite:////absolute/path
+        url = url[len('sqlite:///'):]
+    return SQLiteStateBackend(url)
+
+
+# 客户端生成的任务ID格式
+_JOB_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+class JobTracker:
+    """Batch job status and progress, readable from any worker
+
+    The worker running a job owns its record and writes the whole document
+    on every update, so updates need no read-modify-write.
+    """
+
+    def __init__(self, backend: StateBackend, ttl_seconds: float = 24 * 3600):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self._local_jobs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_job_id(requested: Optional[str] = None) -> str:
+        """Use a client-supplied job ID when it is well-formed, otherwise generate one"""
+        if requested and _JOB_ID_PATTERN.match(requested):
+            return requested
+        return uuid.uuid4().hex
+
+    def start(self, job_id: str, **fields) -> Dict:
+        job = {'job_id': job_id, 'status': 'running', 'total': 0, 'completed': 0, 'percent': 0,
+               'started_at': time.time(), 'updated_at': time.time()}
+        job.update(fields)
+        with self._lock:
+            self._local_jobs[job_id] = job
+        self.backend.set(f'job:{job_id}', job, ttl=self.ttl_seconds)
+        self.backend.set('job:latest', job_id, ttl=self.ttl_seconds)
+        return job
+
+    def update(self, job_id: str, **fields) -> Dict:
+        with self._lock:
+            job = self._local_jobs.setdefault(job_id, {'job_id': job_id})
+            job.update(fields, updated_at=time.time())
+            if job.get('total'):
+                job['percent'] = int(job.get('completed', 0) / job['total'] * 100)
+            snapshot = dict(job)
+            if job.get('status') in ('completed', 'failed'):
+                del self._local_jobs[job_id]
+        self.backend.set(f'job:{job_id}', snapshot, ttl=self.ttl_seconds)
+        return snapshot
+
+    def finish(self, job_id: str, status: str = 'completed', **fields) -> Dict:
+        return self.update(job_id, status=status, finished_at=time.time(), **fields)
+
+    def get(self, job_id: Optional[str] = None) -> Optional[Dict]:
+        """A job by ID, or the most recently started job"""
+        if not job_id:
+            job_id = self.backend.get('job:latest')
+            if not job_id:
+                return None
+        with self._lock:
+            job = self._local_jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self.backend.get(f'job:{job_id}')
+
+    def remaining(self) -> int:
+        """Items still to be processed by jobs running in this worker"""
+        with self._lock:
+            return sum(max(job.get('total', 0) - job.get('completed', 0), 0) for job in self._local_jobs.values())
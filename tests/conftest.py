@@ -0,0 +1,65 @@
+"""Shared fixtures: the app runs against temporary storage and a stubbed Bedrock client"""
+
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 导入app之前设置：不访问AWS，不写入仓库目录
+_TMP = tempfile.mkdtemp(prefix='translator-tests-')
+for key, value in {
+    'LOG_FILE': os.path.join(_TMP, 'app.log'),
+    'RATINGS_DB_PATH': os.path.join(_TMP, 'ratings.db'),
+    'GLOSSARY_DIR': os.path.join(_TMP, 'glossaries'),
+    'ARTIFACT_DIR': os.path.join(_TMP, 'artifacts'),
+    'RATINGS_ARCHIVE_DIR': os.path.join(_TMP, 'archive'),
+    'MODEL_CACHE_PATH': os.path.join(_TMP, 'model_cache.json'),
+    'STATE_BACKEND_URL': 'memory://',
+    'MODEL_DISCOVERY': '0',
+    'MODEL_PROBE': '0',
+    'PREFILTER': '0',
+}.items():
+    os.environ.setdefault(key, value)
+
+
+class StubBedrockClient:
+    """bedrock-runtime stand-in that echoes the input text"""
+
+    def __init__(self):
+        self.calls = []
+
+    def converse(self, modelId, messages, inferenceConfig=None, **kwargs):
+        text = messages[-1]['content'][0]['text']
+        self.calls.append(('converse', modelId, text))
+        return {'output': {'message': {'content': [{'text': f'T[{text}]'}]}},
+                'usage': {'inputTokens': 1, 'outputTokens': 1}}
+
+    def invoke_model(self, modelId, body, **kwargs):
+        request = json.loads(body)
+        text = request['messages'][-1]['content'] if 'messages' in request else request.get('prompt', '')
+        if isinstance(text, list):
+            text = text[0]['text']
+        self.calls.append(('invoke', modelId, text))
+
+        class Body:
+            def read(self):
+                return json.dumps({'content': [{'text': f'T[{text}]'}]}).encode()
+        return {'body': Body(), 'ResponseMetadata': {'HTTPHeaders': {}}}
+
+
+@pytest.fixture
+def app_module():
+    """The app module connected to a stub client with the configured model list"""
+    import app as app_module
+    previous = app_module.bedrock_client
+    app_module.bedrock_client = StubBedrockClient()
+    app_module.use_model_catalog(None, publish=False)
+    app_module.app.config['TESTING'] = True
+    # 之前的测试发布的共享状态不应替换这个客户端
+    app_module.synced_versions.update(app_module.shared_state.versions(app_module.SHARED_KEYS))
+    yield app_module
+    app_module.bedrock_client = previous
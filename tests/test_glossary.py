@@ -0,0 +1,45 @@
+"""Glossary matching"""
+
+from glossary import AhoCorasick, Glossary, GlossaryStore
+
+
+def test_automaton_reports_overlapping_terms():
+    matcher = AhoCorasick(['he', 'she', 'his', 'hers'])
+    found = {(start, end, matcher.terms[index]) for start, end, index in matcher.find('ushers')}
+    assert found == {(1, 4, 'she'), (2, 4, 'he'), (2, 6, 'hers')}
+
+
+def test_overlapping_terms_prefer_the_leftmost_longest():
+    glossary = Glossary({
+        'machine': '机器',
+        'machine learning': '机器学习',
+        'learning rate': '学习率',
+        'rate': '速率',
+    })
+    # "machine learning"覆盖了"learning rate"的开头，剩下的"rate"单独匹配
+    assert glossary.match('The Machine Learning rate is high') == [
+        ('machine learning', '机器学习'), ('rate', '速率')]
+    assert glossary.match('a machine') == [('machine', '机器')]
+
+
+def test_terms_match_whole_words_only_in_alphabetic_scripts():
+    glossary = Glossary({'cat': '猫', 'AI': '人工智能', '数据': 'data'})
+    assert glossary.match('concatenate the catalog') == []
+    assert glossary.match('Cat, cat and CAT.') == [('cat', '猫')]
+    assert glossary.match('使用AI处理数据') == [('AI', '人工智能'), ('数据', 'data')]
+
+
+def test_match_stops_at_max_terms():
+    glossary = Glossary({f'term{i}': f'T{i}' for i in range(10)})
+    text = ' '.join(f'term{i}' for i in range(10))
+    assert len(glossary.match(text, max_terms=3)) == 3
+
+
+def test_store_applies_only_matching_terms(tmp_path):
+    store = GlossaryStore(str(tmp_path))
+    store.save('English', 'Chinese', {'invoice': '发票', 'refund': '退款'})
+    prompt = store.apply('Translate.', 'Please send the invoice', 'English', 'Chinese')
+    assert '- invoice => 发票' in prompt and 'refund' not in prompt
+    assert store.apply('Translate.', 'Hello', 'English', 'Chinese') == 'Translate.'
+    assert store.delete('English', 'Chinese')
+    assert store.get('English', 'Chinese') is None
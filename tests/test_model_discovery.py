@@ -0,0 +1,96 @@
+"""Model discovery against a stubbed Bedrock control plane"""
+
+from model_discovery import ModelDiscovery, catalog_from_listing
+
+HAIKU = 'anthropic.claude-3-haiku-20240307-v1:0'
+NEW_MODEL = 'anthropic.claude-example-v1:0'
+RETIRED = 'anthropic.claude-v2:1'
+ACCOUNT_ARN = 'arn:aws:bedrock:us-east-1:123456789012:inference-profile/'
+
+
+def _model(model_id, inference_types, status='ACTIVE'):
+    return {'modelId': model_id, 'modelName': model_id.split('.')[1], 'providerName': 'Anthropic',
+            'inferenceTypesSupported': inference_types, 'modelLifecycle': {'status': status}}
+
+
+def _profile(profile_id, model_id):
+    return {'inferenceProfileId': profile_id, 'inferenceProfileArn': ACCOUNT_ARN + profile_id,
+            'inferenceProfileName': profile_id, 'type': 'SYSTEM_DEFINED', 'status': 'ACTIVE',
+            'models': [{'modelArn': f'arn:aws:bedrock:us-east-1::foundation-model/{model_id}'}]}
+
+
+class StubControlPlane:
+    """Two pages of models and of system-defined profiles, linked by nextToken"""
+
+    MODEL_PAGES = {
+        None: {'modelSummaries': [_model(HAIKU, ['ON_DEMAND'])], 'nextToken': 'm2'},
+        'm2': {'modelSummaries': [_model(NEW_MODEL, ['INFERENCE_PROFILE']),
+                                  _model(RETIRED, ['ON_DEMAND'], status='LEGACY')]},
+    }
+    PROFILE_PAGES = {
+        None: {'inferenceProfileSummaries': [_profile('us.' + HAIKU, HAIKU)], 'nextToken': 'p2'},
+        'p2': {'inferenceProfileSummaries': [_profile('us.' + NEW_MODEL, NEW_MODEL),
+                                             # 指向非文本模型的profile
+                                             _profile('us.stability.sd3-large-v1:0', 'stability.sd3-large-v1:0')]},
+    }
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+
+    def list_foundation_models(self, byOutputModality, nextToken=None):
+        self.calls.append(('models', nextToken))
+        if self.fail:
+            raise RuntimeError('AccessDeniedException')
+        return self.MODEL_PAGES[nextToken]
+
+    def list_inference_profiles(self, maxResults, typeEquals, nextToken=None):
+        self.calls.append((typeEquals, nextToken))
+        if typeEquals != 'SYSTEM_DEFINED':
+            return {'inferenceProfileSummaries': []}
+        return self.PROFILE_PAGES[nextToken]
+
+
+def test_discovery_catalog_cache_and_fallback(tmp_path):
+    cache_path = str(tmp_path / 'model_cache.json')
+    stub = StubControlPlane()
+    discovery = ModelDiscovery(cache_path)
+    results = discovery.refresh('key:test', ['us-east-1'], lambda region: stub)
+
+    # 所有分页都被读取
+    assert {('models', None), ('models', 'm2'), ('SYSTEM_DEFINED', None), ('SYSTEM_DEFINED', 'p2')} <= set(stub.calls)
+    listing = results['us-east-1']
+    assert [m['id'] for m in listing['foundation_models']] == [HAIKU, NEW_MODEL]
+
+    catalog = catalog_from_listing(listing)
+    assert HAIKU in catalog
+    assert catalog.display_name(HAIKU) == 'Claude 3 Haiku'
+    # 只能通过profile调用的模型不直接注册，但能找到对应的profile
+    assert NEW_MODEL not in catalog
+    assert catalog.requires_inference_profile(NEW_MODEL)
+    assert catalog.corresponding_profile(NEW_MODEL) == ACCOUNT_ARN + 'us.' + NEW_MODEL
+    assert ACCOUNT_ARN + 'us.' + HAIKU in catalog
+    assert ACCOUNT_ARN + 'us.stability.sd3-large-v1:0' not in catalog
+
+    # 新实例从磁盘缓存读取，TTL内为新鲜
+    reloaded = ModelDiscovery(cache_path)
+    assert reloaded.cached('key:test', 'us-east-1') == listing
+    assert reloaded.is_fresh('key:test', 'us-east-1')
+    assert reloaded.catalog('key:test', 'us-east-1').json == catalog.json
+    assert reloaded.cached('key:other', 'us-east-1') is None
+
+    # 过期后仍提供旧列表；刷新失败时保留旧条目
+    expired = ModelDiscovery(cache_path, ttl_seconds=0)
+    assert not expired.is_fresh('key:test', 'us-east-1')
+    assert expired.refresh('key:test', ['us-east-1'], lambda region: StubControlPlane(fail=True)) == {}
+    assert expired.cached('key:test', 'us-east-1') == listing
+    assert ModelDiscovery(cache_path).cached('key:test', 'us-east-1') == listing
+
+    def no_client(region):
+        raise RuntimeError('no credentials')
+    assert expired.refresh('key:test', ['us-east-1'], no_client) == {}
+    assert expired.catalog('key:test', 'us-east-1').json == catalog.json
+
+    # 没有缓存时没有发现的目录，应用使用配置中的模型
+    empty = ModelDiscovery(str(tmp_path / 'missing.json'))
+    assert empty.catalog('key:test', 'us-east-1') is None
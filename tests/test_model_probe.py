@@ -0,0 +1,42 @@
+"""Model probes"""
+
+import time
+
+from scheduler import current_traffic
+
+HAIKU = 'anthropic.claude-3-haiku-20240307-v1:0'
+
+
+class SlowFailingInvokeClient:
+    """invoke_model fails after a delay, converse answers at once"""
+
+    def __init__(self):
+        self.calls = []
+
+    def invoke_model(self, modelId, body, **kwargs):
+        self.calls.append(('invoke', modelId))
+        time.sleep(0.2)
+        raise RuntimeError('ValidationException')
+
+    def converse(self, modelId, messages, inferenceConfig=None, **kwargs):
+        self.calls.append(('converse', modelId))
+        return {'output': {'message': {'content': [{'text': '你好'}]}}, 'usage': {}}
+
+
+def test_probe_is_scheduled_as_batch_and_times_the_working_attempt(app_module, monkeypatch):
+    client = SlowFailingInvokeClient()
+    monkeypatch.setattr(app_module, 'bedrock_client', client)
+    scheduled = []
+    submit = app_module.scheduler.submit
+
+    def recording_submit(fn, *args, **kwargs):
+        scheduled.append(current_traffic()[0])
+        return submit(fn, *args, **kwargs)
+    monkeypatch.setattr(app_module.scheduler, 'submit', recording_submit)
+
+    path, target, seconds = app_module.probe_model(HAIKU)
+    assert (path, target) == ('converse', HAIKU)
+    assert client.calls == [('invoke', HAIKU), ('converse', HAIKU)]
+    assert scheduled == ['batch']
+    # 失败的invoke_model尝试不计入延迟
+    assert seconds < 0.2
@@ -0,0 +1,88 @@
+"""Automatic model routing"""
+
+import pytest
+
+from model_router import ModelRouter
+
+PAIR = ('English', 'Chinese')
+
+
+def _router(pair_quality, overall_quality=None, **kwargs):
+    def quality(source_lang, target_lang):
+        if source_lang is None:
+            return overall_quality or {}
+        return pair_quality if (source_lang, target_lang) == PAIR else {}
+    kwargs.setdefault('explore', 0)
+    return ModelRouter(quality, quality_floor=4.0, min_ratings=5, **kwargs)
+
+
+def _rated(avg_rating, count=10):
+    return {'avg_rating': avg_rating, 'count': count}
+
+
+def test_fastest_model_that_meets_the_floor():
+    router = _router({'fast': _rated(3.5), 'medium': _rated(4.5), 'slow': _rated(4.8)})
+    for model_id, seconds in (('fast', 0.2), ('medium', 0.5), ('slow', 1.0)):
+        router.observe(model_id, seconds)
+    assert router.choose(['slow', 'fast', 'medium'], *PAIR) == ('medium', 'fastest_qualifying')
+
+
+def test_overall_rating_is_used_when_the_pair_has_too_few():
+    router = _router({'a': _rated(5.0, count=2), 'b': _rated(4.1)}, overall_quality={'a': _rated(4.2)})
+    router.observe('a', 0.1)
+    router.observe('b', 0.5)
+    assert router.quality('a', *PAIR) == (4.2, 10, 'overall')
+    assert router.choose(['a', 'b'], *PAIR) == ('a', 'fastest_qualifying')
+
+
+def test_fallbacks_without_a_qualifying_model():
+    router = _router({'a': _rated(3.0), 'b': _rated(3.8)})
+    router.observe('a', 0.1)
+    router.observe('b', 0.9)
+    assert router.choose(['a', 'b'], *PAIR) == ('b', 'best_rated')
+    # 没有任何评分时使用最快的模型（探测延迟作为初始估计）
+    assert _router({}).choose(['x', 'y'], *PAIR, probe_latency={'x': 0.8, 'y': 0.3}) == ('y', 'fastest')
+    assert _router({}).choose([], *PAIR) == (None, 'none')
+
+
+def test_failing_models_are_skipped():
+    router = _router({'a': _rated(4.5), 'b': _rated(4.5)}, max_error_rate=0.5)
+    router.observe('a', 0.1)
+    router.observe('b', 0.4)
+    for _ in range(5):
+        router.observe('a', 0.1, ok=False)
+    assert router.error_rate('a') > 0.5
+    assert router.choose(['a', 'b'], *PAIR) == ('b', 'fastest_qualifying')
+
+
+def test_preview_never_explores():
+    router = _router({'a': _rated(4.5), 'b': _rated(4.5)}, explore=1.0)
+    router.observe('a', 0.1)
+    router.observe('b', 0.4)
+    assert router.choose(['a', 'b'], *PAIR) == ('b', 'explore')
+    assert router.choose(['a', 'b'], *PAIR, preview=True) == ('a', 'fastest_qualifying')
+
+
+def test_quality_is_cached_and_survives_read_errors():
+    calls = []
+
+    def quality(source_lang, target_lang):
+        calls.append((source_lang, target_lang))
+        if len(calls) > 1:
+            raise RuntimeError('database is locked')
+        return {'a': _rated(4.5)}
+    router = ModelRouter(quality, refresh_seconds=0)
+    assert router.quality('a', *PAIR)[0] == pytest.approx(4.5)
+    # 读取失败时继续使用上一次的结果
+    assert router.quality('a', *PAIR)[0] == pytest.approx(4.5)
+
+
+def test_route_endpoint_reports_the_routing_decision(app_module, monkeypatch):
+    monkeypatch.setattr(app_module.model_router, 'explore', 0)
+    response = app_module.app.test_client().get('/api/models/route?source_language=English&target_language=Chinese')
+    assert response.status_code == 200
+    body = response.json
+    expected = app_module.model_router.choose([m['id'] for m in app_module.available_models], *PAIR,
+                                              app_module.probe_latencies(), preview=True)
+    assert (body['model_id'], body['reason']) == expected
+    assert {c['model_id'] for c in body['candidates']} == {m['id'] for m in app_module.available_models}
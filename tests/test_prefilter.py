@@ -0,0 +1,34 @@
+"""Segment pre-filter"""
+
+import pytest
+
+from prefilter import classify
+
+
+@pytest.mark.parametrize('text', ['SKU-1234-XL', 'A12B', 'v2.3.1', 'X200Z', 'ORD_2024_0017', 'part#4471'])
+def test_identifiers_are_codes(text):
+    assert classify(text, 'Chinese', 'English') == 'code'
+
+
+@pytest.mark.parametrize('text', ['1st', '5kg', '24h', '3.5cm', '10:30am', '100ml', 'A1', 'v2'])
+def test_quantities_and_short_tokens_are_translated(text):
+    assert classify(text, 'Chinese', 'English') is None
+
+
+def test_han_only_text_from_a_han_script_source_is_translated():
+    assert classify('会社概要', 'Chinese', 'Japanese') is None
+    assert classify('株式会社', 'Chinese', 'Japanese') is None
+    assert classify('公司简介', 'Chinese', 'Traditional Chinese') is None
+    # 含假名的文本可以确定是日文
+    assert classify('これは日本語の文章です', 'Japanese', 'Chinese') == 'target_language'
+    # 源语言不使用汉字时，纯汉字文本已经是目标语言
+    assert classify('公司简介', 'Chinese', 'English') == 'target_language'
+
+
+def test_other_pass_through_reasons():
+    assert classify('  ', 'Chinese', 'English') == 'empty'
+    assert classify('1,234.50', 'Chinese', 'English') == 'number'
+    assert classify('https://example.com/a?b=1', 'Chinese', 'English') == 'url'
+    assert classify('sales@example.com', 'Chinese', 'English') == 'email'
+    assert classify('Please read the instructions before use', 'Chinese', 'English') is None
+    assert classify('Please read the instructions before use', 'English', 'Chinese') == 'target_language'
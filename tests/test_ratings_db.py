@@ -0,0 +1,106 @@
+"""Ratings storage: hourly rollups, write-behind queue and the inline-text migration"""
+
+import sqlite3
+from datetime import datetime, timedelta
+
+from ratings_db import RatingsStore, RatingWriteBehindQueue
+
+HOUR = datetime(2026, 3, 1, 10, 15)
+
+
+def _row(rating, model_id='model-a', timestamp=None, text='Hello'):
+    return {'source_text': text, 'translated_text': f'你好 {rating}', 'source_language': 'English',
+            'target_language': 'Chinese', 'model_id': model_id, 'rating': rating, 'timestamp': timestamp}
+
+
+def _rollups(store):
+    rows = store.connection().execute(
+        'SELECT hour, model_id, rating, count, rating_sum FROM rating_rollup_hourly ORDER BY hour, model_id, rating')
+    return [tuple(row) for row in rows]
+
+
+def test_rollups_after_write_behind_flush(tmp_path):
+    store = RatingsStore(str(tmp_path / 'ratings.db'))
+    flushed = []
+    queue = RatingWriteBehindQueue(store, batch_size=1000, flush_interval=60, on_flush=flushed.append)
+    version = store.data_version()
+    rows = ([_row(5, timestamp=HOUR)] * 3 + [_row(4, timestamp=HOUR + timedelta(minutes=30))] +
+            [_row(2, model_id='model-b', timestamp=HOUR + timedelta(hours=1))] * 2)
+    for row in rows:
+        assert queue.submit(dict(row))
+    assert queue.pending() == len(rows)
+    assert _rollups(store) == []
+
+    assert queue.flush() == len(rows)
+    queue.stop()
+    assert flushed == [len(rows)]
+    assert store.data_version() > version
+    assert _rollups(store) == [
+        ('2026-03-01 10:00:00', 'model-a', 4, 1, 4),
+        ('2026-03-01 10:00:00', 'model-a', 5, 3, 15),
+        ('2026-03-01 11:00:00', 'model-b', 2, 2, 4),
+    ]
+    stats = store.get_stats(HOUR - timedelta(days=1))
+    assert {row['rating']: row['count'] for row in stats['rating_distribution']} == {2: 2, 4: 1, 5: 3}
+    assert {row['model_id']: row['avg_rating'] for row in stats['models']} == {'model-a': 19 / 4, 'model-b': 2.0}
+    # 相同的文本只存一次
+    assert store.connection().execute('SELECT COUNT(*) FROM rating_texts').fetchone()[0] == 4
+
+
+def test_failed_flush_is_retried_with_the_submit_time(tmp_path):
+    store = RatingsStore(str(tmp_path / 'ratings.db'))
+    queue = RatingWriteBehindQueue(store, batch_size=1000, flush_interval=60)
+    add_ratings = store.add_ratings
+    failures = [RuntimeError('database is locked')]
+
+    def flaky(rows):
+        if failures:
+            raise failures.pop()
+        return add_ratings(rows)
+    store.add_ratings = flaky
+
+    before = datetime.now()
+    queue.submit(_row(3))
+    assert queue.flush() == 0 and queue.pending() == 1
+    assert queue.flush() == 1
+    queue.stop()
+    [[rating]] = list(store.iter_ratings())
+    assert rating['rating'] == 3 and rating['source_text'] == 'Hello'
+    assert datetime.strptime(rating['timestamp'], '%Y-%m-%d %H:%M:%S.%f') >= before.replace(microsecond=0)
+
+
+def test_inline_texts_are_migrated_and_rollups_backfilled(tmp_path):
+    path = str(tmp_path / 'old.db')
+    conn = sqlite3.connect(path)
+    conn.execute('''
+    CREATE TABLE ratings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT, source_text TEXT, translated_text TEXT, source_language TEXT,
+        target_language TEXT, model_id TEXT, rating INTEGER, timestamp DATETIME)''')
+    conn.execute('CREATE INDEX idx_ratings_model ON ratings (model_id, timestamp, rating)')
+    long_text = 'A long source text. ' * 100
+    conn.executemany('INSERT INTO ratings (source_text, translated_text, source_language, target_language, '
+                     'model_id, rating, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)', [
+                         (long_text, '译文一', 'English', 'Chinese', 'model-a', 5, '2026-03-01 10:15:00.000000'),
+                         (long_text, '译文二', 'English', 'Chinese', 'model-a', 3, '2026-03-01 10:45:00.000000'),
+                         ('Short', None, 'English', 'Chinese', 'model-b', 4, '2026-03-02 08:00:00.000000'),
+                     ])
+    conn.commit()
+    conn.close()
+
+    store = RatingsStore(path)
+    columns = {row['name'] for row in store.connection().execute('PRAGMA table_info(ratings)')}
+    assert 'source_text' not in columns and 'source_text_id' in columns
+    [batch] = list(store.iter_ratings())
+    assert [(r['id'], r['source_text'], r['translated_text']) for r in batch] == [
+        (1, long_text, '译文一'), (2, long_text, '译文二'), (3, 'Short', None)]
+    # 重复的长文本只存一次，并且被压缩
+    codecs = store.connection().execute('SELECT codec FROM rating_texts WHERE length = ?', (len(long_text),)).fetchall()
+    assert [row['codec'] for row in codecs] == ['zlib']
+    assert _rollups(store) == [
+        ('2026-03-01 10:00:00', 'model-a', 3, 1, 3),
+        ('2026-03-01 10:00:00', 'model-a', 5, 1, 5),
+        ('2026-03-02 08:00:00', 'model-b', 4, 1, 4),
+    ]
+    indexes = [row[0] for row in store.connection().execute(
+        "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'ratings'")]
+    assert indexes == []
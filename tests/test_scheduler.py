@@ -0,0 +1,97 @@
+"""Request scheduler: priority classes, fair queuing and admission control"""
+
+import contextvars
+import threading
+
+import pytest
+
+from scheduler import RequestScheduler, SchedulerBusy, current_traffic, set_traffic
+
+
+def _submit(scheduler, priority, flow, fn, *args):
+    """Submit from a context with its own traffic class, as a request handler would"""
+    def run():
+        set_traffic(priority, flow)
+        return scheduler.submit(fn, *args)
+    return contextvars.copy_context().run(run)
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = RequestScheduler(max_concurrency=1, max_queue={'interactive': 3})
+    yield scheduler
+    scheduler.shutdown()
+
+
+def _block(scheduler):
+    """Occupy the only call slot until the returned event is set"""
+    started, release = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+    future = _submit(scheduler, 'batch', 'blocker', hold)
+    assert started.wait(5)
+    return release, future
+
+
+def test_interactive_work_is_served_before_batch(scheduler):
+    release, blocker = _block(scheduler)
+    order = []
+    futures = [_submit(scheduler, 'batch', 'job', order.append, f'batch-{i}') for i in range(3)]
+    futures += [_submit(scheduler, 'interactive', 'client', order.append, f'interactive-{i}') for i in range(2)]
+    release.set()
+    for future in [blocker] + futures:
+        future.result(5)
+    assert order == ['interactive-0', 'interactive-1', 'batch-0', 'batch-1', 'batch-2']
+
+
+def test_batch_flows_share_the_slot_fairly(scheduler):
+    release, blocker = _block(scheduler)
+    order = []
+    futures = [_submit(scheduler, 'batch', 'big', order.append, 'big') for _ in range(4)]
+    futures += [_submit(scheduler, 'batch', 'small', order.append, 'small') for _ in range(2)]
+    release.set()
+    for future in [blocker] + futures:
+        future.result(5)
+    # 后到的小任务不必等待大任务全部完成
+    assert order[:4].count('small') == 2
+
+
+def test_full_interactive_queue_is_rejected(scheduler):
+    release, blocker = _block(scheduler)
+    futures = [_submit(scheduler, 'interactive', 'client', lambda: None) for _ in range(3)]
+    with pytest.raises(SchedulerBusy) as error:
+        _submit(scheduler, 'interactive', 'client', lambda: None)
+    assert error.value.priority == 'interactive' and error.value.retry_after > 0
+    release.set()
+    for future in [blocker] + futures:
+        future.result(5)
+
+
+def test_batch_admission_uses_the_backlog(scheduler):
+    scheduler.backlog, scheduler.max_backlog = (lambda: 10), 10
+    with pytest.raises(SchedulerBusy):
+        scheduler.admit('batch')
+    scheduler.admit('interactive')
+
+
+def test_nested_call_from_a_worker_does_not_deadlock(scheduler):
+    # 只有一个调用槽位：嵌套调用如果再排队就会永远等待
+    def outer():
+        return scheduler.call(lambda: 'inner') + '+outer'
+    assert _submit(scheduler, 'batch', 'job', outer).result(5) == 'inner+outer'
+    assert scheduler.call(lambda: 'direct') == 'direct'
+
+
+def test_interactive_endpoints_are_classified_as_interactive(app_module, monkeypatch):
+    seen = {}
+
+    def record_traffic(model_id, system_prompt, input_text):
+        seen[app_module.request.endpoint] = current_traffic()[0]
+        return 'ok'
+    monkeypatch.setattr(app_module, 'call_bedrock_api', record_traffic)
+    client = app_module.app.test_client()
+    model_id = 'anthropic.claude-3-haiku-20240307-v1:0'
+    client.post('/api/translate', json={'input_text': 'hello', 'model_id': model_id})
+    assert seen.get('api_translate') == 'interactive'
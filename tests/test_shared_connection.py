@@ -0,0 +1,20 @@
+"""Connection settings shared between workers"""
+
+
+def test_workers_do_not_share_entered_credentials(app_module):
+    # 另一个worker用页面输入的凭证连接：本worker保持未连接
+    app_module.shared_state.set('connection', {'use_profile': False, 'region': 'us-east-1'})
+    app_module.sync_shared_state(force=True)
+    assert app_module.bedrock_client is None
+    assert 'access_key' not in app_module.shared_state.get('connection')
+
+
+def test_connect_rejects_entered_credentials_with_several_workers(app_module, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'MULTI_WORKER', True)
+    client = app_module.app.test_client()
+    response = client.post('/connect', data={'access_key': 'AKIAEXAMPLE', 'secret_key': 'secret', 'region': 'us-east-1'})
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        messages = [message for _, message in session['_flashes']]
+    assert any('several workers' in message for message in messages)
+    assert 'AKIAEXAMPLE' not in str(app_module.shared_state.get('connection'))
@@ -0,0 +1,37 @@
+"""NDJSON streaming translation"""
+
+import json
+
+HAIKU = 'anthropic.claude-3-haiku-20240307-v1:0'
+
+
+def test_stream_reports_non_object_records(app_module):
+    body = '\n'.join([
+        '{"text": "hello"}',
+        '42',
+        'true',
+        'null',
+        '"just a string"',
+        '[1, 2]',
+        '{"id": 7}',
+        '{"text": "world", "id": 8}',
+        '{not json',
+    ]) + '\n'
+    response = app_module.app.test_client().post(
+        f'/api/translate_stream?model_id={HAIKU}&window=3', data=body.encode('utf-8'),
+        content_type='application/x-ndjson')
+    assert response.status_code == 200
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+    assert len(records) == 9
+    assert records[0]['text_translated'].endswith('hello]')
+    # 非对象记录按原值返回并带有错误，不中断后面的记录
+    assert [r.get('_value') for r in records[1:6]] == [42, True, None, 'just a string', [1, 2]]
+    assert all('no string field "text"' in r['_error'] for r in records[1:7])
+    assert records[6]['id'] == 7
+    assert records[7]['id'] == 8 and records[7]['text_translated'].endswith('world]')
+    assert records[8]['_error'].startswith('Invalid JSON') and records[8]['_line'] == 9
+
+    job_id = response.headers['X-Job-Id']
+    job = app_module.jobs.get(job_id)
+    assert job['status'] == 'completed' and job['failed'] == 7
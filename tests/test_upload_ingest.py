@@ -0,0 +1,109 @@
+"""Streaming ingestion of uploads and chunked, resumable uploads"""
+
+import gzip
+import io
+import time
+import zipfile
+
+import pytest
+
+from shared_state import MemoryStateBackend
+from upload_ingest import UploadManager, UploadOffsetError, iter_lines
+
+LINES = ['first line', 'second line', '第三行', 'fourth line']
+TEXT = '\r\n'.join(LINES).encode('utf-8')
+
+
+class Unseekable(io.RawIOBase):
+    """Write-only stream: zipfile then writes data descriptors after each member"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+def _zip(members, force_zip64=False, seekable=False):
+    out = io.BytesIO() if seekable else Unseekable()
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            with archive.open(name, 'w', force_zip64=force_zip64) as member:
+                member.write(data)
+    return bytes(out.getvalue() if seekable else out.data)
+
+
+def _chunks(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('force_zip64', [False, True])
+@pytest.mark.parametrize('chunk_size', [1, 7, 1 << 20])
+def test_zip_with_data_descriptors(force_zip64, chunk_size):
+    data = _zip([('a.txt', TEXT), ('image.png', b'\x89PNG' * 50), ('dir/b.csv', b'x,y\nz,w\n')],
+                force_zip64=force_zip64)
+    # 数据描述符标志已设置
+    assert data[6] & 0x08
+    assert list(iter_lines(_chunks(data, chunk_size), 'upload.zip')) == LINES + ['x,y', 'z,w']
+
+
+def test_zip_with_declared_sizes():
+    data = _zip([('a.txt', TEXT)], seekable=True)
+    assert not data[6] & 0x08
+    assert list(iter_lines(_chunks(data, 5), 'upload.zip')) == LINES
+
+
+def test_truncated_zip_is_an_error():
+    data = _zip([('a.txt', TEXT * 100)])
+    with pytest.raises(ValueError):
+        list(iter_lines([data[:len(data) // 2]], 'upload.zip'))
+
+
+def test_concatenated_gzip_members_split_across_chunks():
+    data = gzip.compress('\n'.join(LINES[:2]).encode('utf-8') + b'\n') + gzip.compress('\n'.join(LINES[2:]).encode('utf-8'))
+    assert list(iter_lines(_chunks(data, 3), 'upload.csv.gz')) == LINES
+
+
+def test_upload_resumes_from_the_reported_offset(tmp_path):
+    manager = UploadManager(str(tmp_path), MemoryStateBackend())
+    upload = manager.create('upload.txt', size=len(TEXT))
+    upload_id = upload['upload_id']
+    assert manager.append(upload_id, 0, io.BytesIO(TEXT[:10])) == 10
+
+    # 重发已收到的分块：报告应继续的偏移量
+    with pytest.raises(UploadOffsetError) as error:
+        manager.append(upload_id, 0, io.BytesIO(TEXT[:10]))
+    assert error.value.expected == manager.get(upload_id)['offset'] == 10
+
+    assert manager.append(upload_id, 10, io.BytesIO(TEXT[10:]), final=True) == len(TEXT)
+    assert manager.get(upload_id)['complete']
+    assert list(iter_lines(manager.follow(upload_id, poll_interval=0.01), 'upload.txt')) == LINES
+    with pytest.raises(ValueError):
+        manager.append(upload_id, len(TEXT), io.BytesIO(b'more'))
+
+
+def test_chunked_upload_job_links_its_result(app_module):
+    client = app_module.app.test_client()
+    data = _zip([('a.txt', TEXT)])
+    response = client.post('/api/uploads', json={'filename': 'upload.zip', 'size': len(data),
+                                                 'model_id': 'anthropic.claude-3-haiku-20240307-v1:0'},
+                           base_url='http://localhost/translator/')
+    assert response.status_code == 201
+    upload_id, job_id = response.json['upload_id'], response.json['job_id']
+    middle = len(data) // 2
+    assert client.put(f'/api/uploads/{upload_id}', data=data[:middle], headers={'Upload-Offset': '0'}).status_code < 300
+    response = client.put(f'/api/uploads/{upload_id}', data=data[middle:],
+                          headers={'Upload-Offset': str(middle), 'Upload-Complete': '1'})
+    assert response.status_code < 300
+
+    deadline = time.time() + 10
+    while app_module.jobs.get(job_id)['status'] == 'running' and time.time() < deadline:
+        time.sleep(0.05)
+    job = app_module.jobs.get(job_id)
+    assert job['status'] == 'completed' and job['completed'] == len(LINES)
+    # 下载地址由url_for生成，包含应用的挂载路径
+    assert job['download_url'] == f"/translator/artifacts/{job['artifact_id']}"
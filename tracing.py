@@ -0,0 +1,133 @@
+"""
+AWS Bedrock Translation Web Application - Tracing and Profiling
+
+Lightweight per-request tracing: every request gets a trace ID that is
+attached to log lines and returned in the X-Trace-Id response header, and
+named spans record how long each stage (file parsing, prompt building,
+Bedrock inference, fallbacks, rendering) took.
+
+Also provides an on-demand sampling profiler that produces folded stacks
+(the input format of flamegraph.pl and speedscope).
+"""
+
+import contextvars
+import logging
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter as _Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from metrics import REGISTRY
+
+STAGE_LATENCY = REGISTRY.histogram(
+    'translator_stage_duration_seconds', 'Time spent in each traced stage',
+    ('stage',))
+
+# 允许透传的外部trace ID格式
+_TRACE_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+class Trace:
+    """Spans recorded during one request"""
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.spans: List[Dict] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, duration: float, **attrs):
+        with self._lock:
+            self.spans.append({'name': name, 'duration': duration, **attrs})
+
+    def summary(self) -> Dict[str, float]:
+        """Total seconds per span name, in first-seen order"""
+        totals: Dict[str, float] = {}
+        with self._lock:
+            for item in self.spans:
+                totals[item['name']] = totals.get(item['name'], 0.0) + item['duration']
+        return totals
+
+    def server_timing(self) -> str:
+        """Render the spans as a Server-Timing header value"""
+        entries = []
+        for name, duration in self.summary().items():
+            metric = re.sub(r'[^A-Za-z0-9_-]', '_', name)
+            entries.append(f'{metric};dur={duration * 1000:.1f}')
+        entries.append(f'total;dur={(time.perf_counter() - self.start) * 1000:.1f}')
+        return ', '.join(entries)
+
+
+def start_trace(trace_id: Optional[str] = None):
+    """Start a new trace for the current context, returning a token for end_trace"""
+    if trace_id and not _TRACE_ID_PATTERN.match(trace_id):
+        trace_id = None
+    return _current_trace.set(Trace(trace_id))
+
+
+def end_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_trace_id() -> str:
+    trace = _current_trace.get()
+    return trace.trace_id if trace else '-'
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a stage and attach it to the current trace"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_LATENCY.observe(duration, stage=name)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add_span(name, duration, **attrs)
+
+
+class TraceIdFilter(logging.Filter):
+    """Attach the current trace ID to every log record"""
+
+    def filter(self, record):
+        record.trace_id = current_trace_id()
+        return True
+
+
+def sample_stacks(seconds: float, interval: float = 0.005, max_depth: int = 128) -> str:
+    """Sample the stacks of all other threads and return them as folded stacks
+
+    Each output line is "thread;outer_frame;...;inner_frame count", which
+    flamegraph.pl and speedscope can load directly.
+    """
+    own_thread = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    stacks = _Counter()
+
+    while time.monotonic() < deadline:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            frames = []
+            while frame is not None and len(frames) < max_depth:
+                code = frame.f_code
+                frames.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]})')
+                frame = frame.f_back
+            frames.append(names.get(thread_id, str(thread_id)))
+            stacks[';'.join(reversed(frames))] += 1
+        time.sleep(interval)
+
+    return '\n'.join(f'{stack} {count}' for stack, count in stacks.most_common()) + '\n'
@@ -0,0 +1,220 @@
+"""
+AWS Bedrock Translation Web Application - Translation Engine
+
+Concurrent execution of many translation calls:
+    - a shared thread pool (or the injected executor, e.g. the request
+      scheduler) bounds the number of Bedrock calls in flight
+    - an LRU cache (with TTL) returns repeated segments without a call
+    - identical segments that are already in flight share one call
+    - a token-bucket rate limiter keeps the call rate under the account quota
+
+The engine wraps a translate function (model_id, system_prompt, text) -> text,
+normally app.call_bedrock_api.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from metrics import REGISTRY, CACHE_REQUESTS
+
+ENGINE_PENDING = REGISTRY.gauge(
+    'translator_engine_pending_calls', 'Translation calls queued or running in the translation engine')
+
+TranslateFunction = Callable[[str, str, str], str]
+# 系统提示词，或根据片段生成提示词的函数（例如按片段注入术语表）；函数返回None表示片段无需翻译
+PromptSpec = Union[str, Callable[[str], Optional[str]]]
+
+
+def cache_key(model_id: str, system_prompt: str, text: str) -> bytes:
+    digest = hashlib.sha256()
+    for part in (model_id, system_prompt, text):
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.digest()
+
+
+class TranslationCache:
+    """Thread-safe LRU cache of translations with a TTL"""
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 24 * 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._items: 'OrderedDict[bytes, Tuple[float, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: bytes) -> Optional[str]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def put(self, key: bytes, value: str):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.time() + self.ttl_seconds, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class RateLimiter:
+    """Token bucket: `rate` calls per second with bursts up to `burst`"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> float:
+        """Take a token if one is available; returns 0, or the seconds until the next token"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Block until a call may be made"""
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class TranslationEngine:
+    """Run translation calls concurrently with caching, in-flight dedup and rate limiting"""
+
+    def __init__(self, translate: TranslateFunction, max_workers: int = 8, cache: Optional[TranslationCache] = None,
+                 rate_limiter: Optional[RateLimiter] = None, executor=None):
+        self.translate = translate
+        self.cache = cache if cache is not None else TranslationCache()
+        self.rate_limiter = rate_limiter or RateLimiter(0)
+        # 外部执行器（需提供submit）负责并发和调度，否则使用自己的线程池
+        self._pool = executor if executor is not None else ThreadPoolExecutor(max_workers=max_workers,
+                                                                              thread_name_prefix='translate')
+        self._owns_pool = executor is None
+        self._inflight: Dict[bytes, Future] = {}
+        self._lock = threading.Lock()
+        self._pending = 0
+        ENGINE_PENDING.set_function(lambda: self._pending)
+
+    def _run(self, key: bytes, model_id: str, system_prompt: str, text: str) -> str:
+        try:
+            self.rate_limiter.acquire()
+            result = self.translate(model_id, system_prompt, text)
+            self.cache.put(key, result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+                self._pending -= 1
+
+    def submit(self, model_id: str, system_prompt: PromptSpec, text: str) -> Tuple[Future, str]:
+        """Schedule one translation; returns the future and how it was served (cached, inflight, called or skipped)"""
+        if callable(system_prompt):
+            system_prompt = system_prompt(text)
+            if system_prompt is None:
+                future = Future()
+                future.set_result(text)
+                return future, 'skipped'
+        key = cache_key(model_id, system_prompt, text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            CACHE_REQUESTS.inc(cache='translation', result='hit')
+            future = Future()
+            future.set_result(cached)
+            return future, 'cached'
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                CACHE_REQUESTS.inc(cache='translation', result='inflight')
+                return future, 'inflight'
+            CACHE_REQUESTS.inc(cache='translation', result='miss')
+            # 在锁内注册，保证相同文本只会调用一次
+            future = self._pool.submit(self._run, key, model_id, system_prompt, text)
+            self._pending += 1
+            self._inflight[key] = future
+        return future, 'called'
+
+    def translate_many(self, model_id: str, system_prompt: PromptSpec, segments: List[str]) -> List[Dict]:
+        """Translate segments concurrently and return per-segment results in input order
+
+        Each result has `translated_text` or `error`, plus `source`
+        (called, cached, inflight or skipped).
+        """
+        submitted = [self.submit(model_id, system_prompt, text) for text in segments]
+        results = []
+        for index, (future, source) in enumerate(submitted):
+            try:
+                results.append({'index': index, 'translated_text': future.result(), 'source': source})
+            except Exception as e:
+                results.append({'index': index, 'error': str(e), 'source': source})
+        return results
+
+    def translate_iter(self, model_id: str, system_prompt: PromptSpec, segments: Iterable[str],
+                       window: int = 32) -> Iterator[Dict]:
+        """Translate a stream of segments, yielding results in input order
+
+        At most `window` segments are submitted ahead of the oldest result, so
+        the input is consumed lazily and memory stays bounded. Results have the
+        shape of translate_many's plus the original `text`.
+        """
+        for item in self.translate_fanout(model_id, [system_prompt], segments, window):
+            yield dict(item['results'][0], index=item['index'], text=item['text'])
+
+    def translate_fanout(self, model_id: str, system_prompts: List[PromptSpec], segments: Iterable[str],
+                         window: int = 32) -> Iterator[Dict]:
+        """Translate each segment with every system prompt (e.g. one per target language)
+
+        All (segment, prompt) calls are scheduled on the shared pool at once,
+        so N prompts take about as long as one when the pool and rate limit
+        allow. Yields {'index', 'text', 'results': [one result per prompt]}
+        in input order, with at most `window` segments in flight.
+        """
+        pending = deque()
+
+        def finish(index, text, submitted):
+            results = []
+            for future, source in submitted:
+                try:
+                    results.append({'translated_text': future.result(), 'source': source})
+                except Exception as e:
+                    results.append({'error': str(e), 'source': source})
+            return {'index': index, 'text': text, 'results': results}
+
+        for index, text in enumerate(segments):
+            pending.append((index, text, [self.submit(model_id, prompt, text) for prompt in system_prompts]))
+            while len(pending) >= window or (pending and all(future.done() for future, _ in pending[0][2])):
+                yield finish(*pending.popleft())
+        while pending:
+            yield finish(*pending.popleft())
+
+    @property
+    def pending(self) -> int:
+        """Calls queued or running"""
+        return self._pending
+
+    def shutdown(self):
+        if self._owns_pool:
+            self._pool.shutdown(wait=False)
@@ -0,0 +1,387 @@
+"""
+AWS Bedrock Translation Web Application - Upload Ingestion
+
+Large files are uploaded in chunks to /api/uploads. Each chunk is appended
+to a spool file in the uploads folder (its size is the resume offset), and
+the ingestion thread follows that file while it grows: bytes are
+decompressed (.gz, .zip) and split into lines on the fly, so translation
+starts while the upload is still running and every byte hits the disk once.
+
+Upload metadata lives in the shared state backend, so chunks can be sent
+to any worker on the host.
+"""
+
+import codecs
+import os
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from shared_state import StateBackend, JobTracker
+
+try:
+    import fcntl
+except ImportError:  # Windows: 只依靠进程内锁
+    fcntl = None
+
+# 可以逐行流式处理的文件类型（xlsx需要完整文件）
+STREAMABLE_EXTENSIONS = {'txt', 'csv'}
+COMPRESSED_EXTENSIONS = {'gz', 'zip'}
+READ_CHUNK_SIZE = 1024 * 1024
+# 单行最大字符数，防止没有换行的文件占满内存
+MAX_LINE_CHARS = 1024 * 1024
+
+_NEWLINE = re.compile(r'\r\n|\r|\n')
+
+_ZIP_LOCAL_HEADER = 0x04034b50
+_ZIP_CENTRAL_HEADER = 0x02014b50
+_ZIP_DATA_DESCRIPTOR = 0x08074b50
+
+
+class UploadOffsetError(ValueError):
+    """A chunk was sent for an offset other than the current upload size"""
+
+    def __init__(self, expected: int):
+        super().__init__(f'Upload offset mismatch, expected {expected}')
+        self.expected = expected
+
+
+def file_extensions(filename: str) -> Tuple[str, Optional[str]]:
+    """(content extension, compression) of a file name, e.g. ('csv', 'gz') for data.csv.gz"""
+    parts = filename.lower().rsplit('.', 2)
+    extension = parts[-1] if len(parts) > 1 else ''
+    if extension == 'gz':
+        return (parts[-2] if len(parts) > 2 else ''), 'gz'
+    if extension == 'zip':
+        # 压缩包内的txt/csv成员按行读取
+        return 'txt', 'zip'
+    return extension, None
+
+
+class LineDecoder:
+    """Incremental UTF-8 decoding and splitting into non-empty, stripped lines"""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder('utf-8-sig')()
+        self._pending = ''
+
+    def feed(self, data: bytes, final: bool = False) -> List[str]:
+        text = self._pending + self._decoder.decode(data, final)
+        parts = _NEWLINE.split(text)
+        self._pending = '' if final else parts.pop()
+        if len(self._pending) > MAX_LINE_CHARS:
+            raise ValueError(f'Line longer than {MAX_LINE_CHARS} characters')
+        return [part.strip() for part in parts if part.strip()]
+
+    def close(self) -> List[str]:
+        lines = self.feed(b'', final=True)
+        self._decoder.reset()
+        return lines
+
+
+class GzipStream:
+    """Incremental gzip decompression (including concatenated members)"""
+
+    def __init__(self):
+        self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        self._started = False
+
+    def feed(self, data: bytes) -> List[Tuple[bytes, bool]]:
+        out = []
+        while data:
+            self._started = True
+            out.append((self._decompressor.decompress(data), False))
+            if not self._decompressor.eof:
+                break
+            data = self._decompressor.unused_data
+            self._decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            self._started = False
+        return out
+
+    def close(self) -> List[Tuple[bytes, bool]]:
+        if self._started:
+            raise ValueError('Truncated gzip stream')
+        return [(b'', True)]
+
+
+class ZipStream:
+    """Incremental reader of the text members of a zip archive
+
+    Reads local file headers front to back, so no central directory (and no
+    seekable file) is needed. Deflated members may use data descriptors
+    (including the Zip64 form); stored members must declare their size.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._member = None  # (name, method, remaining stored bytes, data descriptor size, wanted)
+        self._decompressor = None
+        self._data_done = False
+        self._done = False
+
+    @staticmethod
+    def _wanted(name: str) -> bool:
+        if name.endswith('/') or name.startswith('__MACOSX/'):
+            return False
+        return name.lower().rsplit('.', 1)[-1] in STREAMABLE_EXTENSIONS
+
+    def _read_header(self) -> bool:
+        if len(self._buffer) < 4:
+            return False
+        signature = struct.unpack_from('<I', self._buffer)[0]
+        if signature == _ZIP_CENTRAL_HEADER:
+            # 中央目录开始，成员已全部读完
+            self._done = True
+            self._buffer.clear()
+            return False
+        if signature != _ZIP_LOCAL_HEADER:
+            raise ValueError('Invalid zip archive')
+        if len(self._buffer) < 30:
+            return False
+        flags, method, compressed_size, size, name_len, extra_len = (
+            struct.unpack_from('<HH', self._buffer, 6) + struct.unpack_from('<II', self._buffer, 18)
+            + struct.unpack_from('<HH', self._buffer, 26))
+        if len(self._buffer) < 30 + name_len + extra_len:
+            return False
+        name = bytes(self._buffer[30:30 + name_len]).decode('utf-8' if flags & 0x800 else 'cp437')
+        extra = bytes(self._buffer[30 + name_len:30 + name_len + extra_len])
+        del self._buffer[:30 + name_len + extra_len]
+        zip64 = self._zip64_field(extra)
+        if compressed_size == 0xFFFFFFFF:
+            # zip64扩展字段只包含头中为0xFFFFFFFF的值，依次为原始大小、压缩大小
+            position = 8 if size == 0xFFFFFFFF else 0
+            if zip64 is None or len(zip64) < position + 8:
+                raise ValueError('Invalid zip64 extra field')
+            compressed_size = struct.unpack_from('<Q', zip64, position)[0]
+        if method not in (0, 8):
+            raise ValueError(f'Unsupported zip compression method {method} for {name}')
+        if method == 0 and flags & 0x08:
+            raise ValueError(f'Cannot stream stored zip member {name} without a declared size')
+        # 有zip64扩展字段的成员，其数据描述符中的大小为8字节
+        descriptor_size = (20 if zip64 is not None else 12) if flags & 0x08 else 0
+        self._member = (name, method, compressed_size, descriptor_size, self._wanted(name))
+        self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if method == 8 else None
+        return True
+
+    @staticmethod
+    def _zip64_field(extra: bytes) -> Optional[bytes]:
+        """Data of the zip64 extended information extra field, or None"""
+        offset = 0
+        while offset + 4 <= len(extra):
+            header_id, size = struct.unpack_from('<HH', extra, offset)
+            if header_id == 0x0001:
+                return extra[offset + 4:offset + 4 + size]
+            offset += 4 + size
+        return None
+
+    def _read_data(self, out: List[Tuple[bytes, bool]]) -> bool:
+        name, method, remaining, descriptor_size, wanted = self._member
+        if self._data_done:
+            pass
+        elif method == 8:
+            data = self._decompressor.decompress(bytes(self._buffer))
+            self._buffer = bytearray(self._decompressor.unused_data)
+            if wanted and data:
+                out.append((data, False))
+            if not self._decompressor.eof:
+                return False
+        else:
+            data = bytes(self._buffer[:remaining])
+            del self._buffer[:remaining]
+            remaining -= len(data)
+            self._member = (name, method, remaining, descriptor_size, wanted)
+            if wanted and data:
+                out.append((data, False))
+            if remaining:
+                return False
+        self._data_done = True
+        if descriptor_size:
+            # 数据描述符: [签名] crc32 压缩大小 原始大小（zip64为8字节大小）
+            if len(self._buffer) < descriptor_size + 4:
+                return False
+            has_signature = struct.unpack_from('<I', self._buffer)[0] == _ZIP_DATA_DESCRIPTOR
+            del self._buffer[:descriptor_size + (4 if has_signature else 0)]
+        if wanted:
+            out.append((b'', True))
+        self._member = None
+        self._data_done = False
+        return True
+
+    def feed(self, data: bytes) -> List[Tuple[bytes, bool]]:
+        out = []
+        if self._done:
+            return out
+        self._buffer += data
+        while not self._done:
+            if self._member is None:
+                if not self._read_header():
+                    break
+            elif not self._read_data(out):
+                break
+        return out
+
+    def close(self) -> List[Tuple[bytes, bool]]:
+        if not self._done and (self._member is not None or self._buffer):
+            raise ValueError('Truncated zip archive')
+        return []
+
+
+class PlainStream:
+    def feed(self, data: bytes) -> List[Tuple[bytes, bool]]:
+        return [(data, False)]
+
+    def close(self) -> List[Tuple[bytes, bool]]:
+        return [(b'', True)]
+
+
+class StreamIngester:
+    """Turn the raw bytes of an uploaded file into translation segments as they arrive"""
+
+    def __init__(self, filename: str):
+        extension, compression = file_extensions(filename)
+        if extension not in STREAMABLE_EXTENSIONS:
+            raise ValueError(f'Cannot stream .{extension} files')
+        self._stream = {'gz': GzipStream, 'zip': ZipStream}.get(compression, PlainStream)()
+        self._decoder = LineDecoder()
+        self.bytes_read = 0
+
+    def _decode(self, pieces: List[Tuple[bytes, bool]]) -> List[str]:
+        lines = []
+        for data, member_end in pieces:
+            lines.extend(self._decoder.feed(data))
+            if member_end:
+                lines.extend(self._decoder.close())
+        return lines
+
+    def feed(self, data: bytes) -> List[str]:
+        self.bytes_read += len(data)
+        return self._decode(self._stream.feed(data))
+
+    def close(self) -> List[str]:
+        return self._decode(self._stream.close())
+
+
+def iter_lines(chunks: Iterable[bytes], filename: str) -> Iterator[str]:
+    """Segments of a txt/csv file (optionally .gz or .zip) from a stream of byte chunks"""
+    ingester = StreamIngester(filename)
+    for chunk in chunks:
+        yield from ingester.feed(chunk)
+    yield from ingester.close()
+
+
+def read_chunks(stream: BinaryIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[bytes]:
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+class UploadManager:
+    """Chunked, resumable uploads spooled to the uploads folder"""
+
+    def __init__(self, folder: str, backend: StateBackend, ttl_seconds: float = 24 * 3600,
+                 max_bytes: int = 2 * 1024 ** 3):
+        self.folder = folder
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, upload_id: str) -> str:
+        return os.path.join(self.folder, f'{upload_id}.part')
+
+    def create(self, filename: str, size: Optional[int] = None, **fields) -> Dict:
+        upload_id = JobTracker.new_job_id()
+        upload = {'upload_id': upload_id, 'filename': filename, 'size': size, 'complete': False,
+                  'created_at': time.time()}
+        upload.update(fields)
+        open(self.path(upload_id), 'wb').close()
+        self.backend.set(f'upload:{upload_id}', upload, ttl=self.ttl_seconds)
+        return upload
+
+    def get(self, upload_id: str) -> Optional[Dict]:
+        upload = self.backend.get(f'upload:{upload_id}')
+        if upload is None:
+            return None
+        try:
+            upload['offset'] = os.path.getsize(self.path(upload_id))
+        except OSError:
+            # 处理完成后分块文件已删除
+            upload['offset'] = upload['size'] if upload['complete'] else 0
+        return upload
+
+    def append(self, upload_id: str, offset: int, stream: BinaryIO, final: bool = False) -> int:
+        """Append a chunk at `offset` and return the new upload size
+
+        A chunk cut off by a dropped connection keeps the bytes received so
+        far; the client resumes from the offset reported by get().
+        """
+        upload = self.backend.get(f'upload:{upload_id}')
+        if upload is None:
+            raise KeyError(upload_id)
+        if upload['complete']:
+            raise ValueError('Upload is already complete')
+        with self._lock, open(self.path(upload_id), 'ab') as f:
+            if fcntl is not None:
+                # 多个worker可能同时收到同一上传的分块
+                fcntl.flock(f, fcntl.LOCK_EX)
+            size = f.seek(0, os.SEEK_END)
+            if offset != size:
+                raise UploadOffsetError(size)
+            try:
+                for chunk in read_chunks(stream):
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ValueError(f'Upload exceeds the maximum size of {self.max_bytes} bytes')
+                    f.write(chunk)
+            finally:
+                f.flush()
+        if final:
+            upload.update(complete=True, size=size)
+            self.backend.set(f'upload:{upload_id}', upload, ttl=self.ttl_seconds)
+        return size
+
+    def follow(self, upload_id: str, poll_interval: float = 0.2, idle_timeout: float = 3600) -> Iterator[bytes]:
+        """Yield the bytes of an upload as they are written, until it is complete"""
+        last_data = time.time()
+        with open(self.path(upload_id), 'rb') as f:
+            while True:
+                chunk = f.read(READ_CHUNK_SIZE)
+                if chunk:
+                    last_data = time.time()
+                    yield chunk
+                    continue
+                upload = self.backend.get(f'upload:{upload_id}')
+                if upload is None:
+                    raise RuntimeError('Upload was removed')
+                if upload['complete'] and f.tell() >= upload['size']:
+                    return
+                if time.time() - last_data > idle_timeout:
+                    raise TimeoutError(f'No upload data received for {idle_timeout:.0f}s')
+                time.sleep(poll_interval)
+
+    def wait(self, upload_id: str, poll_interval: float = 0.2, idle_timeout: float = 3600) -> Dict:
+        """Block until an upload is complete (for formats that need the whole file)"""
+        last_size, last_data = -1, time.time()
+        while True:
+            upload = self.get(upload_id)
+            if upload is None:
+                raise RuntimeError('Upload was removed')
+            if upload['complete']:
+                return upload
+            if upload['offset'] != last_size:
+                last_size, last_data = upload['offset'], time.time()
+            elif time.time() - last_data > idle_timeout:
+                raise TimeoutError(f'No upload data received for {idle_timeout:.0f}s')
+            time.sleep(poll_interval)
+
+    def discard(self, upload_id: str):
+        """Delete the spooled data; the upload record stays until it expires"""
+        try:
+            os.remove(self.path(upload_id))
+        except OSError:
+            pass